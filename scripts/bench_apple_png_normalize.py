@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark of ApplePngNormalize.normalize against the previous per-pixel implementation.
+
+Builds synthetic CgBI images, checks output is bit-identical, then times both.
+
+    python scripts/bench_apple_png_normalize.py [repeat]
+"""
+from __future__ import annotations
+
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">L", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">L", zlib.crc32(chunk_type + data))
+    )
+
+
+def make_cgbi(width: int, height: int, seed: int = 0) -> Tuple[bytes, np.ndarray]:
+    # Return CgBI png and the RGBA pixels it contains
+    # Gradient with a noisy quarter, as stickers are mostly smooth
+    y, x = np.mgrid[0:height, 0:width]
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[:, :, 0] = x % 256
+    rgba[:, :, 1] = y % 256
+    rgba[:, :, 2] = (x + y) % 256
+    rgba[:, :, 3] = 255
+    rng = np.random.default_rng(seed)
+    rgba[: height // 2, : width // 2, :3] = rng.integers(
+        0, 256, (height // 2, width // 2, 3), dtype=np.uint8
+    )
+
+    scanlines = np.zeros((height, 1 + 4 * width), dtype=np.uint8)
+    scanlines[:, 1:] = rgba[:, :, [2, 1, 0, 3]].reshape(height, -1)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    idat = compressor.compress(scanlines.tobytes()) + compressor.flush()
+    idat_split = max(1, len(idat) // 3)
+
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"CgBI", b"\x50\x00\x20\x06")
+        + png_chunk(b"IHDR", struct.pack(">LLBBBBB", width, height, 8, 6, 0, 0, 0))
+        + b"".join(
+            png_chunk(b"IDAT", idat[i : i + idat_split])
+            for i in range(0, len(idat), idat_split)
+        )
+        + png_chunk(b"IEND", b"")
+    )
+    return png, rgba
+
+
+def swap_red_blue_loop(data: bytearray, width: int, height: int) -> None:
+    # Implementation before vectorization, kept as reference
+    offset = 1
+    for _ in range(height):
+        for x in range(width):
+            data[offset + 4 * x], data[offset + 4 * x + 2] = (
+                data[offset + 4 * x + 2],
+                data[offset + 4 * x],
+            )
+        offset += 1 + 4 * width
+
+
+def main() -> None:
+    root = Path(__file__).resolve().parents[1]
+    sys.path.insert(0, str(root / "src"))
+
+    from sticker_convert.utils.media.apple_png_normalize import ApplePngNormalize
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for width, height in ((160, 160), (370, 320), (740, 640)):
+        png, _ = make_cgbi(width, height)
+
+        swap_red_blue = ApplePngNormalize.swap_red_blue
+        ApplePngNormalize.swap_red_blue = swap_red_blue_loop  # type: ignore
+        try:
+            reference = ApplePngNormalize.normalize(png)
+            t = time.perf_counter()
+            for _ in range(repeat):
+                ApplePngNormalize.normalize(png)
+            time_loop = time.perf_counter() - t
+        finally:
+            ApplePngNormalize.swap_red_blue = swap_red_blue  # type: ignore
+
+        result = ApplePngNormalize.normalize(png)
+        t = time.perf_counter()
+        for _ in range(repeat):
+            ApplePngNormalize.normalize(png)
+        time_vectorized = time.perf_counter() - t
+
+        print(
+            f"{width}x{height}: "
+            f"loop {time_loop / repeat * 1000:.1f} ms | "
+            f"vectorized {time_vectorized / repeat * 1000:.1f} ms | "
+            f"speedup {time_loop / time_vectorized:.2f}x | "
+            f"identical {result == reference}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Benchmark of StickerConvert over tests/samples with every preset of compression.json.
+
+Each sample is converted in-process with each preset, in a new process for every
+case so that peak RSS and caches of one case do not affect another. Wall time,
+CPU time, peak RSS, number of steps tried and time of each converter stage are
+written to a JSON report. With --baseline, cases that are slower, use more
+memory, try more steps or fail compared to an earlier report are flagged, and
+exit code is 1.
+
+    python scripts/bench_converter.py [-o report.json] [--baseline old.json]
+        [--samples GLOB] [--presets PRESET,...] [--repeat N] [--threshold RATIO]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLE_DIR = ROOT / "tests" / "samples"
+COMPRESSION_JSON_PATH = (
+    ROOT / "src" / "sticker_convert" / "resources" / "compression.json"
+)
+
+# Differences below these are noise, even if above threshold ratio
+SECONDS_DIFF_MIN = 0.05
+RSS_DIFF_MIN = 4.0
+
+
+def get_peak_rss() -> Optional[float]:
+    # Peak RSS of this process in MiB
+    try:
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return maxrss / 1024 / (1024 if sys.platform == "darwin" else 1)
+    except ImportError:
+        import psutil
+
+        peak_wset = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return None if peak_wset is None else peak_wset / 1024 / 1024
+
+
+def get_opt_comp(preset: str) -> Any:
+    # Same as CompOption created by cli with only --preset given
+    from sticker_convert.job_option import CompOption
+
+    with open(COMPRESSION_JSON_PATH, encoding="utf-8") as f:
+        p = json.load(f)[preset]
+
+    return CompOption(
+        preset=preset,
+        size_max_img=p["size_max"]["img"],
+        size_max_vid=p["size_max"]["vid"],
+        format_img=(p["format"]["img"],),
+        format_vid=(p["format"]["vid"],),
+        fps_min=p["fps"]["min"],
+        fps_max=p["fps"]["max"],
+        fps_power=p["fps"]["power"],
+        res_w_min=p["res"]["w"]["min"],
+        res_w_max=p["res"]["w"]["max"],
+        res_h_min=p["res"]["h"]["min"],
+        res_h_max=p["res"]["h"]["max"],
+        res_power=p["res"]["power"],
+        res_snap_pow2=p["res"]["snap_pow2"],
+        quality_min=p["quality"]["min"],
+        quality_max=p["quality"]["max"],
+        quality_power=p["quality"]["power"],
+        color_min=p["color"]["min"],
+        color_max=p["color"]["max"],
+        color_power=p["color"]["power"],
+        duration_min=p["duration"]["min"],
+        duration_max=p["duration"]["max"],
+        bg_color=p["bg_color"],
+        padding_percent=p["padding_percent"],
+        steps=p["steps"],
+        fake_vid=p["fake_vid"],
+        quantize_method=p["quantize_method"],
+        scale_filter=p["scale_filter"],
+        result_cache=False,
+        processes=1,
+    )
+
+
+def run_case(sample: Path, preset: str, repeat: int) -> Dict[str, Any]:
+    # Run in new process for each case
+    sys.path.insert(0, str(ROOT / "src"))
+
+    from sticker_convert.converter import StickerConvert
+    from sticker_convert.utils.callback import Callback
+
+    case: Dict[str, Any] = {"sample": sample.name, "preset": preset}
+    peak_rss_import = get_peak_rss()
+    runs: List[Dict[str, Any]] = []
+    try:
+        for _ in range(repeat):
+            sticker = StickerConvert(
+                sample, Path("bytes"), get_opt_comp(preset), Callback(silent=True)
+            )
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            success, _, _, size = sticker.run()
+            runs.append(
+                {
+                    "wall_seconds": time.perf_counter() - wall_start,
+                    "cpu_seconds": time.process_time() - cpu_start,
+                    "success": success,
+                    "size": size,
+                    "format": sticker.out_f.suffix,
+                    "steps": sticker.steps_tried,
+                    "result_step": sticker.result_step,
+                    "stage_seconds": sticker.stage_seconds,
+                }
+            )
+    except Exception as e:
+        case["error"] = repr(e)
+        return case
+
+    # Fastest run is least affected by other processes
+    case.update(min(runs, key=lambda run: run["wall_seconds"]))
+    peak_rss = get_peak_rss()
+    case["peak_rss_mb"] = peak_rss
+    if peak_rss is not None and peak_rss_import is not None:
+        # Peak during converting above peak during importing
+        case["peak_rss_delta_mb"] = peak_rss - peak_rss_import
+    return case
+
+
+def format_case(case: Dict[str, Any]) -> str:
+    name = f"{case['sample']} {case['preset']}"
+    if "error" in case:
+        return f"{name}: error {case['error']}"
+    stages = " ".join(f"{k} {v:.2f}" for k, v in case["stage_seconds"].items() if v)
+    rss = case.get("peak_rss_mb")
+    return (
+        f"{name}: wall {case['wall_seconds']:.2f} s | cpu {case['cpu_seconds']:.2f} s | "
+        f"rss {'?' if rss is None else f'{rss:.0f}'} MiB | steps {case['steps']} | "
+        f"{case['format']} {case['size']} bytes | {stages}"
+    )
+
+
+def compare(
+    cases: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    baseline_cases: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (i["sample"], i["preset"]): i for i in baseline["cases"]
+    }
+    regressions: List[str] = []
+    for case in cases:
+        old = baseline_cases.get((case["sample"], case["preset"]))
+        if old is None or "error" in old:
+            continue
+        name = f"{case['sample']} {case['preset']}"
+        if "error" in case or (not case["success"] and old["success"]):
+            regressions.append(f"{name}: failed, succeeded in baseline")
+            continue
+
+        checks = [
+            ("wall_seconds", SECONDS_DIFF_MIN, "s"),
+            ("cpu_seconds", SECONDS_DIFF_MIN, "s"),
+        ]
+        checks += [
+            (f"stage_seconds.{k}", SECONDS_DIFF_MIN, "s") for k in case["stage_seconds"]
+        ]
+        checks.append(("peak_rss_delta_mb", RSS_DIFF_MIN, "MiB"))
+        for key, diff_min, unit in checks:
+            value_new: Any = case
+            value_old: Any = old
+            for k in key.split("."):
+                value_new = value_new.get(k) if value_new else None
+                value_old = value_old.get(k) if value_old else None
+            if value_new is None or value_old is None:
+                continue
+            if value_new - value_old > diff_min and value_new > value_old * (
+                1 + threshold
+            ):
+                regressions.append(
+                    f"{name}: {key} {value_old:.2f} -> {value_new:.2f} {unit}"
+                )
+
+        if case["steps"] > old["steps"]:
+            regressions.append(f"{name}: steps {old['steps']} -> {case['steps']}")
+    return regressions
+
+
+def main() -> None:
+    with open(COMPRESSION_JSON_PATH, encoding="utf-8") as f:
+        presets_all = list(json.load(f))
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark StickerConvert over tests/samples and compression presets"
+    )
+    parser.add_argument(
+        "-o", "--output", default="bench_converter.json", help="Path of JSON report"
+    )
+    parser.add_argument(
+        "--baseline", help="Path of earlier JSON report to compare with"
+    )
+    parser.add_argument("--samples", default="*", help="Glob of sample names")
+    parser.add_argument(
+        "--presets", default=",".join(presets_all), help="Comma separated presets"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs of each case, fastest is kept"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Ratio over baseline flagged as regression",
+    )
+    args = parser.parse_args()
+
+    samples = sorted(i for i in SAMPLE_DIR.glob(args.samples) if i.is_file())
+    presets = [i for i in args.presets.split(",") if i]
+    for preset in presets:
+        if preset not in presets_all:
+            parser.error(f"Unknown preset {preset}")
+
+    cases: List[Dict[str, Any]] = []
+    time_start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for sample in samples:
+            for preset in presets:
+                case = pool.apply(run_case, (sample, preset, args.repeat))
+                print(format_case(case), flush=True)
+                cases.append(case)
+
+    report = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "cases": cases,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(
+        f"{len(cases)} cases in {time.perf_counter() - time_start:.1f} s, "
+        f"report written to {args.output}"
+    )
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(cases, baseline, args.threshold)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        print(f"{len(regressions)} regressions compared to {args.baseline}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of converter.yuva_to_rgba against the previous float implementation.
+
+Decodes the animated_webm_*_vp9a samples, then converts every frame repeatedly.
+
+    python scripts/bench_yuva_to_rgba.py [repeat]
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from av.video.frame import VideoFrame
+
+
+def yuva_to_rgba_float(frame: VideoFrame) -> np.ndarray[Any, Any]:
+    # Implementation before fixed-point conversion, kept as reference
+    from sticker_convert.converter import YUV_RGB_MATRIX, useful_array
+
+    width = frame.width
+    height = frame.height
+
+    y = useful_array(frame.planes[0]).reshape(height, width)
+    u = useful_array(frame.planes[1]).reshape(height // 2, width // 2)
+    v = useful_array(frame.planes[2]).reshape(height // 2, width // 2)
+    a = useful_array(frame.planes[3]).reshape(height, width, 1)
+
+    u_full = u.repeat(2, axis=0).repeat(2, axis=1)
+    v_full = v.repeat(2, axis=0).repeat(2, axis=1)
+
+    yuv_array = np.dstack((y, u_full, v_full))
+
+    yuv_float = yuv_array.astype(np.float32)
+    yuv_float[:, :, 0] = yuv_float[:, :, 0].clip(16, 235) - 16
+    yuv_float[:, :, 1:] = yuv_float[:, :, 1:].clip(16, 240) - 128
+
+    rgb_array = np.matmul(yuv_float, YUV_RGB_MATRIX.T).clip(0, 255).astype("uint8")
+
+    return np.concatenate((rgb_array, a), axis=2)
+
+
+def decode(path: Path) -> List[VideoFrame]:
+    import av
+    from av.codec.context import CodecContext
+
+    frames: List[VideoFrame] = []
+    with av.open(path.as_posix()) as container:
+        context = CodecContext.create("libvpx-vp9", "r")
+        for packet in container.demux(container.streams.video):
+            for frame in context.decode(packet):  # type: ignore
+                width = frame.width + frame.width % 2
+                height = frame.height + frame.height % 2
+                frames.append(
+                    frame.reformat(
+                        width=width, height=height, format="yuva420p", dst_colorspace=1
+                    )
+                )
+    return frames
+
+
+def main() -> None:
+    root = Path(__file__).resolve().parents[1]
+    sys.path.insert(0, str(root / "src"))
+
+    from sticker_convert.converter import yuva_to_rgba
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for path in sorted((root / "tests" / "samples").glob("animated_webm_*_vp9a.webm")):
+        frames = decode(path)
+
+        t = time.perf_counter()
+        for _ in range(repeat):
+            for frame in frames:
+                yuva_to_rgba_float(frame)
+        time_float = time.perf_counter() - t
+
+        t = time.perf_counter()
+        out = None
+        for _ in range(repeat):
+            for frame in frames:
+                out = yuva_to_rgba(frame, out)
+        time_fixed = time.perf_counter() - t
+
+        diff_max = 0
+        for frame in frames:
+            diff = np.abs(
+                yuva_to_rgba(frame).astype(np.int16)
+                - yuva_to_rgba_float(frame).astype(np.int16)
+            )
+            diff_max = max(diff_max, int(diff.max()))
+
+        n = repeat * len(frames)
+        print(
+            f"{path.name}: {len(frames)} frames {frames[0].width}x{frames[0].height} | "
+            f"float {time_float / n * 1000:.3f} ms/frame | "
+            f"fixed-point {time_fixed / n * 1000:.3f} ms/frame | "
+            f"speedup {time_float / time_fixed:.2f}x | max diff {diff_max}"
+        )
+
+
+if __name__ == "__main__":
+    main()
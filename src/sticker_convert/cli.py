@@ -130,8 +130,16 @@ class CLI:
             "vid_size_max",
             "img_size_max",
             "padding_percent",
+            "result_cache_size_max",
+            "memory_max",
+        )
+        flags_comp_float = (
+            "fps_power",
+            "res_power",
+            "quality_power",
+            "color_power",
+            "file_timeout",
         )
-        flags_comp_float = ("fps_power", "res_power", "quality_power", "color_power")
         flags_comp_str = (
             "bg_color",
             "vid_format",
@@ -140,12 +148,16 @@ class CLI:
             "scale_filter",
             "quantize_method",
             "chromium_path",
+            "start_method",
         )
         flags_comp_bool = (
             "fake_vid",
             "no_fake_vid",
             "res_snap_pow2",
             "no_res_snap_pow2",
+            "streaming",
+            "result_cache",
+            "pipeline",
         )
         keyword_args: Dict[str, Any]
         for k, v in self.help["comp"].items():
@@ -440,6 +452,13 @@ class CLI:
             else args.fake_vid,
             chromium_path=args.chromium_path,
             cache_dir=args.cache_dir,
+            streaming=args.streaming,
+            result_cache=args.result_cache,
+            result_cache_size_max=args.result_cache_size_max,
+            pipeline=args.pipeline,
+            start_method=args.start_method,
+            memory_max=args.memory_max,
+            file_timeout=args.file_timeout,
             scale_filter=self.compression_presets[preset]["scale_filter"]
             if args.scale_filter is None
             else args.scale_filter,
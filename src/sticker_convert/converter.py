@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from fractions import Fraction
 from io import BytesIO
 from math import ceil, floor, log2
+from multiprocessing import cpu_count
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple, Union, cast
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Set, Tuple, Union, cast
 
 import numpy as np
 from bs4 import BeautifulSoup
@@ -13,17 +18,25 @@ from PIL import Image
 from PIL import __version__ as PillowVersion
 from PIL import features
 
+from sticker_convert.definitions import CONFIG_DIR
 from sticker_convert.job_option import CompOption
 from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.cancel import Cancelled, get_cancel_token
 from sticker_convert.utils.chrome_remotedebug import CRD
 from sticker_convert.utils.files.cache_store import CacheStore
+from sticker_convert.utils.files.result_cache import ResultCache, get_result_cache
 from sticker_convert.utils.media.codec_info import CodecInfo, rounding
 from sticker_convert.utils.media.format_verify import FormatVerify
+from sticker_convert.utils.media.frame_cache import FRAME_CACHE_SIZE_MAX, FrameCache
+from sticker_convert.utils.media.frame_store import FrameStore
+from sticker_convert.utils.media.size_predictor import SizePredictor
 from sticker_convert.utils.singletons import singletons
 
 if TYPE_CHECKING:
+    from av.filter import Graph
     from av.video.frame import VideoFrame
     from av.video.plane import VideoPlane
+    from rlottie_python.rlottie_wrapper import LottieAnimation
 
 MSG_START_COMP = "[I] Start compressing {} -> {}"
 MSG_SKIP_COMP = "[S] Compatible file found, skip compress and just copy {} -> {}"
@@ -32,10 +45,19 @@ MSG_COMP = (
 )
 MSG_REDO_COMP = "[{}] Compressed {} -> {} but size {} {} limit {}, recompressing"
 MSG_DONE_COMP = "[S] Successful compression {} -> {} size {} (step {})"
+MSG_CACHE_HIT = (
+    "[S] Found cached result {} -> {} size {} (result cache hits: {}, misses: {})"
+)
+MSG_CACHE_PUT = "[I] Saved result of {} to result cache (hits: {}, misses: {})"
 MSG_FAIL_COMP = (
     "[F] Failed Compression {} -> {}, "
     "cannot get below limit {} with lowest quality under current settings (Best size: {})"
 )
+MSG_TIMEOUT_COMP = (
+    "[S] Time limit of {}s reached when compressing {} -> {}, "
+    "using best result so far size {} (step {})"
+)
+MSG_STOP_COMP = "[F] Stopped compressing {} -> {} ({})"
 
 YUV_RGB_MATRIX = np.array(
     [
@@ -44,6 +66,69 @@ YUV_RGB_MATRIX = np.array(
         [1.164, 2.112, 0.000],
     ]
 )
+# Fractional bits of fixed-point YUV_RGB_MATRIX used by yuva_to_rgba
+YUV_RGB_FIXED_BITS = 16
+YUV_RGB_MATRIX_FIXED = np.rint(YUV_RGB_MATRIX * (1 << YUV_RGB_FIXED_BITS)).astype(
+    np.int32
+)
+
+# CompOption that do not affect conversion result
+RESULT_CACHE_OPT_IGNORED = (
+    "preset",
+    "chromium_path",
+    "cache_dir",
+    "streaming",
+    "default_emoji",
+    "no_compress",
+    "processes",
+    "result_cache",
+    "result_cache_size_max",
+    "pipeline",
+    "start_method",
+    "memory_max",
+    "file_timeout",
+)
+
+# Relative time to decode a pixel of a frame, and to encode a pixel of a frame
+# to each format, for starting files that take longest first. Tune with report
+# of predicted and actual time printed after compressing
+ENCODE_COST_WEIGHTS = {
+    ".webm": 4.0,
+    ".mp4": 3.0,
+    ".mkv": 3.0,
+    ".apng": 2.5,
+    ".webp": 2.0,
+    ".gif": 1.5,
+    ".png": 1.5,
+}
+ENCODE_COST_WEIGHT_DEFAULT = 1.0
+DECODE_COST_WEIGHT = 0.5
+
+# Bytes of each RGBA frame buffer pixel, and memory used by decoder and encoder
+# of a conversion besides frame buffers, for estimating peak memory
+FRAME_PIXEL_BYTES = 4
+CONVERT_MEMORY_BASE = 16 * 1024 * 1024
+
+# Maximum number of threads for rendering lottie in each process
+LOTTIE_THREADS_MAX = 4
+
+# Stages timed by StickerConvert.time_stage, time of nested stages excluded
+CONVERT_STAGES = ("import", "drop", "resize", "quantize", "encode", "optimize")
+
+# Scaler of libswscale matching opt_comp.scale_filter
+SWS_FLAGS = {
+    "nearest": "neighbor",
+    "box": "area",
+    "bilinear": "bilinear",
+    "hamming": "bilinear",
+    "bicubic": "bicubic",
+    "lanczos": "lanczos",
+}
+
+# Only jump to a step if its predicted size is below size_max * SIZE_PREDICT_MARGIN
+SIZE_PREDICT_MARGIN = 0.95
+# Fallback to bisection after this number of wrong predictions
+SIZE_PREDICT_MISSES_MAX = 2
 
 # Whether animated WebP is supported
 # See https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html#saving-sequences
@@ -97,8 +182,13 @@ def useful_array(
     return arr.view(np.dtype(dtype))
 
 
-def yuva_to_rgba(frame: "VideoFrame") -> "np.ndarray[Any, Any]":
+def yuva_to_rgba(
+    frame: "VideoFrame", out: "Optional[np.ndarray[Any, Any]]" = None
+) -> "np.ndarray[Any, Any]":
     # https://stackoverflow.com/questions/72308308/converting-yuv-to-rgb-in-python-coefficients-work-with-array-dont-work-with-n
+    # Fixed-point version of YUV_RGB_MATRIX, results are written into out if given
+    # Chroma terms are computed at chroma resolution and broadcasted
+    # to each 2x2 block of luma, instead of upsampling U and V
 
     width = frame.width
     height = frame.height
@@ -108,27 +198,40 @@ def yuva_to_rgba(frame: "VideoFrame") -> "np.ndarray[Any, Any]":
     v = useful_array(frame.planes[2]).reshape(height // 2, width // 2)
     a = useful_array(frame.planes[3]).reshape(height, width)
 
-    u = u.repeat(2, axis=0).repeat(2, axis=1)
-    v = v.repeat(2, axis=0).repeat(2, axis=1)
+    if out is None or out.shape != (height, width, 4):
+        out = np.empty((height, width, 4), dtype=np.uint8)
+
+    y_int = y.clip(16, 235).astype(np.int32) - 16
+    u_int = u.clip(16, 240).astype(np.int32) - 128
+    v_int = v.clip(16, 240).astype(np.int32) - 128
+
+    # View each 2x2 block of luma as axis 1 and 3
+    blocks = (height // 2, 2, width // 2, 2)
+    y_term = (y_int * YUV_RGB_MATRIX_FIXED[0, 0]).reshape(blocks)
+    out_blocks = out.reshape(*blocks, 4)
+    acc = np.empty(blocks, dtype=np.int32)
+    for c in range(3):
+        chroma = u_int * YUV_RGB_MATRIX_FIXED[c, 1] + v_int * YUV_RGB_MATRIX_FIXED[c, 2]
+        np.add(y_term, chroma[:, np.newaxis, :, np.newaxis], out=acc)
+        np.right_shift(acc, YUV_RGB_FIXED_BITS, out=acc)
+        np.clip(acc, 0, 255, out=acc)
+        out_blocks[..., c] = acc
+    out[:, :, 3] = a
+
+    return out
 
-    y = y.reshape((y.shape[0], y.shape[1], 1))
-    u = u.reshape((u.shape[0], u.shape[1], 1))
-    v = v.reshape((v.shape[0], v.shape[1], 1))
-    a = a.reshape((a.shape[0], a.shape[1], 1))
 
-    yuv_array = np.concatenate((y, u, v), axis=2)
+# Shared by all conversions in the process, as it is reset after each use
+apngasm: Any = None
 
-    yuv_array = yuv_array.astype(np.float32)
-    yuv_array[:, :, 0] = (
-        yuv_array[:, :, 0].clip(16, 235).astype(yuv_array.dtype) - 16  # type: ignore
-    )
-    yuv_array[:, :, 1:] = (
-        yuv_array[:, :, 1:].clip(16, 240).astype(yuv_array.dtype) - 128  # type: ignore
-    )
 
-    rgb_array = np.matmul(yuv_array, YUV_RGB_MATRIX.T).clip(0, 255).astype("uint8")
+def get_apngasm() -> Any:
+    from apngasm_python._apngasm_python import APNGAsm  # type: ignore
 
-    return np.concatenate((rgb_array, a), axis=2)
+    global apngasm
+    if apngasm is None:
+        apngasm = APNGAsm()  # type: ignore
+    return apngasm
 
 
 class StickerConvert:
@@ -172,14 +275,26 @@ class StickerConvert:
         self.out_f_name: str = self.out_f.name
 
         self.cb = cb
-        self.frames_raw: "List[np.ndarray[Any, Any]]" = []
-        self.frames_processed: "List[np.ndarray[Any, Any]]" = []
+        self.frames_raw = FrameStore()
+        self.frames_raw_count = 0
+        # Index of source frames that are needed by any step, None if all needed
+        # Importers yield None in place of other frames, skipping conversion
+        self.frames_keep: Optional[Set[int]] = None
+        # Source frame index -> Position in frames_raw
+        self.frames_raw_index: Dict[int, int] = {}
+        self.frames_processed = FrameStore()
+        # Evicted / uncached FrameStore, reused for next resize
+        self.frames_spare: Optional[FrameStore] = None
+        # Streaming mode: Frames are decoded, dropped and resized while exporting
+        self.frames_processed_iter: "Optional[Iterator[np.ndarray[Any, Any]]]" = None
+        self.frame_cache = FrameCache()
         self.opt_comp: CompOption = opt_comp
         if not self.opt_comp.steps:
             self.opt_comp.steps = 1
 
         self.size: int = 0
         self.size_max: Optional[int] = None
+        self.steps_list: List[Tuple[Optional[int], ...]] = []
         self.res_w: Optional[int] = None
         self.res_h: Optional[int] = None
         self.quality: Optional[int] = None
@@ -195,8 +310,25 @@ class StickerConvert:
         self.result: Optional[bytes] = None
         self.result_size: int = 0
         self.result_step: Optional[int] = None
+        self.steps_tried: int = 0
 
-        self.apngasm = None
+        # Seconds spent in each of CONVERT_STAGES
+        self.stage_seconds: Dict[str, float] = dict.fromkeys(CONVERT_STAGES, 0.0)
+        self.stage_current: Optional[str] = None
+        self.stage_start: float = 0.0
+
+        # Cancelled with job, or timed out after file_timeout
+        self.cancel_token = get_cancel_token().with_timeout(self.opt_comp.file_timeout)
+
+        self.result_cache: Optional[ResultCache] = None
+        if self.opt_comp.result_cache:
+            if self.opt_comp.cache_dir:
+                result_cache_dir = Path(self.opt_comp.cache_dir, "result_cache")
+            else:
+                result_cache_dir = CONFIG_DIR / "result_cache"
+            self.result_cache = get_result_cache(
+                result_cache_dir, self.opt_comp.result_cache_size_max
+            )
 
     @staticmethod
     def convert(
@@ -207,21 +339,119 @@ class StickerConvert:
         _cb_return: CallbackReturn,
     ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
         sticker = StickerConvert(in_f, out_f, opt_comp, cb)
-        result = sticker._convert()
+        result = sticker.run()
         cb.put("update_bar")
         return result
 
+    def run(self) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
+        # Convert this sticker, stage_seconds and steps_tried are set afterwards
+        try:
+            return self._convert()
+        except Cancelled as e:
+            return self.compress_stop(e)
+
+    @staticmethod
+    def estimate_frames(
+        codec_info: CodecInfo, opt_comp: CompOption
+    ) -> Tuple[int, int, int, int]:
+        # frames_in, pixels_in, frames_out, pixels_out
+        frames_in = max(codec_info.frames, 1)
+        pixels_in = codec_info.res[0] * codec_info.res[1]
+
+        # Frames are resized and padded to output resolution before encoding
+        frames_out = frames_in
+        if opt_comp.fps_max and codec_info.duration > 0:
+            frames_out = min(
+                frames_out, ceil(codec_info.duration / 1000 * opt_comp.fps_max)
+            )
+        pixels_out = pixels_in
+        if opt_comp.res_w_max and opt_comp.res_h_max:
+            pixels_out = opt_comp.res_w_max * opt_comp.res_h_max
+
+        return frames_in, pixels_in, frames_out, pixels_out
+
+    @staticmethod
+    def estimate_cost(
+        in_f: Path, opt_comp: CompOption, codec_info: Optional[CodecInfo] = None
+    ) -> float:
+        # Pixels decoded from input plus pixels encoded to output, weighted by
+        # output format. Only meaningful for comparing files
+        if codec_info is None:
+            codec_info = CodecInfo(in_f)
+        if codec_info.is_animated or opt_comp.fake_vid:
+            ext = opt_comp.format_vid[0]
+        else:
+            ext = opt_comp.format_img[0]
+
+        frames_in, pixels_in, frames_out, pixels_out = StickerConvert.estimate_frames(
+            codec_info, opt_comp
+        )
+
+        return (
+            frames_in * pixels_in * DECODE_COST_WEIGHT
+            + frames_out
+            * pixels_out
+            * ENCODE_COST_WEIGHTS.get(ext, ENCODE_COST_WEIGHT_DEFAULT)
+        )
+
+    @staticmethod
+    def estimate_memory(
+        in_f: Path, opt_comp: CompOption, codec_info: Optional[CodecInfo] = None
+    ) -> int:
+        # Peak bytes used by converting in_f, excluding worker process itself
+        if codec_info is None:
+            codec_info = CodecInfo(in_f)
+        frames_in, pixels_in, frames_out, pixels_out = StickerConvert.estimate_frames(
+            codec_info, opt_comp
+        )
+
+        frames_processed = frames_out * pixels_out * FRAME_PIXEL_BYTES
+        if opt_comp.streaming:
+            # Frames are decoded and resized a few at a time, but encoders of
+            # animated formats still hold every frame given until finished
+            return CONVERT_MEMORY_BASE + frames_processed * 2
+
+        # Source frames that are dropped by every step are not kept
+        frames_kept = min(frames_in, frames_out * 2 + 1)
+        frames_raw = frames_kept * pixels_in * FRAME_PIXEL_BYTES
+        # Resized frames of every step tried are kept in frame cache
+        frames_cached = min(
+            frames_processed * max(opt_comp.steps, 1), FRAME_CACHE_SIZE_MAX
+        )
+
+        return CONVERT_MEMORY_BASE + frames_raw + max(frames_processed, frames_cached)
+
     def _convert(self) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
         result = self.check_if_compatible()
         if result:
             return self.compress_done(result)
 
+        result_cache_key = None
+        if self.result_cache is not None:
+            result_cache_key = self.get_result_cache_key()
+            result = self.result_cache.get(result_cache_key)
+            if result is not None:
+                self.result_size = len(result)
+                self.cb.put(
+                    MSG_CACHE_HIT.format(
+                        self.in_f_name,
+                        self.out_f_name,
+                        self.result_size,
+                        self.result_cache.hits,
+                        self.result_cache.misses,
+                    )
+                )
+                return self.compress_done(result)
+
         self.cb.put((MSG_START_COMP.format(self.in_f_name, self.out_f_name)))
 
         steps_list = self.generate_steps_list()
+        self.steps_list = steps_list
 
-        step_lower = 0
-        step_upper = self.opt_comp.steps
+        # step_fail: Largest step known to exceed size_max
+        # step_pass: Smallest step known to be within size_max
+        step_fail = -1
+        step_pass = self.opt_comp.steps + 1
 
         if self.codec_info_orig.is_animated is True:
             self.size_max = self.opt_comp.size_max_vid
@@ -232,19 +462,30 @@ class StickerConvert:
             # No limit to size, create the best quality result
             step_current = 0
         else:
-            step_current = int(rounding((step_lower + step_upper) / 2))
+            step_current = int(rounding(self.opt_comp.steps / 2))
 
-        self.frames_import()
+        with self.time_stage("import"):
+            self.frames_import()
+        predictor = SizePredictor(
+            self.out_f.suffix, self.get_steps_features(steps_list)
+        )
+        prediction_misses = 0
+        step_seconds = 0.0
         while True:
+            # Between steps, result of previous step is kept if stopped.
+            # Encoders cannot be stopped within a step, so do not start a step
+            # that is unlikely to finish before time limit
+            self.cancel_token.check()
+            time_left = self.cancel_token.get_time_left()
+            if time_left is not None and time_left < step_seconds:
+                raise Cancelled(timed_out=True)
+            step_start = time.perf_counter()
+            self.steps_tried += 1
             param = steps_list[step_current]
             self.res_w = param[0]
             self.res_h = param[1]
             self.quality = param[2]
-            if param[3] and self.codec_info_orig.fps:
-                fps_tmp = min(param[3], self.codec_info_orig.fps)
-                self.fps = self.fix_fps(fps_tmp)
-            else:
-                self.fps = Fraction(0)
+            self.fps = self.get_step_fps(param)
             self.color = param[4]
 
             self.tmp_f = BytesIO()
@@ -256,18 +497,42 @@ class StickerConvert:
                 self.quality,
                 int(self.fps),
                 self.color,
-                step_lower,
+                max(step_fail, 0),
                 step_current,
-                step_upper,
+                min(step_pass, self.opt_comp.steps),
             )
             self.cb.put(msg)
 
-            self.frames_processed = self.frames_drop(self.frames_raw)
-            self.frames_processed = self.frames_resize(self.frames_processed)
-            self.frames_export()
+            if self.opt_comp.streaming:
+                self.frames_stream()
+            else:
+                # Steps that only differ in quality / color reuse resized frames
+                resize_key = ("resize", self.res_w, self.res_h, self.fps)
+                frames_cached = self.frame_cache.get(resize_key)
+                if frames_cached is None:
+                    if self.is_lottie():
+                        with self.time_stage("import"):
+                            self.frames_render_lottie()
+                    with self.time_stage("drop"):
+                        frames_dropped = self.frames_drop(self.frames_raw)
+                    with self.time_stage("resize"):
+                        self.frames_processed = self.frames_resize(
+                            frames_dropped, self.frames_spare
+                        )
+                    self.frames_spare = None
+                    for evicted in self.frame_cache.put(
+                        resize_key, self.frames_processed
+                    ):
+                        if isinstance(evicted, FrameStore):
+                            self.frames_spare = evicted
+                else:
+                    self.frames_processed = frames_cached
+            with self.time_stage("encode"):
+                self.frames_export()
 
             self.tmp_f.seek(0)
             self.size = self.tmp_f.getbuffer().nbytes
+            step_seconds = time.perf_counter() - step_start
 
             if not self.size_max or (
                 self.size <= self.size_max and self.size >= self.result_size
@@ -276,26 +541,132 @@ class StickerConvert:
                 self.result_size = self.size
                 self.result_step = step_current
 
-            if (
-                step_upper - step_lower > 0
-                and step_current != step_lower
-                and self.size_max
+            if not self.size_max:
+                break
+
+            size_predicted = predictor.predict(step_current)
+            if size_predicted is not None and (
+                (size_predicted <= self.size_max * SIZE_PREDICT_MARGIN)
+                != (self.size <= self.size_max)
             ):
-                if self.size <= self.size_max:
-                    sign = "<"
-                    step_upper = step_current
-                else:
-                    sign = ">"
-                    step_lower = step_current
-                if step_current == step_lower + 1:
-                    step_current = step_lower
-                else:
-                    step_current = int(rounding((step_lower + step_upper) / 2))
-                self.recompress(sign)
-            elif self.result:
-                return self.compress_done(self.result, self.result_step)
+                prediction_misses += 1
+            predictor.add(step_current, self.size)
+
+            if self.size <= self.size_max:
+                sign = "<"
+                step_pass = step_current
             else:
-                return self.compress_fail()
+                sign = ">"
+                step_fail = step_current
+
+            step_next = self.get_next_step(
+                predictor, step_fail, step_pass, prediction_misses
+            )
+            if step_next is None:
+                break
+            step_current = step_next
+            self.recompress(sign)
+
+        if self.result:
+            if self.result_cache is not None and result_cache_key is not None:
+                self.result_cache.put(result_cache_key, self.result)
+                self.cb.put(
+                    MSG_CACHE_PUT.format(
+                        self.in_f_name, self.result_cache.hits, self.result_cache.misses
+                    )
+                )
+            return self.compress_done(self.result, self.result_step)
+        return self.compress_fail()
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        # Enclosing stage is paused while nested stage is running
+        stage_outer = self.stage_current
+        time_now = time.perf_counter()
+        if stage_outer is not None:
+            self.stage_seconds[stage_outer] += time_now - self.stage_start
+        self.stage_current = stage
+        self.stage_start = time_now
+        try:
+            yield
+        finally:
+            time_now = time.perf_counter()
+            self.stage_seconds[stage] += time_now - self.stage_start
+            self.stage_current = stage_outer
+            self.stage_start = time_now
+
+    def time_stage_iter(self, stage: str, items: Iterable[Any]) -> Iterator[Any]:
+        # Only time spent producing each item is counted, as generators of
+        # streaming mode are consumed by other stages
+        iterator = iter(items)
+        while True:
+            with self.time_stage(stage):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def get_result_cache_key(self) -> str:
+        if isinstance(self.in_f, Path):
+            data = self.in_f.read_bytes()
+        else:
+            data = self.in_f
+        opt = {
+            k: v
+            for k, v in self.opt_comp.to_dict().items()
+            if k not in RESULT_CACHE_OPT_IGNORED
+        }
+        return ResultCache.get_key(data, opt, self.out_f.suffix)
+
+    def get_step_fps(self, param: Tuple[Optional[int], ...]) -> Fraction:
+        if param[3] and self.codec_info_orig.fps:
+            fps_tmp = min(param[3], self.codec_info_orig.fps)
+            return self.fix_fps(fps_tmp)
+        return Fraction(0)
+
+    def get_steps_features(
+        self, steps_list: List[Tuple[Optional[int], ...]]
+    ) -> List[Tuple[int, int, Optional[int], Optional[int]]]:
+        # (pixels, frames, quality, color) of each step for predicting output size
+        width_orig, height_orig = self.codec_info_orig.res
+        steps_features: List[Tuple[int, int, Optional[int], Optional[int]]] = []
+        for param in steps_list:
+            width = param[0] if param[0] else width_orig
+            height = param[1] if param[1] else height_orig
+            fps = self.get_step_fps(param)
+            if self.codec_info_orig.is_animated and fps and self.frames_raw_count > 1:
+                frames = len(self.frames_drop_plan(self.frames_raw_count, fps))
+            else:
+                frames = 1
+            steps_features.append((width * height, frames, param[2], param[4]))
+        return steps_features
+
+    def get_next_step(
+        self,
+        predictor: SizePredictor,
+        step_fail: int,
+        step_pass: int,
+        prediction_misses: int,
+    ) -> Optional[int]:
+        # Steps between step_fail and step_pass are not yet known to pass or fail
+        candidates = range(step_fail + 1, step_pass)
+        if len(candidates) == 0:
+            return None
+
+        # Jump to the best step that is predicted to pass,
+        # fallback to bisection if predictions keep missing
+        assert self.size_max
+        if prediction_misses < SIZE_PREDICT_MISSES_MAX:
+            predictions = [(i, predictor.predict(i)) for i in candidates]
+            if all(size is not None for _, size in predictions):
+                for i, size in predictions:
+                    if size is not None and size <= self.size_max * SIZE_PREDICT_MARGIN:
+                        return i
+                # All predicted to fail, confirm with the step next to step_pass
+                return candidates[-1]
+
+        step_bisect = int(rounding((max(step_fail, 0) + step_pass) / 2))
+        return min(max(step_bisect, candidates[0]), candidates[-1])
 
     def check_if_compatible(self) -> Optional[bytes]:
         f_fmt = self.opt_comp.get_format()
@@ -395,6 +766,25 @@ class StickerConvert:
         )
         self.cb.put(msg)
 
+    def compress_stop(
+        self, e: Cancelled
+    ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
+        # Result found before time limit is within size limit, but may not be
+        # the best possible, so it is not saved to result cache
+        if e.timed_out and self.result:
+            msg = MSG_TIMEOUT_COMP.format(
+                self.opt_comp.file_timeout,
+                self.in_f_name,
+                self.out_f_name,
+                self.result_size,
+                self.result_step,
+            )
+            self.cb.put(msg)
+            return self.compress_done(self.result)
+
+        self.cb.put(MSG_STOP_COMP.format(self.in_f_name, self.out_f_name, e))
+        return False, self.in_f_path, self.out_f, self.size
+
     def compress_fail(
         self,
     ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
@@ -428,23 +818,143 @@ class StickerConvert:
         return True, self.in_f_path, out_f, self.result_size
 
     def frames_import(self) -> None:
+        if self.opt_comp.streaming:
+            self.frames_scan()
+            return
+
+        if self.is_lottie():
+            # Frames are rendered for each step by frames_render_lottie
+            self.frames_raw_count = self.codec_info_orig.frames
+            self.frames_keep = self.get_frames_keep(self.frames_raw_count)
+            return
+
+        self.frames_keep = self.get_frames_keep_before_import()
+        self.frames_import_raw()
+
+        if self.frames_keep is not None and not (
+            self.get_frames_keep(self.frames_raw_count) <= self.frames_raw_index.keys()
+        ):
+            # Skipped frames are needed, import again without skipping
+            self.frames_keep = None
+            self.frames_import_raw()
+
+    def frames_import_raw(self) -> None:
+        capacity = self.codec_info_orig.frames
+        if self.frames_keep is not None:
+            capacity = min(capacity, len(self.frames_keep))
+        self.frames_raw.clear(capacity=max(capacity, 1))
+        self.frames_raw_index = {}
+        self.frames_raw_count = 0
+        for i, frame in enumerate(self.frames_import_iter()):
+            self.cancel_token.check()
+            self.frames_raw_count = i + 1
+            if frame is not None:
+                self.frames_raw_index[i] = len(self.frames_raw)
+                self.frames_raw.append(frame)
+
+    def get_frames_keep_before_import(self) -> Optional[Set[int]]:
+        # Drop plan is computed from CodecInfo before import
+        # Importer may yield different number of frames than CodecInfo.frames,
+        # plan with more frames is a superset, unless last frame is repeated
+        if not self.codec_info_orig.is_animated:
+            return None
+        frames_count = max(
+            self.codec_info_orig.frames,
+            int(
+                rounding(
+                    self.codec_info_orig.duration * self.codec_info_orig.fps / 1000
+                )
+            ),
+        )
+        return self.get_frames_keep(frames_count * 2 + 1)
+
+    def get_frames_keep(self, frames_count: int) -> Set[int]:
+        # Union of frames_drop_plan of all steps
+        frames_keep = {0}
+        if frames_count <= 1:
+            return frames_keep
+        for fps in {self.get_step_fps(param) for param in self.steps_list}:
+            if fps:
+                frames_keep.update(self.frames_drop_plan(frames_count, fps))
+        return frames_keep
+
+    def is_lottie(self) -> bool:
+        return Path(self.in_f_name).suffix in (".tgs", ".lottie", ".json")
+
+    def is_frame_kept(self, i: int) -> bool:
+        return self.frames_keep is None or i in self.frames_keep
+
+    def frames_import_iter(self) -> "Iterator[Optional[np.ndarray[Any, Any]]]":
         if isinstance(self.in_f, Path):
             suffix = self.in_f.suffix
         else:
             suffix = Path(self.in_f_name).suffix
 
         if suffix in (".tgs", ".lottie", ".json"):
-            self._frames_import_lottie()
+            return self._frames_import_lottie()
         elif suffix in (".webp", ".apng", ".png", ".gif"):
             # ffmpeg do not support webp decoding (yet)
             # ffmpeg could fail to decode apng if file is buggy
-            self._frames_import_pillow()
+            return self._frames_import_pillow()
         elif suffix == ".svg":
-            self._frames_import_svg()
+            return self._frames_import_svg()
+        else:
+            return self._frames_import_pyav()
+
+    def frames_scan(self) -> None:
+        # Streaming mode: Count frames and determine background color
+        # with one decoding pass, without keeping the frames
+        self.frames_raw_count = 0
+        brightness_total = 0.0
+        brightness_count = 0
+        # Frames only need to be converted for determining background color,
+        # from same frames as determine_bg_color without streaming
+        if self.bg_color is None:
+            self.frames_keep = self.get_frames_keep_before_import()
         else:
-            self._frames_import_pyav()
+            self.frames_keep = set()
+        for frame in self.frames_import_iter():
+            self.cancel_token.check()
+            self.frames_raw_count += 1
+            if frame is not None:
+                brightness_total += self.get_frame_brightness(frame)
+                brightness_count += 1
+
+        if self.bg_color is None:
+            self.bg_color = self.get_bg_color(
+                brightness_total / max(brightness_count, 1)
+            )
 
-    def _frames_import_svg(self) -> None:
+    def frames_stream(self) -> None:
+        # Chain generators of import -> drop -> resize
+        # Source file is decoded again for every step
+        if self.res_w is None:
+            self.res_w = self.codec_info_orig.res[0]
+        if self.res_h is None:
+            self.res_h = self.codec_info_orig.res[1]
+        if self.codec_info_orig.is_animated and self.fps and self.frames_raw_count > 1:
+            self.frames_keep = set(self.frames_drop_plan(self.frames_raw_count, self.fps))
+        else:
+            self.frames_keep = {0}
+        self.frames_processed_iter = self.time_stage_iter(
+            "resize",
+            self.frames_resize_iter(
+                self.time_stage_iter(
+                    "drop",
+                    self.frames_drop_iter(
+                        self.time_stage_iter("import", self.frames_import_iter())
+                    ),
+                )
+            ),
+        )
+        if self.out_f.suffix not in (".webm", ".mp4", ".mkv"):
+            # Only pyav encoder can consume frames one by one
+            # Buffer of frames_processed is reused across steps
+            self.frames_processed.clear()
+            self.frames_processed.extend(self.frames_processed_iter)
+            self.frames_processed_iter = None
+
+    def _frames_import_svg(self) -> "Iterator[Optional[np.ndarray[Any, Any]]]":
         width = self.codec_info_orig.res[0]
         height = self.codec_info_orig.res[1]
 
@@ -505,6 +1015,9 @@ class StickerConvert:
 
         if self.codec_info_orig.fps > 0:
             for i in range(self.codec_info_orig.frames):
+                if not self.is_frame_kept(i):
+                    yield None
+                    continue
                 curr_time = (
                     i
                     / self.codec_info_orig.frames
@@ -512,11 +1025,11 @@ class StickerConvert:
                     / 1000
                 )
                 crd.exec_js(f"svg.setCurrentTime({curr_time})")
-                self.frames_raw.append(np.asarray(crd.screenshot(clip)))
+                yield np.asarray(crd.screenshot(clip))
         else:
-            self.frames_raw.append(np.asarray(crd.screenshot(clip)))
+            yield np.asarray(crd.screenshot(clip))
 
-    def _frames_import_pillow(self) -> None:
+    def _frames_import_pillow(self) -> "Iterator[Optional[np.ndarray[Any, Any]]]":
         with Image.open(self.in_f) as im:
             # Note: im.convert("RGBA") would return rgba image of current frame only
             if (
@@ -525,23 +1038,28 @@ class StickerConvert:
                 and self.codec_info_orig.fps != 0.0
             ):
                 # Pillow is not reliable for getting webp frame durations
-                durations: Optional[List[int]]
+                durations: Optional[Tuple[float, ...]]
                 if im.format == "WEBP":
-                    _, _, _, durations = CodecInfo._get_file_fps_frames_duration_webp(  # type: ignore
-                        self.in_f
-                    )
+                    durations = self.codec_info_orig.durations
                 else:
                     durations = None
 
                 duration_ptr = 0.0
                 duration_inc = 1 / self.codec_info_orig.fps * 1000
                 frame = 0
+                frame_out = 0
                 if durations is None:
-                    next_frame_start_duration = cast(int, im.info.get("duration", 1000))
+                    next_frame_start_duration = cast(
+                        float, im.info.get("duration", 1000)
+                    )
                 else:
                     next_frame_start_duration = durations[0]
                 while True:
-                    self.frames_raw.append(np.asarray(im.convert("RGBA")))
+                    if self.is_frame_kept(frame_out):
+                        yield np.asarray(im.convert("RGBA"))
+                    else:
+                        yield None
+                    frame_out += 1
                     duration_ptr += duration_inc
                     if duration_ptr >= next_frame_start_duration:
                         frame += 1
@@ -551,18 +1069,17 @@ class StickerConvert:
 
                         if durations is None:
                             next_frame_start_duration += cast(
-                                int, im.info.get("duration", 1000)
+                                float, im.info.get("duration", 1000)
                             )
                         else:
                             next_frame_start_duration += durations[frame]
             else:
-                self.frames_raw.append(np.asarray(im.convert("RGBA")))
+                yield np.asarray(im.convert("RGBA"))
 
-    def _frames_import_pyav(self) -> None:
+    def _frames_import_pyav(self) -> "Iterator[Optional[np.ndarray[Any, Any]]]":
         import av
         from av.codec.context import CodecContext
         from av.container.input import InputContainer
-        from av.video.codeccontext import VideoCodecContext
         from av.video.frame import VideoFrame
 
         # Crashes when handling some webm in yuv420p and convert to rgba
@@ -578,31 +1095,36 @@ class StickerConvert:
             if context.name == "vp8":
                 context = CodecContext.create("libvpx", "r")
             elif context.name == "vp9":
-                context = cast(
-                    VideoCodecContext, CodecContext.create("libvpx-vp9", "r")
-                )
+                context = CodecContext.create("libvpx-vp9", "r")
 
+            rgba_buffer: "Optional[np.ndarray[Any, Any]]" = None
+            graph: "Optional[Graph]" = None
+            graph_key: Optional[Tuple[int, int, str]] = None
+            frame_count = 0
             for packet in container.demux(container.streams.video):
                 for frame in context.decode(packet):
-                    width_orig = frame.width
-                    height_orig = frame.height
+                    # Frames still need to be decoded, but not scaled and converted
+                    frame_count += 1
+                    if not self.is_frame_kept(frame_count - 1):
+                        yield None
+                        continue
+
+                    # Downscale to largest size needed by steps_list while decoding
+                    width_orig, height_orig = self.get_decode_dims(
+                        frame.width, frame.height
+                    )
 
                     # Need to pad frame to even dimension first
-                    if width_orig % 2 == 1 or height_orig % 2 == 1:
-                        from av.filter import Graph
-
-                        width_new = width_orig + width_orig % 2
-                        height_new = height_orig + height_orig % 2
-
-                        graph = Graph()
-                        in_src = graph.add_buffer(template=container.streams.video[0])
-                        pad = graph.add(
-                            "pad", f"{width_new}:{height_new}:0:0:color=#00000000"
-                        )
-                        in_src.link_to(pad)
-                        sink = graph.add("buffersink")
-                        pad.link_to(sink)
-                        graph.configure()
+                    width_new = width_orig + width_orig % 2
+                    height_new = height_orig + height_orig % 2
+
+                    if width_new != frame.width or height_new != frame.height:
+                        key = (frame.width, frame.height, frame.format.name)
+                        if graph is None or graph_key != key:
+                            graph = self._get_scale_pad_graph(
+                                frame, width_orig, height_orig, width_new, height_new
+                            )
+                            graph_key = key
 
                         graph.push(frame)
                         frame_resized = cast(VideoFrame, graph.pull())
@@ -630,13 +1152,59 @@ class StickerConvert:
                             format="yuva420p",
                             dst_colorspace=1,
                         )
-                        rgba_array = yuva_to_rgba(frame_resized)
+                        # Buffer is reused for each frame, frames yielded are
+                        # consumed (copied or resized) before decoding next frame
+                        rgba_array = yuva_to_rgba(frame_resized, rgba_buffer)
+                        rgba_buffer = rgba_array
 
                     # Remove pixels that was added to make dimensions even
                     rgba_array = rgba_array[0:height_orig, 0:width_orig]
-                    self.frames_raw.append(rgba_array)
+                    yield rgba_array
 
-    def _frames_import_lottie(self) -> None:
+    def _get_scale_pad_graph(
+        self,
+        frame: "VideoFrame",
+        width_scaled: int,
+        height_scaled: int,
+        width_padded: int,
+        height_padded: int,
+    ) -> "Graph":
+        from av.filter import Graph
+
+        graph = Graph()
+        in_src = graph.add_buffer(
+            width=frame.width,
+            height=frame.height,
+            format=frame.format,
+            time_base=frame.time_base,
+        )
+        filters: List[Tuple[str, str]] = []
+        if width_scaled != frame.width or height_scaled != frame.height:
+            # Scale to the fitted dimension to keep aspect ratio, then pad
+            flags = SWS_FLAGS.get(self.opt_comp.scale_filter or "", "bicubic")
+            filters.append(("scale", f"{width_scaled}:{height_scaled}:flags={flags}"))
+        if width_scaled != width_padded or height_scaled != height_padded:
+            # pad filter would drop last row / column of odd dimension in yuv420p
+            # Pad without chroma subsampling, the extra row / column is cropped
+            has_alpha = any(i.is_alpha for i in frame.format.components)
+            filters.append(("format", "yuva444p" if has_alpha else "yuv444p"))
+            filters.append(
+                ("pad", f"{width_padded}:{height_padded}:0:0:color=#00000000")
+            )
+            filters.append(("format", frame.format.name))
+
+        last = in_src
+        for name, args in filters:
+            node = graph.add(name, args)
+            last.link_to(node)
+            last = node
+        sink = graph.add("buffersink")
+        last.link_to(sink)
+        graph.configure()
+
+        return graph
+
+    def _lottie_open(self) -> "LottieAnimation":
         from rlottie_python.rlottie_wrapper import LottieAnimation
 
         if isinstance(self.in_f, Path):
@@ -659,38 +1227,127 @@ class StickerConvert:
             else:
                 anim = LottieAnimation.from_data(self.in_f.decode("utf-8"))
 
-        for i in range(anim.lottie_animation_get_totalframe()):
-            frame = np.asarray(anim.render_pillow_frame(frame_num=i))
-            self.frames_raw.append(frame)
+        return anim
+
+    def get_lottie_dims(self) -> Tuple[int, int]:
+        # Lottie is vector, render at size of current step instead of resizing
+        width, height = self.codec_info_orig.res
+        if self.res_w is None or self.res_h is None:
+            return width, height
+        return self.get_resize_dims(width, height, self.res_w, self.res_h)
+
+    def _frames_import_lottie(self) -> "Iterator[Optional[np.ndarray[Any, Any]]]":
+        width, height = self.get_lottie_dims()
+        anim = self._lottie_open()
+        try:
+            for i in range(anim.lottie_animation_get_totalframe()):
+                if self.is_frame_kept(i):
+                    yield np.asarray(
+                        anim.render_pillow_frame(frame_num=i, width=width, height=height)
+                    )
+                else:
+                    yield None
+        finally:
+            anim.lottie_animation_destroy()
+
+    def frames_render_lottie(self) -> None:
+        # Render kept frames at size of current step into frames_raw
+        # Rendered frames are cached for each size
+        width, height = self.get_lottie_dims()
+        render_key = ("lottie", width, height)
+        render_cached = self.frame_cache.get(render_key)
+        if render_cached is None:
+            if self.frames_keep is None:
+                frames_index = list(range(self.frames_raw_count))
+            else:
+                frames_index = sorted(self.frames_keep)
+            frames_raw = FrameStore(capacity=len(frames_index))
+            frames_raw.extend(
+                self._frames_render_lottie_threaded(frames_index, width, height)
+            )
+            render_cached = (frames_raw, {j: i for i, j in enumerate(frames_index)})
+            self.frame_cache.put(render_key, render_cached)
+
+        self.frames_raw, self.frames_raw_index = render_cached
+
+    def _frames_render_lottie_threaded(
+        self, frames_index: List[int], width: int, height: int
+    ) -> "Iterator[np.ndarray[Any, Any]]":
+        # ctypes release the GIL while rlottie render
+        # LottieAnimation is not thread safe, so each thread open its own
+        local = threading.local()
+        anims: "List[LottieAnimation]" = []
+
+        def render(i: int) -> "np.ndarray[Any, Any]":
+            anim = getattr(local, "anim", None)
+            if anim is None:
+                anim = self._lottie_open()
+                local.anim = anim
+                anims.append(anim)
+            return np.asarray(
+                anim.render_pillow_frame(frame_num=i, width=width, height=height)
+            )
 
-        anim.lottie_animation_destroy()
+        # processes may be unset when CompOption is not created by cli or gui
+        processes = max(1, self.opt_comp.processes or 1)
+        threads = max(1, min(LOTTIE_THREADS_MAX, cpu_count() // processes))
+        executor = ThreadPoolExecutor(threads)
+        try:
+            for frame in executor.map(render, frames_index):
+                self.cancel_token.check()
+                yield frame
+        finally:
+            # Frames not yet rendered are skipped if cancelled
+            executor.shutdown(cancel_futures=True)
+            for anim in anims:
+                anim.lottie_animation_destroy()
 
     def determine_bg_color(self) -> Tuple[int, int, int, int]:
         mean_total = 0.0
-        # Calculate average color of all frames for selecting background color
+        # Calculate average color of frames for selecting background color
+        # Only frames kept by any step are imported, so frames dropped by
+        # every step are not counted
         for frame in self.frames_raw:
-            s = frame.shape
-            colors = frame.reshape((-1, s[2]))  # type: ignore
-            # Do not count in alpha=0
-            # If alpha > 0, use alpha as weight
-            colors = colors[colors[:, 3] != 0]
-            if colors.shape[0] != 0:
-                alphas = colors[:, 3] / 255
-                r_mean = cast(float, np.mean(colors[:, 0] * alphas))
-                g_mean = cast(float, np.mean(colors[:, 1] * alphas))
-                b_mean = cast(float, np.mean(colors[:, 2] * alphas))
-                mean_total += (r_mean + g_mean + b_mean) / 3
-
-        if mean_total / len(self.frames_raw) < 128:
+            mean_total += self.get_frame_brightness(frame)
+
+        return self.get_bg_color(mean_total / len(self.frames_raw))
+
+    @staticmethod
+    def get_frame_brightness(frame: "np.ndarray[Any, Any]") -> float:
+        s = frame.shape
+        colors = frame.reshape((-1, s[2]))  # type: ignore
+        # Do not count in alpha=0
+        # If alpha > 0, use alpha as weight
+        colors = colors[colors[:, 3] != 0]
+        if colors.shape[0] == 0:
+            return 0.0
+        alphas = colors[:, 3] / 255
+        r_mean = cast(float, np.mean(colors[:, 0] * alphas))
+        g_mean = cast(float, np.mean(colors[:, 1] * alphas))
+        b_mean = cast(float, np.mean(colors[:, 2] * alphas))
+        return (r_mean + g_mean + b_mean) / 3
+
+    @staticmethod
+    def get_bg_color(brightness: float) -> Tuple[int, int, int, int]:
+        if brightness < 128:
             return (255, 255, 255, 0)
         else:
             return (0, 0, 0, 0)
 
     def frames_resize(
-        self, frames_in: "List[np.ndarray[Any, Any]]"
-    ) -> "List[np.ndarray[Any, Any]]":
-        frames_out: "List[np.ndarray[Any, Any]]" = []
+        self,
+        frames_in: "Sequence[np.ndarray[Any, Any]]",
+        frames_out: Optional[FrameStore] = None,
+    ) -> FrameStore:
+        if frames_out is None:
+            frames_out = FrameStore()
+        frames_out.clear(capacity=len(frames_in))
+        frames_out.extend(self.frames_resize_iter(frames_in))
+        return frames_out
 
+    def frames_resize_iter(
+        self, frames_in: "Iterable[np.ndarray[Any, Any]]"
+    ) -> "Iterator[np.ndarray[Any, Any]]":
         resample: Literal[0, 1, 2, 3, 4, 5]
         if self.opt_comp.scale_filter == "nearest":
             resample = Image.NEAREST
@@ -711,6 +1368,7 @@ class StickerConvert:
             self.bg_color = self.determine_bg_color()
 
         for frame in frames_in:
+            self.cancel_token.check()
             with Image.fromarray(frame, "RGBA") as im:  # type: ignore
                 width, height = im.size
 
@@ -719,13 +1377,9 @@ class StickerConvert:
             if self.res_h is None:
                 self.res_h = height
 
-            scaling = 1 - (self.opt_comp.padding_percent / 100)
-            if width / self.res_w > height / self.res_h:
-                width_new = int(self.res_w * scaling)
-                height_new = int(height * self.res_w / width * scaling)
-            else:
-                height_new = int(self.res_h * scaling)
-                width_new = int(width * self.res_h / height * scaling)
+            width_new, height_new = self.get_resize_dims(
+                width, height, self.res_w, self.res_h
+            )
 
             with im.resize((width_new, height_new), resample=resample) as im_resized:
                 with Image.new(
@@ -735,13 +1389,40 @@ class StickerConvert:
                         im_resized,
                         ((self.res_w - width_new) // 2, (self.res_h - height_new) // 2),
                     )
-                    frames_out.append(np.asarray(im_new))
+                    yield np.asarray(im_new)
+
+    def get_resize_dims(
+        self, width: int, height: int, res_w: int, res_h: int
+    ) -> Tuple[int, int]:
+        # Size of frame after fitting into res_w x res_h, before padding
+        scaling = 1 - (self.opt_comp.padding_percent / 100)
+        if width / res_w > height / res_h:
+            width_new = int(res_w * scaling)
+            height_new = int(height * res_w / width * scaling)
+        else:
+            height_new = int(res_h * scaling)
+            width_new = int(width * res_h / height * scaling)
+        return width_new, height_new
+
+    def get_decode_dims(self, width: int, height: int) -> Tuple[int, int]:
+        # Largest size of frame needed by any step, so that frames can be
+        # downscaled while decoding. Frames are never upscaled while decoding.
+        # Resizing to same size in frames_resize_iter is a copy without resampling
+        width_max, height_max = 0, 0
+        for param in self.steps_list:
+            if param[0] is None or param[1] is None:
+                return width, height
+            width_new, height_new = self.get_resize_dims(
+                width, height, param[0], param[1]
+            )
+            if width_new * height_new > width_max * height_max:
+                width_max, height_max = width_new, height_new
 
-        return frames_out
+        if width_max == 0 or width_max >= width or height_max >= height:
+            return width, height
+        return max(width_max, 1), max(height_max, 1)
 
-    def frames_drop(
-        self, frames_in: "List[np.ndarray[Any, Any]]"
-    ) -> "List[np.ndarray[Any, Any]]":
+    def frames_drop(self, frames_in: FrameStore) -> "List[np.ndarray[Any, Any]]":
         if (
             not self.codec_info_orig.is_animated
             or not self.fps
@@ -749,11 +1430,41 @@ class StickerConvert:
         ):
             return [frames_in[0]]
 
-        frames_out: "List[np.ndarray[Any, Any]]" = []
+        plan = self.frames_drop_plan(self.frames_raw_count, self.fps)
+        return [frames_in[self.frames_raw_index[i]] for i in plan]
+
+    def frames_drop_iter(
+        self, frames_in: "Iterable[Optional[np.ndarray[Any, Any]]]"
+    ) -> "Iterator[np.ndarray[Any, Any]]":
+        if (
+            not self.codec_info_orig.is_animated
+            or not self.fps
+            or self.frames_raw_count == 1
+        ):
+            frame_first = next(iter(frames_in))
+            assert frame_first is not None
+            yield frame_first
+            return
+
+        # Indices in plan never decrease, so frames_in is consumed only once
+        plan = self.frames_drop_plan(self.frames_raw_count, self.fps)
+        plan_pos = 0
+        for i, frame in enumerate(frames_in):
+            self.cancel_token.check()
+            if frame is None:
+                continue
+            while plan_pos < len(plan) and plan[plan_pos] == i:
+                yield frame
+                plan_pos += 1
+            if plan_pos == len(plan):
+                return
+
+    def frames_drop_plan(self, frames_in_count: int, fps: Fraction) -> List[int]:
+        # Return index of input frames to be used for each output frame
 
         # fps_ratio: 1 frame in new anim equal to how many frame in old anim
         # speed_ratio: How much to speed up / slow down
-        fps_ratio = self.codec_info_orig.fps / self.fps
+        fps_ratio = self.codec_info_orig.fps / fps
         if (
             self.opt_comp.duration_min
             and self.codec_info_orig.duration < self.opt_comp.duration_min
@@ -773,25 +1484,37 @@ class StickerConvert:
         frames_out_min = None
         frames_out_max = None
         if self.opt_comp.duration_min:
-            frames_out_min = ceil(self.fps * self.opt_comp.duration_min / 1000)
+            frames_out_min = ceil(fps * self.opt_comp.duration_min / 1000)
         if self.opt_comp.duration_max:
-            frames_out_max = floor(self.fps * self.opt_comp.duration_max / 1000)
+            frames_out_max = floor(fps * self.opt_comp.duration_max / 1000)
 
-        frame_current = 0
-        frame_current_float = 0.0
-        while True:
-            if frame_current <= len(frames_in) - 1 and not (
-                frames_out_max and len(frames_out) == frames_out_max
-            ):
-                frames_out.append(frames_in[frame_current])
-            else:
-                while len(frames_out) == 0 or (
-                    frames_out_min and len(frames_out) < frames_out_min
-                ):
-                    frames_out.append(frames_in[-1])
-                return frames_out
-            frame_current_float += frame_increment
-            frame_current = int(rounding(frame_current_float))
+        # Output frame k use input frame round_half_up(frame_increment * k)
+        # Increments are accumulated one by one as float, same as stepping in a loop
+        frame_increment = float(frame_increment)
+        if frame_increment > 0:
+            frames_out_count = int(frames_in_count / frame_increment) + 2
+        else:
+            frames_out_count = frames_in_count
+        if frames_out_max:
+            frames_out_count = min(frames_out_count, frames_out_max)
+        frames_float = np.zeros(max(frames_out_count, 1))
+        np.cumsum(np.full(len(frames_float) - 1, frame_increment), out=frames_float[1:])
+        frames_floor = np.floor(frames_float)
+        frames_index = frames_floor.astype(np.int64) + (
+            frames_float - frames_floor >= 0.5
+        )
+
+        # Stop at first output frame beyond last input frame
+        frames_index = frames_index[
+            : np.searchsorted(frames_index, frames_in_count - 1, side="right")
+        ]
+        frames_out = frames_index.tolist()
+
+        while len(frames_out) == 0 or (
+            frames_out_min and len(frames_out) < frames_out_min
+        ):
+            frames_out.append(frames_in_count - 1)
+        return frames_out
 
     def frames_export(self) -> None:
         is_animated = len(self.frames_processed) > 1 and self.fps
@@ -811,11 +1534,10 @@ class StickerConvert:
         if len(self.frames_processed) == 1:
             return False
 
-        prev_frame = self.frames_processed[0]
-        for frame in self.frames_processed[1:]:
-            if np.array_equal(frame, prev_frame):
+        frames = self.frames_processed.frames()
+        for i in range(1, len(frames)):
+            if np.array_equal(frames[i], frames[i - 1]):
                 return True
-            prev_frame = frame
 
         return False
 
@@ -829,7 +1551,6 @@ class StickerConvert:
 
     def _frames_export_pyav(self) -> None:
         import av
-        from av.video.stream import VideoStream
 
         options_container: Dict[str, str] = {}
         options_stream: Dict[str, str] = {}
@@ -863,13 +1584,18 @@ class StickerConvert:
             options=options_container,
         ) as output:
             out_stream = output.add_stream(codec, rate=self.fps, options=options_stream)  # type: ignore
-            out_stream = cast(VideoStream, out_stream)
             assert isinstance(self.res_w, int) and isinstance(self.res_h, int)
             out_stream.width = self.res_w
             out_stream.height = self.res_h
             out_stream.pix_fmt = pixel_format
 
-            for frame in self.frames_processed:
+            frames: "Iterable[np.ndarray[Any, Any]]"
+            if self.frames_processed_iter is not None:
+                frames = self.frames_processed_iter
+            else:
+                frames = self.frames_processed
+            for frame in frames:
+                self.cancel_token.check()
                 av_frame = av.VideoFrame.from_ndarray(frame, format="rgba")
                 output.mux(out_stream.encode(av_frame))
             output.mux(out_stream.encode())
@@ -890,22 +1616,34 @@ class StickerConvert:
             # Change lowest alpha to alpha=0
             # Only keep alpha=0 and alpha=255, nothing in between
             extra_kwargs["format"] = "GIF"
-            frames_processed = np.array(self.frames_processed)
-            alpha = frames_processed[:, :, :, 3]
-            alpha_min = np.min(alpha)  # type: ignore
-            if alpha_min < 255:
-                alpha[alpha > alpha_min] = 255
-                alpha[alpha == alpha_min] = 0
-
-            if 0 in alpha:
+            quantize_key = self.get_quantize_cache_key()
+            quantize_cached = self.frame_cache.get(quantize_key)
+            if quantize_cached is None:
+                # Alpha is binarized one frame at a time
+                # instead of copying all frames
+                frames = self.frames_processed.frames()
+                alpha_min = int(np.min(frames[:, :, :, 3]))  # type: ignore
+                has_transparency = alpha_min < 255
+                im_out = []
+                for frame in frames:
+                    self.cancel_token.check()
+                    im = Image.fromarray(frame)  # type: ignore
+                    if has_transparency:
+                        # putalpha copy image first, frames_processed is not modified
+                        alpha = np.where(
+                            frame[:, :, 3] > alpha_min, np.uint8(255), np.uint8(0)
+                        )
+                        im.putalpha(Image.fromarray(alpha))  # type: ignore
+                        im_out.append(self.quantize(im))
+                    else:
+                        im_out.append(self.quantize(im.convert("RGB")).convert("RGB"))
+                self.frame_cache.put(quantize_key, (has_transparency, im_out))
+            else:
+                has_transparency, im_out = quantize_cached
+
+            if has_transparency:
                 extra_kwargs["transparency"] = 0
                 extra_kwargs["disposal"] = 2
-                im_out = [self.quantize(Image.fromarray(i)) for i in frames_processed]  # type: ignore
-            else:
-                im_out = [
-                    self.quantize(Image.fromarray(i).convert("RGB")).convert("RGB")  # type: ignore
-                    for i in frames_processed
-                ]
         elif self.out_f.suffix == ".webp":
             im_out = [Image.fromarray(i) for i in self.frames_processed]  # type: ignore
             extra_kwargs["format"] = "WebP"
@@ -934,8 +1672,12 @@ class StickerConvert:
         )
 
     def _frames_export_png(self) -> None:
-        with Image.fromarray(self.frames_processed[0], "RGBA") as image:  # type: ignore
-            image_quant = self.quantize(image)
+        quantize_key = self.get_quantize_cache_key()
+        image_quant = self.frame_cache.get(quantize_key)
+        if image_quant is None:
+            with Image.fromarray(self.frames_processed[0], "RGBA") as image:  # type: ignore
+                image_quant = self.quantize(image)
+            self.frame_cache.put(quantize_key, image_quant)
 
         with BytesIO() as f:
             image_quant.save(f, format="png")
@@ -949,19 +1691,31 @@ class StickerConvert:
         assert self.fps
         assert self.res_h
 
-        frames_concat = np.concatenate(self.frames_processed)
-        with Image.fromarray(frames_concat, "RGBA") as image_concat:  # type: ignore
-            if image_concat.getextrema()[3][0] < 255:  # type: ignore
-                mode = "RGBA"
-                create_frame_method = create_frame_from_rgba
-            else:
-                mode = "RGB"
-                create_frame_method = create_frame_from_rgb
-            image_quant = self.quantize(image_concat)
+        quantize_key = self.get_quantize_cache_key()
+        quantize_cached = self.frame_cache.get(quantize_key)
+        if quantize_cached is None:
+            # Frames are contiguous, so stacking vertically is a reshape without copy
+            frames = self.frames_processed.frames()
+            frames_concat = frames.reshape(-1, *frames.shape[2:])
+            with Image.fromarray(frames_concat, "RGBA") as image_concat:  # type: ignore
+                if image_concat.getextrema()[3][0] < 255:  # type: ignore
+                    mode = "RGBA"
+                else:
+                    mode = "RGB"
+                image_quant = self.quantize(image_concat)
+            self.frame_cache.put(quantize_key, (mode, image_quant))
+        else:
+            mode, image_quant = quantize_cached
+
+        if mode == "RGBA":
+            create_frame_method = create_frame_from_rgba
+        else:
+            create_frame_method = create_frame_from_rgb
 
-        if self.apngasm is None:
-            self.apngasm = APNGAsm()  # type: ignore
-        assert isinstance(self.apngasm, APNGAsm)
+        apngasm = get_apngasm()
+        assert isinstance(apngasm, APNGAsm)
+        # Frames are left behind if previous conversion failed while adding them
+        apngasm.reset()
 
         delay_num = int(1000 / self.fps)
         for i in range(0, image_quant.height, self.res_h):
@@ -975,31 +1729,44 @@ class StickerConvert:
                 delay_num=delay_num,
                 delay_den=1000,
             )
-            self.apngasm.add_frame(frame_final)
+            apngasm.add_frame(frame_final)
 
         with CacheStore.get_cache_store(path=self.opt_comp.cache_dir) as tempdir:
             tmp_apng = Path(tempdir, f"out{self.out_f.suffix}")
-            self.apngasm.assemble(tmp_apng.as_posix())
+            apngasm.assemble(tmp_apng.as_posix())
 
             with open(tmp_apng, "rb") as f:
                 apng_optimized = self.optimize_png(f.read())
                 self.tmp_f.write(apng_optimized)
 
-        self.apngasm.reset()
+        apngasm.reset()
 
     def optimize_png(self, image_bytes: bytes) -> bytes:
         import oxipng
 
-        return oxipng.optimize_from_memory(
-            image_bytes,
-            level=6,
-            fix_errors=True,
-            filter=[oxipng.RowFilter.Brute],
-            optimize_alpha=True,
-            strip=oxipng.StripChunks.safe(),
-        )
+        with self.time_stage("optimize"):
+            return oxipng.optimize_from_memory(
+                image_bytes,
+                level=6,
+                fix_errors=True,
+                filter=[oxipng.RowFilter.Brute],
+                optimize_alpha=True,
+                strip=oxipng.StripChunks.safe(),
+            )
+
+    def get_quantize_cache_key(self) -> Tuple[Any, ...]:
+        # imagequant also use quality for dithering and quality limit
+        if self.opt_comp.quantize_method == "imagequant":
+            quality = self.quality
+        else:
+            quality = None
+        return ("quantize", self.res_w, self.res_h, self.fps, self.color, quality)
 
     def quantize(self, image: Image.Image) -> Image.Image:
+        with self.time_stage("quantize"):
+            return self._quantize(image)
+
+    def _quantize(self, image: Image.Image) -> Image.Image:
         if not (self.color and self.color <= 256):
             return image.copy()
         if self.opt_comp.quantize_method == "imagequant":
@@ -1007,7 +1774,8 @@ class StickerConvert:
         if self.opt_comp.quantize_method in ("mediancut", "maxcoverage", "fastoctree"):
             return self._quantize_by_pillow(image)
 
-        return image
+        # Copy, as image may share memory with FrameStore that will be reused
+        return image.copy()
 
     def _quantize_by_imagequant(self, image: Image.Image) -> Image.Image:
         import imagequant  # type: ignore
@@ -1034,7 +1802,7 @@ class StickerConvert:
             except RuntimeError:
                 pass
 
-        return image
+        return image.copy()
 
     def _quantize_by_pillow(self, image: Image.Image) -> Image.Image:
         assert self.color
@@ -51,6 +51,7 @@ class DownloadBand(DownloadBase):
                 out_path = Path(self.out_dir, str(num).zfill(3) + f".{ext}")
                 with open(out_path, "wb") as f:
                     f.write(data)
+                self.file_ready(out_path)
 
                 self.cb.put("update_bar")
 
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import os
+import time
+from dataclasses import dataclass
 from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Literal, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 import anyio
 import httpx
@@ -12,6 +16,38 @@ import requests
 from sticker_convert.job_option import CredOption, InputOption
 from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
 
+# Maximum number of concurrent downloads from the same host
+DOWNLOAD_HOST_CONCURRENCY = 4
+DOWNLOAD_CHUNK_SIZE = 102400
+# Wait DOWNLOAD_BACKOFF_BASE * 2^n seconds before retry n + 1
+DOWNLOAD_BACKOFF_BASE = 0.5
+DOWNLOAD_BACKOFF_MAX = 8.0
+# Status codes worth retrying, other errors are not temporary
+DOWNLOAD_RETRY_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+@dataclass
+class DownloadStats:
+    url: str
+    size: int = 0
+    elapsed: float = 0.0
+    attempts: int = 0
+    resumed: bool = False
+    success: bool = False
+
+    def __str__(self) -> str:
+        speed = self.size / self.elapsed / 1024 if self.elapsed else 0.0
+        msg = f"{self.size} bytes in {self.elapsed:.2f}s ({speed:.0f} KiB/s)"
+        if self.attempts > 1:
+            msg += f", {self.attempts} attempts"
+        if self.resumed:
+            msg += ", resumed"
+        return msg
+
+
+def get_backoff(retry: int) -> float:
+    return min(DOWNLOAD_BACKOFF_BASE * 2**retry, DOWNLOAD_BACKOFF_MAX)
+
 
 class DownloadBase:
     def __init__(
@@ -27,14 +63,21 @@ class DownloadBase:
         self.opt_cred = opt_cred
         self.cb = cb
         self.cb_return = cb_return
+        # Reuse connections across download_file calls
+        self.session = requests.Session()
+        self.download_stats: List[DownloadStats] = []
 
     def download_multiple_files(
         self,
         targets: List[Tuple[str, Path]],
         retries: int = 3,
         headers: Optional[dict[Any, Any]] = None,
+        process_data: Optional[Callable[[Path, bytes], bytes]] = None,
+        notify_ready: bool = True,
         **kwargs: Any,
     ) -> Dict[str, bool]:
+        # process_data(dest, data) may transform downloaded data before it is written
+        # Set notify_ready to False if downloaded files are not stickers ready to be compressed
         results: Dict[str, bool] = {}
         anyio.run(
             partial(
@@ -43,6 +86,8 @@ class DownloadBase:
                 retries,
                 headers,
                 results,
+                process_data,
+                notify_ready,
                 **kwargs,
             )
         )
@@ -54,6 +99,8 @@ class DownloadBase:
         retries: int = 3,
         headers: Optional[dict[Any, Any]] = None,
         results: Optional[dict[str, bool]] = None,
+        process_data: Optional[Callable[[Path, bytes], bytes]] = None,
+        notify_ready: bool = True,
         **kwargs: Any,
     ) -> None:
         # targets format: [(url1, dest2), (url2, dest2), ...]
@@ -61,20 +108,31 @@ class DownloadBase:
             ("bar", None, {"set_progress_mode": "determinate", "steps": len(targets)})
         )
 
-        semaphore = anyio.Semaphore(4)
+        host_semaphores: Dict[str, anyio.Semaphore] = {}
+        limits = httpx.Limits(
+            max_keepalive_connections=DOWNLOAD_HOST_CONCURRENCY,
+            max_connections=None,
+        )
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(limits=limits) as client:
             async with anyio.create_task_group() as tg:
                 for url, dest in targets:
+                    host = urlparse(url).netloc
+                    if host not in host_semaphores:
+                        host_semaphores[host] = anyio.Semaphore(
+                            DOWNLOAD_HOST_CONCURRENCY
+                        )
                     tg.start_soon(
                         self.download_file_async,
-                        semaphore,
+                        host_semaphores[host],
                         client,
                         url,
                         dest,
                         retries,
                         headers,
                         results,
+                        process_data,
+                        notify_ready,
                         **kwargs,
                     )
 
@@ -87,28 +145,103 @@ class DownloadBase:
         retries: int = 3,
         headers: Optional[dict[Any, Any]] = None,
         results: Optional[dict[str, bool]] = None,
+        process_data: Optional[Callable[[Path, bytes], bytes]] = None,
+        notify_ready: bool = True,
         **kwargs: Any,
     ) -> None:
+        stats = DownloadStats(url)
+        self.download_stats.append(stats)
+        dest_part = dest.with_name(dest.name + ".part")
+
         async with semaphore:
             self.cb.put(f"Downloading {url}")
-            success = False
-            for retry in range(retries):
-                response = await client.get(
-                    url, follow_redirects=True, headers=headers, **kwargs
-                )
-                success = response.is_success
+            time_start = time.perf_counter()
+            retry = 0
+            range_restarted = False
+            while retry < retries:
+                if retry > 0:
+                    await anyio.sleep(get_backoff(retry - 1))
+                stats.attempts += 1
 
-                if success:
-                    async with await anyio.open_file(dest, "wb+") as f:
-                        await f.write(response.content)
-                    self.cb.put(f"Downloaded {url}")
-                else:
+                request_headers = dict(headers) if headers else {}
+                if stats.size > 0 and process_data is None:
+                    request_headers["Range"] = f"bytes={stats.size}-"
+
+                try:
+                    async with client.stream(
+                        "GET",
+                        url,
+                        follow_redirects=True,
+                        headers=request_headers,
+                        **kwargs,
+                    ) as response:
+                        if (
+                            response.status_code == 416
+                            and "Range" in request_headers
+                            and not range_restarted
+                        ):
+                            # Partial download does not match file on server
+                            self.cb.put(f"Cannot resume {url}, downloading again")
+                            range_restarted = True
+                            stats.size = 0
+                            await anyio.Path(dest_part).unlink(missing_ok=True)
+                            continue
+                        if not response.is_success:
+                            self.cb.put(
+                                f"Error {response.status_code}: {url} (tried {retry + 1}/{retries} times)"
+                            )
+                            retry += 1
+                            if response.status_code in DOWNLOAD_RETRY_STATUS:
+                                continue
+                            break
+
+                        if response.status_code == 206:
+                            stats.resumed = True
+                        else:
+                            stats.resumed = False
+                            stats.size = 0
+
+                        if process_data is not None:
+                            # Whole file is needed by process_data
+                            data = bytearray()
+                            async for chunk in response.aiter_bytes(
+                                DOWNLOAD_CHUNK_SIZE
+                            ):
+                                data += chunk
+                                stats.size += len(chunk)
+                            async with await anyio.open_file(dest, "wb") as f:
+                                await f.write(process_data(dest, bytes(data)))
+                        else:
+                            mode: Literal["ab", "wb"] = (
+                                "ab" if stats.resumed and stats.size else "wb"
+                            )
+                            async with await anyio.open_file(dest_part, mode) as f:
+                                async for chunk in response.aiter_bytes(
+                                    DOWNLOAD_CHUNK_SIZE
+                                ):
+                                    await f.write(chunk)
+                                    stats.size += len(chunk)
+                            await anyio.Path(dest_part).replace(dest)
+                except httpx.HTTPError as e:
                     self.cb.put(
-                        f"Error {response.status_code}: {url} (tried {retry + 1}/{retries} times)"
+                        f"Cannot download {url} (tried {retry + 1}/{retries} times): {e}"
                     )
+                    retry += 1
+                    continue
+
+                stats.success = True
+                break
+
+            stats.elapsed = time.perf_counter() - time_start
+            if stats.success:
+                self.cb.put(f"Downloaded {url} ({stats})")
+                if notify_ready:
+                    self.file_ready(dest)
+            elif dest_part.is_file():
+                dest_part.unlink()
 
             if results is not None:
-                results[url] = success
+                results[url] = stats.success
 
             self.cb.put("update_bar")
 
@@ -120,47 +253,138 @@ class DownloadBase:
         show_progress: bool = True,
         **kwargs: Any,
     ) -> bytes:
-        result = b""
-        chunk_size = 102400
+        # Return downloaded data, or b"" if failed or written to dest
+        # Interrupted download is resumed with Range request if server support it
+        stats = DownloadStats(url)
+        self.download_stats.append(stats)
 
-        for retry in range(retries):
-            try:
-                response = requests.get(
-                    url, stream=True, allow_redirects=True, **kwargs
-                )
-                if not response.ok:
-                    return b""
-                total_length = int(response.headers.get("content-length"))  # type: ignore
+        f: Union[BinaryIO, bytearray]
+        # Written to .part first, and renamed to dest once complete
+        dest_part: Optional[Path] = None
+        if dest:
+            dest_part = dest.with_name(dest.name + ".part")
+            f = open(dest_part, "wb")
+        else:
+            f = bytearray()
+
+        headers_base: Dict[str, str] = dict(kwargs.pop("headers", None) or {})
+        time_start = time.perf_counter()
+        try:
+            retry = 0
+            range_restarted = False
+            while retry < retries:
+                if retry > 0:
+                    time.sleep(get_backoff(retry - 1))
+                stats.attempts += 1
 
-                self.cb.put(f"Downloading {url}")
+                headers = dict(headers_base)
+                if stats.size > 0:
+                    headers["Range"] = f"bytes={stats.size}-"
 
-                if show_progress:
-                    steps = (total_length / chunk_size) + 1
+                try:
+                    self._download_file_attempt(
+                        url, f, stats, show_progress, headers=headers, **kwargs
+                    )
+                except requests.exceptions.RequestException as e:
+                    status_code = None
+                    if (
+                        isinstance(e, requests.exceptions.HTTPError)
+                        and e.response is not None
+                    ):
+                        status_code = e.response.status_code
+                    if (
+                        status_code == 416
+                        and "Range" in headers
+                        and not range_restarted
+                    ):
+                        # Partial download does not match file on server
+                        self.cb.put(f"Cannot resume {url}, downloading again")
+                        range_restarted = True
+                        self._discard_partial(f, stats)
+                        continue
                     self.cb.put(
-                        (
-                            "bar",
-                            None,
-                            {"set_progress_mode": "determinate", "steps": int(steps)},
-                        )
+                        f"Cannot download {url} (tried {retry + 1}/{retries} times): {e}"
                     )
+                    retry += 1
+                    if (
+                        status_code is not None
+                        and status_code not in DOWNLOAD_RETRY_STATUS
+                    ):
+                        break
+                    continue
 
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        result += chunk
-                        if show_progress:
-                            self.cb.put("update_bar")
-
+                stats.success = True
                 break
-            except requests.exceptions.RequestException as e:
-                self.cb.put(
-                    f"Cannot download {url} (tried {retry + 1}/{retries} times): {e}"
-                )
+        finally:
+            stats.elapsed = time.perf_counter() - time_start
+            if dest and dest_part and not isinstance(f, bytearray):
+                f.close()
+                if stats.success and stats.size > 0:
+                    os.replace(dest_part, dest)
+                else:
+                    dest_part.unlink(missing_ok=True)
 
-        if not result:
+        if not stats.success or stats.size == 0:
             return b""
+        self.cb.put(f"Downloaded {url} ({stats})")
+        if isinstance(f, bytearray):
+            return bytes(f)
         if dest:
-            with open(dest, "wb+") as f:
-                f.write(result)
-            self.cb.put(f"Downloaded {url}")
-            return b""
-        return result
+            self.file_ready(dest)
+        return b""
+
+    def file_ready(self, path: Path) -> None:
+        # Tell Job that path is written completely and would not be modified,
+        # so it can be compressed while other files are still downloading
+        self.cb.put(("file_ready", (str(path),), None))
+
+    @staticmethod
+    def _discard_partial(f: Union[BinaryIO, bytearray], stats: DownloadStats) -> None:
+        # Empty .part file or buffer, so download starts over
+        stats.size = 0
+        if isinstance(f, bytearray):
+            f.clear()
+        else:
+            f.seek(0)
+            f.truncate()
+
+    def _download_file_attempt(
+        self,
+        url: str,
+        f: Union[BinaryIO, bytearray],
+        stats: DownloadStats,
+        show_progress: bool,
+        **kwargs: Any,
+    ) -> None:
+        with self.session.get(url, stream=True, allow_redirects=True, **kwargs) as response:
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                stats.resumed = True
+            elif stats.size > 0:
+                # Server ignored Range, start over
+                stats.resumed = False
+                self._discard_partial(f, stats)
+
+            content_length = response.headers.get("content-length")
+            self.cb.put(f"Downloading {url}")
+
+            if show_progress and content_length:
+                steps = (int(content_length) / DOWNLOAD_CHUNK_SIZE) + 1
+                self.cb.put(
+                    (
+                        "bar",
+                        None,
+                        {"set_progress_mode": "determinate", "steps": int(steps)},
+                    )
+                )
+
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    if isinstance(f, bytearray):
+                        f += chunk
+                    else:
+                        f.write(chunk)
+                    stats.size += len(chunk)
+                    if show_progress and content_length:
+                        self.cb.put("update_bar")
@@ -359,6 +359,7 @@ class DownloadKakao(DownloadBase):
 
         assert play_path_format
         targets: list[tuple[str, Path]] = []
+        sound_targets: list[tuple[str, Path]] = []
         for num in range(1, stickers_count + 1):
             play_url = "https://item.kakaocdn.net/" + play_path_format.replace(
                 "##", str(num).zfill(2)
@@ -371,27 +372,28 @@ class DownloadKakao(DownloadBase):
                     "##", str(num).zfill(2)
                 )
                 sound_dl_path = Path(self.out_dir, str(num).zfill(3) + sound_ext)
-                targets.append((sound_url, sound_dl_path))
+                sound_targets.append((sound_url, sound_dl_path))
 
-        results = self.download_multiple_files(targets, headers=headers)
-
-        for target in targets:
-            f_path = target[1]
-            ext = Path(f_path).suffix
-
-            if ext not in (".gif", ".webp"):
-                continue
+        def decrypt(dest: Path, data: bytes) -> bytes:
+            if dest.suffix not in (".gif", ".webp"):
+                return data
+            self.cb.put(f"Decrypted {dest}")
+            return DecryptKakao.xor_data(data)
 
-            with open(f_path, "rb") as f:
-                data = f.read()
-            data = DecryptKakao.xor_data(data)
-            self.cb.put(f"Decrypted {f_path}")
-            with open(f_path, "wb+") as f:
-                f.write(data)
+        results = self.download_multiple_files(
+            targets, headers=headers, process_data=decrypt
+        )
+        # Sound files are not stickers, so they are not sent for compressing
+        if sound_targets:
+            results.update(
+                self.download_multiple_files(
+                    sound_targets, headers=headers, notify_ready=False
+                )
+            )
 
         self.cb.put(f"Finished getting {item_code}")
 
-        return sum(results.values()), len(targets)
+        return sum(results.values()), len(targets) + len(sound_targets)
 
     @staticmethod
     def start(
@@ -238,6 +238,9 @@ class DownloadLine(DownloadBase):
         out_path = Path(self.out_dir, prefix + str(num).zfill(3) + suffix + ext)
         with open(out_path, "wb") as f:
             f.write(data)
+        # Custom text is combined into stickers after all of them are unzipped
+        if self.resource_type not in ("PER_STICKER_TEXT", "NAME_TEXT"):
+            self.file_ready(out_path)
 
     def decompress_emoticon(self, zip_file: bytes) -> None:
         with zipfile.ZipFile(BytesIO(zip_file)) as zf:
@@ -434,9 +437,7 @@ class DownloadLine(DownloadBase):
         pack_url = self.get_pack_url()
         zip_file = self.download_file(pack_url)
 
-        if zip_file:
-            self.cb.put(f"Downloaded {pack_url}")
-        else:
+        if not zip_file:
             self.cb.put(f"Cannot download {pack_url}")
             return 0, 0
 
@@ -459,7 +460,9 @@ class DownloadLine(DownloadBase):
             )
             self.cb.put("Continuing without adding custom text to stickers")
 
-        self.download_multiple_files(custom_sticker_text_urls, headers=self.headers)
+        self.download_multiple_files(
+            custom_sticker_text_urls, headers=self.headers, notify_ready=False
+        )
         self.combine_custom_text()
 
         return len(self.pack_files), len(self.pack_files)
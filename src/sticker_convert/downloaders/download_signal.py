@@ -55,6 +55,7 @@ class DownloadSignal(DownloadBase):
                 f_path.rename(f_path_new)
                 msg = f"Downloaded {f_id}.{codec}"
                 self.cb.put(msg)
+                self.file_ready(f_path_new)
 
             self.cb.put("update_bar")
 
@@ -83,6 +83,7 @@ class DownloadViber(DownloadBase):
                 out_path = Path(self.out_dir, num + ext)
                 with open(out_path, "wb") as f:
                     f.write(data)
+                self.file_ready(out_path)
 
                 self.cb.put("update_bar")
 
@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import atexit
+import heapq
+import math
 import os
 import shutil
+import time
 import traceback
 from datetime import datetime
-from multiprocessing import Manager, Process, Value
+from multiprocessing import Pipe, get_all_start_methods, get_context
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from multiprocessing.sharedctypes import SynchronizedArray
 from pathlib import Path
-from threading import Thread
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 from urllib.parse import urlparse
 
+import psutil
+
 from sticker_convert.converter import StickerConvert
 from sticker_convert.downloaders.download_band import DownloadBand
 from sticker_convert.downloaders.download_discord import DownloadDiscord
@@ -22,16 +32,297 @@ from sticker_convert.downloaders.download_telegram import DownloadTelegram
 from sticker_convert.downloaders.download_viber import DownloadViber
 from sticker_convert.job_option import CompOption, CredOption, InputOption, OutputOption
 from sticker_convert.uploaders.compress_wastickers import CompressWastickers
+from sticker_convert.uploaders.upload_base import UploadBase
 from sticker_convert.uploaders.upload_signal import UploadSignal
 from sticker_convert.uploaders.upload_telegram import UploadTelegram
 from sticker_convert.uploaders.upload_viber import UploadViber
 from sticker_convert.uploaders.xcode_imessage import XcodeImessage
-from sticker_convert.utils.callback import CallbackReturn, CbQueueType, ResultsListType, WorkQueueType
+from sticker_convert.utils.callback import CallbackBuffer, CallbackProtocol, CallbackReturn, CbQueueItemType, StickersQueueType, WorkQueueItemType, WorkQueueType
+from sticker_convert.utils.cancel import CancelToken, set_cancel_token
 from sticker_convert.utils.files.json_resources_loader import OUTPUT_JSON
 from sticker_convert.utils.files.metadata_handler import MetadataHandler
 from sticker_convert.utils.media.codec_info import CodecInfo
 from sticker_convert.utils.singletons import singletons
 
+# Imported by forkserver, so workers forked from it do not import them again.
+# sticker_convert.job is needed for unpickling WorkerPool.worker
+FORKSERVER_PRELOAD = ["sticker_convert.utils.preload", "sticker_convert.job"]
+# Seconds to wait for a worker to close singletons and exit
+WORKER_SHUTDOWN_TIMEOUT = 5
+# Work predicted to take less than this number of seconds in total are sent
+# to a worker together, up to this number of work
+WORK_CHUNK_SECONDS = 0.5
+WORK_CHUNK_SIZE_MAX = 8
+# Number of slowest work listed in report after compressing
+WORK_REPORT_LINES = 10
+# Seconds for running work to stop by its cancel token after job is
+# cancelled, before their workers are killed
+WORK_CANCEL_TIMEOUT = 2
+
+# Fraction of available memory used as memory budget of compressing,
+# if CompOption.memory_max is not set
+MEMORY_BUDGET_AVAILABLE = 0.8
+
+# (-cost, work_id, work_func, work_args, cost, label, memory)
+PendingWork = Tuple[
+    float,
+    int,
+    Callable[..., Any],
+    Tuple[Any, ...],
+    Optional[float],
+    Optional[str],
+    Optional[int],
+]
+
+
+class WorkerPool:
+    # Worker processes started once and shared by Executor of every stage of
+    # every job. Each worker send callback items in batches through its own
+    # pipe, tagged with the Executor that sent the work, so results and
+    # callbacks of jobs do not mix
+    def __init__(self, start_method: Optional[str] = None) -> None:
+        # None for default of platform, i.e. fork on Linux and spawn otherwise
+        self.start_method = start_method
+        self.ctx = get_context(start_method)
+        if start_method == "forkserver":
+            # Must be set before the server is started by first process
+            self.ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+        # Process class of start_method, not typed on BaseContext
+        self.process_class: Type[BaseProcess] = self.ctx.Process  # type: ignore
+        self.manager = self.ctx.Manager()
+        self.work_queue: WorkQueueType = self.manager.Queue()
+        self.ready_queue: Queue[Tuple[int, float]] = Queue()
+        self.processes: List[BaseProcess] = []
+        self.exitcodes: Dict[int, Optional[int]] = {}
+        # pid: (executor_id, work_id) of work running in worker, (0, 0) if idle
+        self.current_work: Dict[int, SynchronizedArray[int]] = {}
+        # Seconds from starting a worker until it is ready to accept work
+        self.startup_times: Dict[int, float] = {}
+        # Total processes requested by Executor that are running now
+        self.reserved = 0
+        self.lock = Lock()
+
+        # executor_id: queue of callback batches read by Executor.cb_thread
+        self.cb_queues: Dict[int, Queue[Optional[List[CbQueueItemType]]]] = {}
+        self.cb_conns: List[Connection] = []
+        self.cb_lock = Lock()
+        self.executor_count = 0
+        # For waking up cb_dispatch_thread when a worker is added
+        self.cb_wakeup_conn, self.cb_wakeup_conn_send = Pipe(duplex=False)
+        Thread(target=self.cb_dispatch_thread, daemon=True).start()
+
+    @staticmethod
+    def worker(
+        work_queue: WorkQueueType,
+        cb_conn: Connection,
+        current_work: SynchronizedArray[int],
+        time_start: float,
+    ) -> None:
+        # Loaded already if forked from forkserver
+        import sticker_convert.utils.preload  # noqa: F401  # pyright: ignore[reportUnusedImport]
+
+        cb = CallbackBuffer(cb_conn)
+        cb.put(("__WORKER_READY__", (os.getpid(), time.time() - time_start), None))
+        cb.flush()
+
+        for item in iter(work_queue.get, None):
+            work_id, executor_id, works, cb_return, is_cancel_job = item
+            cb.set_executor(executor_id)
+            results_list: List[Any] = []
+            elapsed_list: List[float] = []
+            if is_cancel_job.value == 1:
+                cb.put(("__WORK_DONE__", (work_id, results_list, elapsed_list), None))
+                cb.flush()
+                continue
+
+            # Set and sent immediately, so Executor knows which worker to kill
+            # if cancelled, and worker is not killed after taking other work
+            with current_work.get_lock():
+                current_work[:] = [executor_id, work_id]
+            cb.put(("__WORK_START__", (work_id, os.getpid()), None))
+            cb.flush()
+            # Work checking cancel token stop when job is cancelled
+            set_cancel_token(CancelToken(is_cancel_job))
+            # Small work are sent in chunks of several work
+            for work_func, work_args in works:
+                time_start = time.perf_counter()
+                results = None
+                try:
+                    results = work_func(*work_args, cb, cb_return)
+                except Exception:
+                    arg_dump: List[Any] = []
+                    for i in work_args:
+                        if isinstance(i, CredOption):
+                            arg_dump.append("CredOption(REDACTED)")
+                        else:
+                            arg_dump.append(i)
+                    e = "##### EXCEPTION #####\n"
+                    e += "Function: " + repr(work_func) + "\n"
+                    e += "Arguments: " + repr(arg_dump) + "\n"
+                    e += traceback.format_exc()
+                    e += "#####################"
+                    cb.put(e)
+                results_list.append(results)
+                elapsed_list.append(time.perf_counter() - time_start)
+            set_cancel_token(CancelToken())
+            with current_work.get_lock():
+                current_work[:] = [0, 0]
+            cb.put(("__WORK_DONE__", (work_id, results_list, elapsed_list), None))
+            cb.flush()
+
+        singletons.close()
+
+    def cb_dispatch_thread(self) -> None:
+        # Route callback batches from workers to Executor they belong to
+        while True:
+            with self.cb_lock:
+                conns = [self.cb_wakeup_conn, *self.cb_conns]
+            for conn in wait(conns):
+                assert isinstance(conn, Connection)
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    # Worker exited
+                    with self.cb_lock:
+                        self.cb_conns.remove(conn)
+                    conn.close()
+                    continue
+                if conn is self.cb_wakeup_conn:
+                    continue
+
+                executor_id, batch = msg
+                if executor_id is None:
+                    for _, args, _ in batch:
+                        self.ready_queue.put(args)
+                    continue
+                with self.cb_lock:
+                    cb_queue = self.cb_queues.get(executor_id)
+                # Executor cleaned up already if None
+                if cb_queue is not None:
+                    cb_queue.put(batch)
+
+    def register(self, cb_queue: Queue[Optional[List[CbQueueItemType]]]) -> int:
+        with self.cb_lock:
+            self.executor_count += 1
+            self.cb_queues[self.executor_count] = cb_queue
+            return self.executor_count
+
+    def unregister(self, executor_id: int) -> None:
+        with self.cb_lock:
+            self.cb_queues.pop(executor_id, None)
+
+    def reserve(self, processes: int) -> List[float]:
+        with self.lock:
+            self.reserved += processes
+        return self.ensure_workers()
+
+    def release(self, processes: int) -> None:
+        # Workers are kept running for next stage or job
+        with self.lock:
+            self.reserved -= processes
+
+    def ensure_workers(self) -> List[float]:
+        # Start workers until there are enough for all reserved processes,
+        # replacing those exited. Return startup time of started workers
+        with self.lock:
+            for process in self.processes:
+                if process.pid is not None and not process.is_alive():
+                    self.exitcodes[process.pid] = process.exitcode
+                    self.current_work.pop(process.pid, None)
+            self.processes = [i for i in self.processes if i.is_alive()]
+
+            started: List[BaseProcess] = []
+            for _ in range(self.reserved - len(self.processes)):
+                cb_conn, cb_conn_send = self.ctx.Pipe(duplex=False)
+                current_work: SynchronizedArray[int] = self.ctx.Array("q", 2)
+                process = self.process_class(
+                    target=WorkerPool.worker,
+                    args=(self.work_queue, cb_conn_send, current_work, time.time()),
+                    daemon=True,
+                )
+                process.start()
+                assert process.pid is not None
+                self.current_work[process.pid] = current_work
+                # Only worker should hold the sending end, so that reading
+                # from cb_conn fails when worker exits
+                cb_conn_send.close()
+                with self.cb_lock:
+                    self.cb_conns.append(cb_conn)
+                self.cb_wakeup_conn_send.send(None)
+                self.processes.append(process)
+                started.append(process)
+
+            startup_times: List[float] = []
+            waiting = {i.pid for i in started}
+            while waiting:
+                try:
+                    pid, startup_time = self.ready_queue.get(timeout=0.5)
+                except Empty:
+                    waiting = {
+                        i.pid for i in started if i.pid in waiting and i.is_alive()
+                    }
+                    continue
+                waiting.discard(pid)
+                self.startup_times[pid] = startup_time
+                startup_times.append(startup_time)
+
+            return startup_times
+
+    def get_exitcode(self, pid: int) -> Optional[int]:
+        # None if worker is still running
+        for process in self.processes:
+            if process.pid == pid:
+                return process.exitcode
+        return self.exitcodes.get(pid, -1)
+
+    def terminate(self, executor_id: int, work_pids: Dict[int, int]) -> None:
+        # Kill workers running work_id: pid of Executor. A worker may have
+        # finished the work and taken work of another Executor, so it is only
+        # killed if still running the same work
+        processes = {i.pid: i for i in self.processes}
+        for work_id, pid in work_pids.items():
+            process = processes.get(pid)
+            current_work = self.current_work.get(pid)
+            if process is None or current_work is None:
+                continue
+            # Held until killed, so worker cannot take other work meanwhile
+            with current_work.get_lock():
+                if current_work[:] == [executor_id, work_id]:
+                    process.terminate()
+
+    def shutdown(self) -> None:
+        # Let workers close singletons before exit, e.g. Chrome for converting
+        processes = [i for i in self.processes if i.is_alive()]
+        try:
+            for _ in processes:
+                self.work_queue.put(None)
+        except (EOFError, OSError):
+            pass
+        for process in processes:
+            process.join(WORKER_SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.processes.clear()
+
+
+# start_method: WorkerPool, None for default of platform
+worker_pools: Dict[Optional[str], WorkerPool] = {}
+worker_pools_lock = Lock()
+
+
+def get_worker_pool(start_method: Optional[str] = None) -> WorkerPool:
+    # Started when first needed, so importing this module does not start
+    # processes, e.g. in spawned workers
+    # One pool for each start_method, as an Executor may still hold a pool
+    # while a job with another start_method is started
+    with worker_pools_lock:
+        worker_pool = worker_pools.get(start_method)
+        if worker_pool is None:
+            worker_pool = WorkerPool(start_method)
+            worker_pools[start_method] = worker_pool
+            atexit.register(worker_pool.shutdown)
+        return worker_pool
+
 
 class Executor:
     def __init__(
@@ -41,6 +332,8 @@ class Executor:
         cb_bar: Callable[..., None],
         cb_ask_bool: Callable[..., bool],
         cb_ask_str: Callable[..., str],
+        pool: Optional[WorkerPool] = None,
+        start_method: Optional[str] = None,
     ) -> None:
         self.cb_msg = cb_msg
         self.cb_msg_block = cb_msg_block
@@ -48,43 +341,74 @@ class Executor:
         self.cb_ask_bool = cb_ask_bool
         self.cb_ask_str = cb_ask_str
 
-        self.manager = Manager()
-        self.work_queue: WorkQueueType = self.manager.Queue()
-        self.cb_queue: CbQueueType = self.manager.Queue()
-        self.results_list: ResultsListType = self.manager.list()
+        self.pool = pool if pool else get_worker_pool(start_method)
+        self.manager = self.pool.manager
+        # Batches of callback items from workers, sent by pool
+        self.cb_queue: Queue[Optional[List[CbQueueItemType]]] = Queue()
+        self.executor_id: Optional[int] = None
+        self.results_list: List[Any] = []
         self.cb_return = CallbackReturn(self.manager)
-        self.processes: List[Process] = []
 
-        self.is_cancel_job = Value("i", 0)
+        self.is_cancel_job = self.manager.Value("i", 0)
+
+        # Work is sent to pool at most `processes` at a time, rest are pending.
+        # Pending work is sent with most costly first, so that no worker is
+        # left with a long work after others are done
+        self.processes = 0
+        self.work_count = 0
+        self.work_pending: List[PendingWork] = []
+        # work_id: pid of worker, or None if not yet started
+        self.work_running: Dict[int, Optional[int]] = {}
+        self.work_sent: Dict[int, List[PendingWork]] = {}
+        # (label, cost, seconds) of finished work with cost estimate
+        self.work_stats: List[Tuple[str, float, float]] = []
+        self.work_running_max = 0
+
+        # Work with memory estimate is only sent if it fits memory budget,
+        # so fewer workers run at once when converting large files
+        self.memory_budget: Optional[int] = None
+        self.memory_used = 0
+        self.memory_used_max = 0
+        # work_id: memory reserved by work that is sent
+        self.memory_running: Dict[int, int] = {}
+        # work_id of work waiting for memory, reported once
+        self.memory_waiting: Optional[int] = None
+        self.work_done = Event()
+        self.work_done.set()
+        self.work_lock = Lock()
 
         self.cb_thread_instance: Optional[Thread] = None
+        # Extra actions handled in cb thread, e.g. file_ready when pipelining
+        self.cb_handlers: Dict[str, Callable[..., None]] = {}
 
     def cb_thread(
         self,
-        cb_queue: CbQueueType,
-        processes: int,
+        cb_queue: Queue[Optional[List[CbQueueItemType]]],
     ) -> None:
-        processes_done = 0
-        for i in iter(cb_queue.get, None):
-            if i == "__PROCESS_DONE__":
-                processes_done += 1
-                if processes_done == processes:
-                    cb_queue.put(None)
-                continue
-            if isinstance(i, tuple):
-                action = i[0]
-                if len(i) >= 2:
-                    args: Tuple[str, ...] = i[1] if i[1] else tuple()
-                else:
-                    args = tuple()
-                if len(i) >= 3:
-                    kwargs: Dict[str, str] = i[2] if i[2] else {}
-                else:
-                    kwargs = {}
+        for batch in iter(cb_queue.get, None):
+            for i in batch:
+                self.cb_dispatch(i)
+
+    def cb_dispatch(self, i: CbQueueItemType) -> None:
+        if isinstance(i, tuple):
+            action = i[0]
+            if len(i) >= 2:
+                args: Tuple[Any, ...] = i[1] if i[1] else tuple()
             else:
-                action = i
                 args = tuple()
+            if len(i) >= 3:
+                kwargs: Dict[str, Any] = i[2] if i[2] else {}
+            else:
                 kwargs = {}
+        else:
+            action = i
+            args = tuple()
+            kwargs = {}
+        if action == "__WORK_START__":
+            self.start_work(args[0], args[1])
+        elif action == "__WORK_DONE__":
+            self.finish_work(args[0], args[1], args[2])
+        else:
             self.cb(action, args, kwargs)
 
     def cb(
@@ -102,103 +426,300 @@ class Executor:
         elif action == "bar":
             self.cb_bar(*args, **kwargs)
         elif action == "update_bar":
-            self.cb_bar(update_bar=1)
+            # Consecutive update_bar from worker are merged
+            self.cb_bar(update_bar=kwargs.get("update_bar", 1))
         elif action == "msg_block":
             self.cb_return.set_response(self.cb_msg_block(*args, **kwargs))
         elif action == "ask_bool":
             self.cb_return.set_response(self.cb_ask_bool(*args, **kwargs))
         elif action == "ask_str":
             self.cb_return.set_response(self.cb_ask_str(*args, **kwargs))
+        elif action is not None and action in self.cb_handlers:
+            self.cb_handlers[action](*args, **kwargs)
+        elif action == "file_ready":
+            # Only needed if download and compress are pipelined
+            pass
         else:
             self.cb_msg(action)
 
-    @staticmethod
-    def worker(
-        work_queue: WorkQueueType,
-        results_list: ResultsListType,
-        cb_queue: CbQueueType,
-        cb_return: CallbackReturn,
+    def start_workers(
+        self, processes: int = 1, memory_budget: Optional[int] = None
     ) -> None:
-        for work_func, work_args in iter(work_queue.get, None):
-            try:
-                results = work_func(*work_args, cb_queue, cb_return)
-                results_list.append(results)
-            except Exception:
-                arg_dump: List[Any] = []
-                for i in work_args:
-                    if isinstance(i, CredOption):
-                        arg_dump.append("CredOption(REDACTED)")
-                    else:
-                        arg_dump.append(i)
-                e = "##### EXCEPTION #####\n"
-                e += "Function: " + repr(work_func) + "\n"
-                e += "Arguments: " + repr(arg_dump) + "\n"
-                e += traceback.format_exc()
-                e += "#####################"
-                cb_queue.put(e)
-
-        work_queue.put(None)
-        cb_queue.put("__PROCESS_DONE__")
-        singletons.close()
+        if self.executor_id is None:
+            self.executor_id = self.pool.register(self.cb_queue)
+        if self.cb_thread_instance is None:
+            self.cb_thread_instance = Thread(
+                target=self.cb_thread,
+                args=(self.cb_queue,),
+            )
+            self.cb_thread_instance.start()
+
+        self.results_list.clear()
+        self.work_stats.clear()
+        self.work_running_max = 0
+        self.memory_budget = memory_budget
+        self.memory_used_max = 0
+        self.processes = processes
+        time_start = time.perf_counter()
+        startup_times = self.pool.reserve(processes)
+        if startup_times:
+            # For comparing start methods, startup time of each worker is from
+            # being started until it is ready after importing modules
+            start_method = self.pool.ctx.get_start_method()
+            msg = f"Started {len(startup_times)} worker processes ({start_method}) "
+            msg += f"in {time.perf_counter() - time_start:.2f}s, startup time: "
+            msg += ", ".join(f"{i:.2f}s" for i in sorted(startup_times))
+            self.cb_msg(msg)
 
-    def start_workers(self, processes: int = 1) -> None:
-        self.cb_thread_instance = Thread(
-            target=self.cb_thread,
-            args=(self.cb_queue, processes),
-        )
-        self.cb_thread_instance.start()
-
-        self.results_list[:] = []
-        while not self.work_queue.empty():
-            self.work_queue.get()
-        for _ in range(processes):
-            process = Process(
-                target=Executor.worker,
-                args=(
-                    self.work_queue,
-                    self.results_list,
-                    self.cb_queue,
-                    self.cb_return,
-                ),
-                daemon=True,
+    def add_work(
+        self,
+        work_func: Callable[..., Any],
+        work_args: Tuple[Any, ...],
+        cost: Optional[float] = None,
+        label: Optional[str] = None,
+        memory: Optional[int] = None,
+    ) -> None:
+        # cost is estimate of time needed relative to other work, e.g. from
+        # StickerConvert.estimate_cost. Work without cost is sent first.
+        # memory is estimate of peak bytes used, e.g. from
+        # StickerConvert.estimate_memory. Work without memory is always sent
+        with self.work_lock:
+            self.work_count += 1
+            priority = -cost if cost is not None else -math.inf
+            heapq.heappush(
+                self.work_pending,
+                (priority, self.work_count, work_func, work_args, cost, label, memory),
+            )
+            self.work_done.clear()
+            self.send_work()
+
+    def get_seconds_per_cost(self) -> Optional[float]:
+        # Calibrated by finished work
+        cost_total = sum(i[1] for i in self.work_stats)
+        if cost_total == 0:
+            return None
+        return sum(i[2] for i in self.work_stats) / cost_total
+
+    def predict_seconds(self, work: PendingWork) -> Optional[float]:
+        seconds_per_cost = self.get_seconds_per_cost()
+        if work[4] is None or seconds_per_cost is None:
+            return None
+        return work[4] * seconds_per_cost
+
+    def fits_memory(self, memory: Optional[int]) -> bool:
+        if self.memory_budget is None or memory is None:
+            return True
+        # Work exceeding budget alone is sent when no other work holds memory.
+        # Work without memory estimate, e.g. downloader and exporter when
+        # pipelining, may keep running until all stickers are compressed
+        if not self.memory_running:
+            return True
+        return self.memory_used + memory <= self.memory_budget
+
+    def pop_work(self) -> Optional[PendingWork]:
+        # Most costly pending work that fits memory budget. Caller should
+        # hold work_lock
+        if self.fits_memory(self.work_pending[0][6]):
+            return heapq.heappop(self.work_pending)
+
+        for index in sorted(
+            range(len(self.work_pending)), key=self.work_pending.__getitem__
+        ):
+            if self.fits_memory(self.work_pending[index][6]):
+                work = self.work_pending.pop(index)
+                heapq.heapify(self.work_pending)
+                return work
+
+        work_waiting = self.work_pending[0]
+        if self.memory_waiting != work_waiting[1]:
+            self.memory_waiting = work_waiting[1]
+            self.cb_msg(self.get_memory_usage(work_waiting))
+        return None
+
+    def get_memory_usage(self, work_waiting: Optional[PendingWork] = None) -> str:
+        mib = 1024 * 1024
+        msg = f"Memory budget: {self.memory_used // mib}"
+        msg += f"/{(self.memory_budget or 0) // mib} MiB used by "
+        msg += f"{len(self.memory_running)} work"
+        if work_waiting is not None:
+            msg += f", {work_waiting[5] or 'next work'} "
+            msg += f"({(work_waiting[6] or 0) // mib} MiB) waits for memory"
+        return msg
+
+    def send_work(self) -> None:
+        # Caller should hold work_lock
+        while self.work_pending and len(self.work_running) < self.processes:
+            work = self.pop_work()
+            if work is None:
+                break
+            chunk = [work]
+            memory = work[6]
+
+            # Work predicted to be quick are sent together to save round trips,
+            # leaving enough work for other workers
+            chunk_size_max = min(
+                WORK_CHUNK_SIZE_MAX,
+                math.ceil((len(self.work_pending) + 1) / self.processes),
+            )
+            seconds = self.predict_seconds(chunk[0])
+            while (
+                seconds is not None
+                and self.work_pending
+                and len(chunk) < chunk_size_max
+            ):
+                seconds_next = self.predict_seconds(self.work_pending[0])
+                if seconds_next is None or seconds + seconds_next > WORK_CHUNK_SECONDS:
+                    break
+                # Work in chunk run one by one, within memory reserved by first
+                memory_next = self.work_pending[0][6]
+                if memory_next is not None and (memory is None or memory_next > memory):
+                    break
+                seconds += seconds_next
+                chunk.append(heapq.heappop(self.work_pending))
+
+            work_id = chunk[0][1]
+            self.work_running[work_id] = None
+            self.work_running_max = max(self.work_running_max, len(self.work_running))
+            self.work_sent[work_id] = chunk
+            if memory is not None:
+                self.memory_running[work_id] = memory
+                self.memory_used += memory
+                self.memory_used_max = max(self.memory_used_max, self.memory_used)
+            item: WorkQueueItemType = (
+                work_id,
+                self.executor_id,
+                [(i[2], i[3]) for i in chunk],
+                self.cb_return,
+                self.is_cancel_job,
             )
+            self.pool.work_queue.put(item)
 
-            process.start()
-            self.processes.append(process)
+    def start_work(self, work_id: int, pid: int) -> None:
+        with self.work_lock:
+            if work_id in self.work_running:
+                self.work_running[work_id] = pid
 
-    def add_work(
-        self, work_func: Callable[..., Any], work_args: Tuple[Any, ...]
+    def finish_work(
+        self,
+        work_id: int,
+        results_list: Optional[List[Any]] = None,
+        elapsed_list: Optional[List[float]] = None,
     ) -> None:
-        self.work_queue.put((work_func, work_args))
+        with self.work_lock:
+            if work_id not in self.work_running:
+                return
+            del self.work_running[work_id]
+            chunk = self.work_sent.pop(work_id)
+            self.memory_used -= self.memory_running.pop(work_id, 0)
+            results_list = results_list or []
+            elapsed_list = elapsed_list or []
+            # Worker send result of every work in chunk, or none if chunk is
+            # skipped as job is cancelled, or if worker is lost.
+            # Checked here as zip(strict=True) needs Python 3.10
+            assert len(results_list) == len(elapsed_list)
+            assert len(results_list) in (0, len(chunk))
+            for work, results, elapsed in zip(chunk, results_list, elapsed_list):
+                if results is not None:
+                    self.results_list.append(results)
+                _, _, _, _, cost, label, _ = work
+                if cost is not None:
+                    self.work_stats.append((label or "", cost, elapsed))
+
+            self.send_work()
+            if not self.work_running:
+                self.work_done.set()
+
+    def get_work_report(self) -> Optional[str]:
+        # For tuning cost estimate, e.g. ENCODE_COST_WEIGHTS of converter
+        seconds_per_cost = self.get_seconds_per_cost()
+        if seconds_per_cost is None:
+            return None
+
+        msg = "Predicted and actual time of slowest work:\n"
+        error_total = 0.0
+        for num, (label, cost, elapsed) in enumerate(
+            sorted(self.work_stats, key=lambda i: i[2], reverse=True)
+        ):
+            predicted = cost * seconds_per_cost
+            error_total += abs(predicted - elapsed)
+            if num < WORK_REPORT_LINES:
+                msg += f"{label}: predicted {predicted:.2f}s, actual {elapsed:.2f}s\n"
+        error_mean = error_total / len(self.work_stats)
+        msg += f"Mean error {error_mean:.2f}s ({seconds_per_cost:.3g}s per cost)"
+        if self.memory_budget is not None:
+            mib = 1024 * 1024
+            msg += f"\nPeak memory estimate {self.memory_used_max // mib}"
+            msg += f"/{self.memory_budget // mib} MiB, "
+            msg += f"up to {self.work_running_max} work at once"
+        return msg
+
+    def check_workers(self) -> List[Optional[int]]:
+        # Return exit code of workers that exited before finishing work of
+        # this Executor. Their work is counted as done and they are replaced
+        with self.work_lock:
+            lost = {
+                work_id: self.pool.get_exitcode(pid)
+                for work_id, pid in self.work_running.items()
+                if pid is not None and self.pool.get_exitcode(pid) is not None
+            }
+        for work_id in lost:
+            self.finish_work(work_id)
+        if lost:
+            self.pool.ensure_workers()
+        return list(lost.values())
 
     def join_workers(self) -> None:
-        self.work_queue.put(None)
+        # Workers stay in pool, so only wait for work of this Executor.
+        # If cancelled, work_done is set by kill_workers once running work
+        # stopped or their workers are killed
         try:
-            for process in self.processes:
-                process.join()
-                if process.exitcode != 0 and self.is_cancel_job.value == 0:
+            while not self.work_done.wait(0.5):
+                for exitcode in self.check_workers():
                     self.cb_msg(
-                        f"Warning: A process exited with error (code {process.exitcode})"
+                        f"Warning: A process exited with error (code {exitcode})"
                     )
         except KeyboardInterrupt:
             pass
 
-        self.processes.clear()
+        self.pool.release(self.processes)
+        self.processes = 0
 
     def kill_workers(self, *_: Any, **__: Any) -> None:
-        self.is_cancel_job.value = 1  # type: ignore
-
-        for process in self.processes:
-            process.terminate()
+        self.is_cancel_job.value = 1
+
+        # Pending work is dropped and queued work is skipped by workers.
+        # Running work may stop by checking cancel token, only workers still
+        # running work of this Executor after timeout are killed
+        with self.work_lock:
+            self.work_pending.clear()
+        self.work_done.wait(WORK_CANCEL_TIMEOUT)
+        with self.work_lock:
+            self.work_sent.clear()
+            self.memory_running.clear()
+            self.memory_used = 0
+            work_pids = {
+                work_id: pid
+                for work_id, pid in self.work_running.items()
+                if pid is not None
+            }
+            self.work_running.clear()
+            self.work_done.set()
+        if self.executor_id is not None:
+            self.pool.terminate(self.executor_id, work_pids)
 
         self.cb_msg("Job cancelled.")
         self.cleanup()
 
     def cleanup(self) -> None:
         self.cb_bar("clear")
-        self.cb_queue.put(None)
-        if self.cb_thread_instance:
-            self.cb_thread_instance.join()
+        cb_thread_instance = self.cb_thread_instance
+        self.cb_thread_instance = None
+        if cb_thread_instance:
+            self.cb_queue.put(None)
+            cb_thread_instance.join()
+        if self.executor_id is not None:
+            self.pool.unregister(self.executor_id)
+            self.executor_id = None
 
 
 class Job:
@@ -226,12 +747,18 @@ class Job:
 
         self.out_urls: List[str] = []
 
+        # Invalid start_method is reported by verify_input
+        start_method = self.opt_comp.start_method
+        if start_method not in get_all_start_methods():
+            start_method = None
+
         self.executor = Executor(
             self.cb_msg,
             self.cb_msg_block,
             self.cb_bar,
             self.cb_ask_bool,
             self.cb_ask_str,
+            start_method=start_method,
         )
 
     def start(self) -> int:
@@ -243,13 +770,21 @@ class Job:
 
         self.executor.cb("msg", kwargs={"cls": True})
 
-        tasks: Tuple[Callable[..., Tuple[bool, Optional[str]]], ...] = (
+        tasks: List[Callable[..., Tuple[bool, Optional[str]]]] = [
             self.verify_input,
             self.cleanup,
-            self.download,
-            self.compress,
-            self.export,
-        )
+        ]
+        export_streaming = self.is_export_streaming()
+        if (
+            self.opt_comp.pipeline
+            and not self.opt_comp.no_compress
+            and (len(self.get_downloaders()) > 0 or export_streaming)
+        ):
+            tasks.append(self.compress_pipelined)
+            if not export_streaming:
+                tasks.append(self.export)
+        else:
+            tasks.extend((self.download, self.compress, self.export))
 
         code = 0
         summaries: List[str] = []
@@ -439,6 +974,16 @@ class Job:
             error_msg += f"[X] quantize_method {self.opt_comp.quantize_method} is not valid option\n"
             error_msg += "    Valid options: imagequant, fastoctree, maxcoverage, mediancut, none"
 
+        if (
+            self.opt_comp.start_method
+            and self.opt_comp.start_method not in get_all_start_methods()
+        ):
+            error_msg += "\n"
+            error_msg += (
+                f"[X] start_method {self.opt_comp.start_method} is not valid option\n"
+            )
+            error_msg += "    Valid options: " + ", ".join(get_all_start_methods())
+
         if self.opt_comp.bg_color:
             try:
                 _, _, _ = bytes.fromhex(self.opt_comp.bg_color)
@@ -559,7 +1104,7 @@ class Job:
 
         return True, None
 
-    def download(self) -> Tuple[bool, str]:
+    def get_downloaders(self) -> List[Callable[..., Tuple[int, int]]]:
         downloaders: List[Callable[..., Tuple[int, int]]] = []
 
         if self.opt_input.option == "signal":
@@ -586,6 +1131,11 @@ class Job:
         if self.opt_input.option.startswith("discord"):
             downloaders.append(DownloadDiscord.start)
 
+        return downloaders
+
+    def download(self) -> Tuple[bool, str]:
+        downloaders = self.get_downloaders()
+
         if len(downloaders) > 0:
             self.executor.cb("Downloading...")
         else:
@@ -602,11 +1152,14 @@ class Job:
 
         self.executor.join_workers()
 
+        return self.get_download_summary(list(self.executor.results_list))
+
+    def get_download_summary(self, results: List[Tuple[int, int]]) -> Tuple[bool, str]:
         # Return False if any of the job returns failure
         stickers_ok = 0
         stickers_total = 0
         success = True
-        for result in self.executor.results_list:
+        for result in results:
             stickers_ok += result[0]
             stickers_total += result[1]
             success = (
@@ -655,19 +1208,12 @@ class Job:
 
         in_fs: List[Path] = []
 
-        # .txt: emoji.txt, title.txt
-        # .m4a: line sticker sound effects
         for i in sorted(input_dir.iterdir()):
             in_f = input_dir / i
 
             if not in_f.is_file():
                 continue
-            if (
-                CodecInfo.get_file_ext(i) in (".txt", ".m4a")
-                or (
-                    self.opt_comp.preset != "signal" and Path(i).stem == "cover"
-                )  # Signal cover has same spec as normal sticker
-            ):
+            if self.is_copy_only(in_f):
                 shutil.copy(in_f, output_dir / i.name)
             else:
                 in_fs.append(i)
@@ -682,23 +1228,68 @@ class Job:
             "bar", kwargs={"set_progress_mode": "determinate", "steps": in_fs_count}
         )
 
-        self.executor.start_workers(processes=min(self.opt_comp.processes, in_fs_count))
+        self.executor.start_workers(
+            processes=min(self.opt_comp.processes, in_fs_count),
+            memory_budget=self.get_memory_budget(),
+        )
 
+        # Work is sent as soon as it is added if a worker is free, so add
+        # costliest first instead of leaving it to ordering of Executor
+        works: List[Tuple[Path, Optional[float], Optional[int]]] = []
         for i in in_fs:
             in_f = input_dir / i.name
-            out_f = output_dir / Path(i).stem
+            works.append((in_f, *self.get_compress_estimate(in_f)))
+        works.sort(key=lambda i: math.inf if i[1] is None else i[1], reverse=True)
 
+        for in_f, cost, memory in works:
             self.executor.add_work(
-                work_func=StickerConvert.convert, work_args=(in_f, out_f, self.opt_comp)
+                work_func=StickerConvert.convert,
+                work_args=(in_f, output_dir / in_f.stem, self.opt_comp),
+                cost=cost,
+                label=in_f.name,
+                memory=memory,
             )
 
         self.executor.join_workers()
 
+        work_report = self.executor.get_work_report()
+        if work_report:
+            self.executor.cb(work_report)
+
+        return self.get_compress_summary(list(self.executor.results_list))
+
+    def get_compress_estimate(
+        self, in_f: Path
+    ) -> Tuple[Optional[float], Optional[int]]:
+        # cost and memory of compressing in_f
+        try:
+            codec_info = CodecInfo(in_f)
+            return (
+                StickerConvert.estimate_cost(in_f, self.opt_comp, codec_info),
+                StickerConvert.estimate_memory(in_f, self.opt_comp, codec_info),
+            )
+        except Exception:
+            # Converter would report the error
+            return None, None
+
+    def get_memory_budget(self) -> int:
+        if self.opt_comp.memory_max:
+            return self.opt_comp.memory_max * 1024 * 1024
+        return int(psutil.virtual_memory().available * MEMORY_BUDGET_AVAILABLE)
+
+    def is_copy_only(self, in_f: Path) -> bool:
+        # .txt: emoji.txt, title.txt
+        # .m4a: line sticker sound effects
+        return CodecInfo.get_file_ext(in_f) in (".txt", ".m4a") or (
+            self.opt_comp.preset != "signal" and in_f.stem == "cover"
+        )  # Signal cover has same spec as normal sticker
+
+    def get_compress_summary(self, results: List[Tuple[Any, ...]]) -> Tuple[bool, str]:
         success = True
         stickers_ok = 0
         stickers_total = 0
         fails: List[str] = []
-        for result in self.executor.results_list:
+        for result in results:
             stickers_total += 1
             if result[0] is False:
                 success = False
@@ -715,43 +1306,298 @@ class Job:
             f"Compress: {stickers_ok}/{stickers_total} stickers success" + msg_append,
         )
 
-    def export(self) -> Tuple[bool, str]:
-        if self.opt_output.option == "local":
-            self.executor.cb("Skipped export (Saving to local directory only)")
-            return True, "Export: Skipped (Saving to local directory only)"
+    @staticmethod
+    def download_pipelined(
+        downloader: Callable[..., Tuple[int, int]],
+        opt_input: InputOption,
+        opt_cred: CredOption,
+        cb: CallbackProtocol,
+        cb_return: CallbackReturn,
+    ) -> None:
+        # Report result through cb instead of results_list, which only hold
+        # compress results. Sent after all file_ready of this downloader
+        result = (0, 0)
+        try:
+            result = downloader(opt_input, opt_cred, cb, cb_return)
+        finally:
+            cb.put(("download_done", result, None))
 
-        self.executor.cb("Exporting...")
+    @staticmethod
+    def convert_pipelined(
+        in_f: Path,
+        out_f: Path,
+        opt_comp: CompOption,
+        cb: CallbackProtocol,
+        cb_return: CallbackReturn,
+    ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
+        out_path: Optional[str] = None
+        try:
+            result = StickerConvert.convert(in_f, out_f, opt_comp, cb, cb_return)
+            if isinstance(result[2], Path):
+                out_path = str(result[2])
+            return result
+        finally:
+            cb.put(("convert_done", (in_f.stem, out_path), None))
+
+    @staticmethod
+    def export_pipelined(
+        exporter: Type[UploadBase],
+        stickers_queue: StickersQueueType,
+        opt_output: OutputOption,
+        opt_comp: CompOption,
+        opt_cred: CredOption,
+        cb: CallbackProtocol,
+        cb_return: CallbackReturn,
+    ) -> None:
+        result: Tuple[int, int, List[str]] = (0, 0, [])
+        try:
+            result = exporter.start(
+                opt_output, opt_comp, opt_cred, cb, cb_return, stickers_queue
+            )
+        finally:
+            cb.put(("export_done", result, None))
+
+    def compress_pipelined(self) -> Tuple[bool, str]:
+        # Compress each file as soon as downloader reports it as ready, and
+        # export each sticker as soon as it is compressed, instead of waiting
+        # for the previous stage to finish with the whole pack
+        downloaders = self.get_downloaders()
+        exporters = self.get_exporters()
+        export_streaming = self.is_export_streaming()
+        input_dir = Path(self.opt_input.dir)
+        output_dir = Path(self.opt_output.dir)
+
+        dispatched: List[Path] = []
+        converted: List[Tuple[str, Optional[str]]] = []
+        download_results: List[Tuple[int, int]] = []
+        export_results: List[Tuple[int, int, List[str]]] = []
+        download_done = Event()
+        convert_done = Event()
+        stickers_queue: StickersQueueType = self.executor.manager.Queue()
+        plan_sent = False
+
+        def dispatch(in_f: Path) -> None:
+            if any(i.name == in_f.name for i in dispatched) or not in_f.is_file():
+                return
+            if self.is_copy_only(in_f):
+                shutil.copy(in_f, output_dir / in_f.name)
+                return
+            dispatched.append(in_f)
+            cost, memory = self.get_compress_estimate(in_f)
+            self.executor.add_work(
+                work_func=Job.convert_pipelined,
+                work_args=(in_f, output_dir / in_f.stem, self.opt_comp),
+                cost=cost,
+                label=in_f.name,
+                memory=memory,
+            )
 
-        exporters: List[Callable[..., Tuple[int, int, List[str]]]] = []
+        def send_plan(cancel: bool) -> None:
+            # Exporter can only split packs and read metadata after download
+            # Whether output is animated is predicted from input, like converter
+            nonlocal plan_sent
+            plan_sent = True
+            if cancel:
+                stickers_queue.put(("plan", None))
+                return
+            plan = [
+                (output_dir / i.name, CodecInfo.is_anim(i)) for i in sorted(dispatched)
+            ]
+            stickers_queue.put(("plan", plan))
+            for stem, out_path in converted:
+                stickers_queue.put(
+                    ("ready", stem, Path(out_path) if out_path else None)
+                )
+
+        def send_unfinished() -> None:
+            # Exporter waits for every planned sticker, so tell it about
+            # stickers that would never be compressed, e.g. job cancelled
+            if not plan_sent:
+                send_plan(cancel=True)
+                return
+            converted_stems = {stem for stem, _ in converted}
+            for in_f in dispatched:
+                if in_f.stem not in converted_stems:
+                    stickers_queue.put(("ready", in_f.stem, None))
+
+        def check_done() -> None:
+            if download_done.is_set() and len(converted) == len(dispatched):
+                convert_done.set()
+
+        def on_file_ready(f: str) -> None:
+            dispatch(Path(f))
+
+        def download_finished() -> None:
+            # Files not reported by downloader, and metadata written at the end
+            for i in sorted(input_dir.iterdir()):
+                dispatch(input_dir / i.name)
+            if export_streaming:
+                # Do not export if download failed, same as without pipeline
+                download_success = (
+                    not downloaders or self.get_download_summary(download_results)[0]
+                )
+                send_plan(cancel=not download_success)
+            download_done.set()
+            check_done()
+
+        def on_download_done(stickers_ok: int, stickers_total: int) -> None:
+            download_results.append((stickers_ok, stickers_total))
+            if len(download_results) == len(downloaders):
+                download_finished()
+
+        def on_convert_done(stem: str, out_path: Optional[str]) -> None:
+            converted.append((stem, out_path))
+            if plan_sent:
+                stickers_queue.put(
+                    ("ready", stem, Path(out_path) if out_path else None)
+                )
+            check_done()
+
+        def on_export_done(
+            stickers_ok: int, stickers_total: int, urls: List[str]
+        ) -> None:
+            export_results.append((stickers_ok, stickers_total, urls))
+
+        if downloaders:
+            self.executor.cb("Downloading and compressing...")
+        else:
+            self.executor.cb("Compressing...")
+        if export_streaming:
+            self.executor.cb("Exporting while compressing...")
+        self.executor.cb_handlers["file_ready"] = on_file_ready
+        self.executor.cb_handlers["download_done"] = on_download_done
+        self.executor.cb_handlers["convert_done"] = on_convert_done
+        self.executor.cb_handlers["export_done"] = on_export_done
+
+        # Downloaders and exporters take one process each, rest are for compressing
+        processes = self.opt_comp.processes + len(downloaders)
+        if export_streaming:
+            processes += len(exporters)
+        self.executor.start_workers(
+            processes=processes, memory_budget=self.get_memory_budget()
+        )
+
+        try:
+            # Added before any compress work, so they start immediately
+            if export_streaming:
+                for exporter in exporters:
+                    self.executor.add_work(
+                        work_func=Job.export_pipelined,
+                        work_args=(
+                            exporter,
+                            stickers_queue,
+                            self.opt_output,
+                            self.opt_comp,
+                            self.opt_cred,
+                        ),
+                    )
+            for downloader in downloaders:
+                self.executor.add_work(
+                    work_func=Job.download_pipelined,
+                    work_args=(downloader, self.opt_input, self.opt_cred),
+                )
+            if not downloaders:
+                download_finished()
+
+            # Cannot send sentinel to workers before all files are dispatched,
+            # and exporter need to know result of all files
+            # Workers only exit before sentinel if cancelled or crashed
+            while not convert_done.wait(0.5):
+                if self.executor.is_cancel_job.value == 1:  # type: ignore
+                    break
+                if self.executor.check_workers():
+                    self.executor.cb(
+                        "Warning: A process exited before finishing its work"
+                    )
+                    break
+        finally:
+            if export_streaming:
+                send_unfinished()
+
+        self.executor.join_workers()
+        self.executor.cb_handlers.clear()
+
+        work_report = self.executor.get_work_report()
+        if work_report:
+            self.executor.cb(work_report)
+
+        success = True
+        summaries: List[str] = []
+        if downloaders:
+            download_success, download_summary = self.get_download_summary(
+                download_results
+            )
+            success = success and download_success
+            summaries.append(download_summary)
+
+        if len(dispatched) == 0:
+            self.executor.cb("Skipped compression (No files to compress)")
+            summaries.append("Compress: Skipped (No files to compress)")
+        else:
+            compress_success, compress_summary = self.get_compress_summary(
+                list(self.executor.results_list)
+            )
+            success = success and compress_success
+            summaries.append(compress_summary)
+
+        if export_streaming:
+            export_success, export_summary = self.get_export_summary(export_results)
+            success = success and export_success
+            summaries.append(export_summary)
+
+        return success, "\n".join(summaries)
+
+    def get_exporters(self) -> List[Type[UploadBase]]:
+        exporters: List[Type[UploadBase]] = []
 
         if self.opt_output.option == "whatsapp":
-            exporters.append(CompressWastickers.start)
+            exporters.append(CompressWastickers)
 
         if self.opt_output.option == "signal":
-            exporters.append(UploadSignal.start)
+            exporters.append(UploadSignal)
 
         if self.opt_output.option.startswith("telegram"):
-            exporters.append(UploadTelegram.start)
+            exporters.append(UploadTelegram)
 
         if self.opt_output.option == "imessage":
-            exporters.append(XcodeImessage.start)
+            exporters.append(XcodeImessage)
 
         if self.opt_output.option == "viber":
-            exporters.append(UploadViber.start)
+            exporters.append(UploadViber)
+
+        return exporters
+
+    def is_export_streaming(self) -> bool:
+        exporters = self.get_exporters()
+        return len(exporters) > 0 and all(i.streaming for i in exporters)
+
+    def export(self) -> Tuple[bool, str]:
+        if self.opt_output.option == "local":
+            self.executor.cb("Skipped export (Saving to local directory only)")
+            return True, "Export: Skipped (Saving to local directory only)"
+
+        self.executor.cb("Exporting...")
+
+        exporters = self.get_exporters()
 
         self.executor.start_workers(processes=1)
 
         for exporter in exporters:
             self.executor.add_work(
-                work_func=exporter,
+                work_func=exporter.start,
                 work_args=(self.opt_output, self.opt_comp, self.opt_cred),
             )
 
         self.executor.join_workers()
 
+        return self.get_export_summary(list(self.executor.results_list))
+
+    def get_export_summary(
+        self, results: List[Tuple[int, int, List[str]]]
+    ) -> Tuple[bool, str]:
         stickers_ok = 0
         stickers_total = 0
-        for result in self.executor.results_list:
+        for result in results:
             stickers_ok += result[0]
             stickers_total += result[1]
             self.out_urls.extend(result[2])
@@ -78,6 +78,13 @@ class CompOption(BaseOption):
     scale_filter: Optional[str] = None
     chromium_path: Optional[str] = None
     cache_dir: Optional[str] = None
+    streaming: Optional[bool] = None
+    result_cache: Optional[bool] = None
+    result_cache_size_max: Optional[int] = None
+    pipeline: Optional[bool] = None
+    start_method: Optional[str] = None
+    memory_max: Optional[int] = None
+    file_timeout: Optional[float] = None
     default_emoji: str = "😀"
     no_compress: Optional[bool] = None
     processes: int = ceil(cpu_count() / 2)
@@ -114,6 +121,13 @@ class CompOption(BaseOption):
             "scale_filter": self.scale_filter,
             "chromium_path": self.chromium_path,
             "cache_dir": self.cache_dir,
+            "streaming": self.streaming,
+            "result_cache": self.result_cache,
+            "result_cache_size_max": self.result_cache_size_max,
+            "pipeline": self.pipeline,
+            "start_method": self.start_method,
+            "memory_max": self.memory_max,
+            "file_timeout": self.file_timeout,
             "default_emoji": self.default_emoji,
             "no_compress": self.no_compress,
             "processes": self.processes,
@@ -2,12 +2,12 @@
 import copy
 import zipfile
 from pathlib import Path
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
 from sticker_convert.converter import StickerConvert
 from sticker_convert.job_option import CompOption, CredOption, OutputOption
 from sticker_convert.uploaders.upload_base import UploadBase
-from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn, StickersQueueType
 from sticker_convert.utils.files.metadata_handler import MetadataHandler
 from sticker_convert.utils.files.sanitize_filename import sanitize_filename
 from sticker_convert.utils.media.codec_info import CodecInfo
@@ -15,6 +15,8 @@ from sticker_convert.utils.media.format_verify import FormatVerify
 
 
 class CompressWastickers(UploadBase):
+    streaming = True
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.base_spec.size_max_img = 100000
@@ -47,6 +49,8 @@ class CompressWastickers(UploadBase):
 
     def compress_wastickers(self) -> Tuple[int, int, List[str]]:
         urls: List[str] = []
+        if not self.wait_stickers_plan():
+            return 0, 0, urls
         title, author, _ = MetadataHandler.get_metadata(
             self.opt_output.dir,
             title=self.opt_output.title,
@@ -58,8 +62,7 @@ class CompressWastickers(UploadBase):
         if not author:
             self.cb.put("Author is required for compressing .wastickers")
             return 0, 0, urls
-        packs = MetadataHandler.split_sticker_packs(
-            self.opt_output.dir,
+        packs = self.split_sticker_packs(
             title=title,
             file_per_pack=30,
             separate_image_anim=not self.opt_comp.fake_vid,
@@ -79,10 +82,13 @@ class CompressWastickers(UploadBase):
                 cover_opt_comp_merged = copy.deepcopy(self.opt_comp)
                 cover_opt_comp_merged.merge(self.spec_cover)
 
-                cover_path_old = MetadataHandler.get_cover(self.opt_output.dir)
+                cover_path_old = self.get_cover()
                 cover_path_new = Path("bytes.png")
                 if cover_path_old is None:
                     # First image in the directory, extracting first frame
+                    for planned, _ in self.stickers_plan or []:
+                        if self.wait_sticker(planned) is not None:
+                            break
                     first_image = [
                         i
                         for i in sorted(self.opt_output.dir.iterdir())
@@ -127,7 +133,14 @@ class CompressWastickers(UploadBase):
                 zipf.write(Path(self.opt_output.dir, "author.txt"), "author.txt")
                 zipf.write(Path(self.opt_output.dir, "title.txt"), "title.txt")
 
-                for num, src in enumerate(stickers):
+                for num, src_planned in enumerate(stickers):
+                    src = self.wait_sticker(src_planned)
+                    if src is None:
+                        self.cb.put(
+                            f"Warning: Cannot find compressed {src_planned.stem}, skip this file..."
+                        )
+                        continue
+
                     self.cb.put(f"Verifying {src} for compressing into .wastickers")
 
                     if self.opt_comp.fake_vid or CodecInfo.is_anim(src):
@@ -172,6 +185,9 @@ class CompressWastickers(UploadBase):
         opt_cred: CredOption,
         cb: CallbackProtocol,
         cb_return: CallbackReturn,
+        stickers_queue: Optional[StickersQueueType] = None,
     ) -> Tuple[int, int, List[str]]:
-        exporter = CompressWastickers(opt_output, opt_comp, opt_cred, cb, cb_return)
+        exporter = CompressWastickers(
+            opt_output, opt_comp, opt_cred, cb, cb_return, stickers_queue
+        )
         return exporter.compress_wastickers()
@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
+from pathlib import Path
+from queue import Empty
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
 
 from sticker_convert.job_option import CompOption, CredOption, OutputOption
-from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn, StickersQueueType
+from sticker_convert.utils.cancel import get_cancel_token
+from sticker_convert.utils.files.metadata_handler import BLACKLIST_PREFIX, MetadataHandler
+
+# Seconds between checking if job is cancelled while waiting for stickers
+STICKERS_QUEUE_TIMEOUT = 0.5
 
 
 class UploadBase:
+    # start(opt_output, opt_comp, opt_cred, cb, cb_return[, stickers_queue])
+    start: ClassVar[Callable[..., Tuple[int, int, List[str]]]]
+    # True if stickers can be exported while they are still being compressed,
+    # which require start() to accept stickers_queue
+    streaming = False
+
     def __init__(
         self,
         opt_output: OutputOption,
@@ -12,6 +26,7 @@ class UploadBase:
         opt_cred: CredOption,
         cb: CallbackProtocol,
         cb_return: CallbackReturn,
+        stickers_queue: Optional[StickersQueueType] = None,
     ) -> None:
         self.opt_output = opt_output
         self.opt_comp = opt_comp
@@ -33,3 +48,84 @@ class UploadBase:
             steps=self.opt_comp.steps,
             cache_dir=self.opt_comp.cache_dir,
         )
+
+        # Only set if Job sends stickers here as soon as they are compressed
+        self.stickers_queue = stickers_queue
+        self.stickers_plan: Optional[List[Tuple[Path, bool]]] = None
+        self.stickers_ready: Dict[str, Optional[Path]] = {}
+        self.stickers_cancelled = False
+
+    def get_stickers_queue_item(self, block: bool = True) -> bool:
+        # Return False if nothing is in queue. If blocking, give up waiting
+        # after timeout if job is cancelled
+        assert self.stickers_queue is not None
+        try:
+            item = self.stickers_queue.get(block, STICKERS_QUEUE_TIMEOUT)
+        except Empty:
+            if block and get_cancel_token().is_cancelled():
+                self.stickers_cancelled = True
+            return False
+
+        if item[0] == "plan":
+            # Plan is None if Job cancelled the export, e.g. download failed
+            if item[1] is None:
+                self.stickers_cancelled = True
+            self.stickers_plan = item[1] or []
+        else:
+            _, stem, path = item
+            self.stickers_ready[stem] = path
+        return True
+
+    def wait_stickers_plan(self) -> bool:
+        # Metadata and list of stickers are only complete after all files are
+        # downloaded. Return False if Job cancelled the export
+        if self.stickers_queue is None:
+            return True
+        while self.stickers_plan is None and not self.stickers_cancelled:
+            self.get_stickers_queue_item()
+        return not self.stickers_cancelled
+
+    def wait_sticker(self, src: Path) -> Optional[Path]:
+        # Return compressed sticker planned as src, or None if compression
+        # failed or job is cancelled
+        if self.stickers_queue is None:
+            return src
+        while src.stem not in self.stickers_ready and not self.stickers_cancelled:
+            self.get_stickers_queue_item()
+        path = self.stickers_ready.get(src.stem)
+        if path is None or not path.is_file():
+            return None
+        return path
+
+    def is_sticker_ready(self, src: Path) -> bool:
+        if self.stickers_queue is None:
+            return True
+        while src.stem not in self.stickers_ready:
+            if not self.get_stickers_queue_item(block=False):
+                return False
+        return True
+
+    def get_cover(self) -> Optional[Path]:
+        if self.stickers_plan is not None:
+            for src, _ in self.stickers_plan:
+                if src.stem == "cover":
+                    # Cover is compressed like other stickers
+                    self.wait_sticker(src)
+        return MetadataHandler.get_cover(self.opt_output.dir)
+
+    def split_sticker_packs(self, title: str, **kwargs: Any) -> Dict[str, List[Path]]:
+        if self.stickers_plan is None:
+            return MetadataHandler.split_sticker_packs(
+                self.opt_output.dir, title=title, **kwargs
+            )
+
+        planned_anim = dict(self.stickers_plan)
+        return MetadataHandler.split_sticker_packs(
+            self.opt_output.dir,
+            title=title,
+            stickers_present=[
+                i for i in planned_anim if not i.name.startswith(BLACKLIST_PREFIX)
+            ],
+            is_anim=planned_anim.__getitem__,
+            **kwargs,
+        )
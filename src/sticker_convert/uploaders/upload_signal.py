@@ -11,7 +11,7 @@ from signalstickers_client.stickersclient import StickersClient
 from sticker_convert.converter import StickerConvert
 from sticker_convert.job_option import CompOption, CredOption, OutputOption
 from sticker_convert.uploaders.upload_base import UploadBase
-from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn, StickersQueueType
 from sticker_convert.utils.emoji import extract_emojis
 from sticker_convert.utils.files.metadata_handler import MetadataHandler
 from sticker_convert.utils.media.codec_info import CodecInfo
@@ -19,6 +19,8 @@ from sticker_convert.utils.media.format_verify import FormatVerify
 
 
 class UploadSignal(UploadBase):
+    streaming = True
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
@@ -92,13 +94,19 @@ class UploadSignal(UploadBase):
     def add_stickers_to_pack(
         self, pack: LocalStickerPack, stickers: List[Path], emoji_dict: Dict[str, str]
     ) -> None:
-        cover_file = MetadataHandler.get_cover(self.opt_output.dir)
+        cover_file = self.get_cover()
         cover_file_bytes = None
         if cover_file:
             with open(cover_file, "rb") as f:
                 cover_file_bytes = f.read()
         for src in stickers:
-            sticker = self.create_sticker(src, emoji_dict)
+            src_ready = self.wait_sticker(src)
+            if src_ready is None:
+                self.cb.put(
+                    f"Warning: Cannot find compressed {src.stem}, skip uploading this file..."
+                )
+                continue
+            sticker = self.create_sticker(src_ready, emoji_dict)
             if sticker is None:
                 continue
             sticker.id = pack.nb_stickers
@@ -120,6 +128,9 @@ class UploadSignal(UploadBase):
     def upload_stickers_signal(self) -> Tuple[int, int, List[str]]:
         urls: List[str] = []
 
+        if not self.wait_stickers_plan():
+            return 0, 0, urls
+
         if not self.opt_cred.signal_uuid:
             self.cb.put("uuid required for uploading to Signal")
             return 0, 0, urls
@@ -158,8 +169,7 @@ class UploadSignal(UploadBase):
             assert author
             assert emoji_dict
 
-        packs = MetadataHandler.split_sticker_packs(
-            self.opt_output.dir,
+        packs = self.split_sticker_packs(
             title=title,
             file_per_pack=200,
             separate_image_anim=False,
@@ -198,6 +208,9 @@ class UploadSignal(UploadBase):
         opt_cred: CredOption,
         cb: CallbackProtocol,
         cb_return: CallbackReturn,
+        stickers_queue: Optional[StickersQueueType] = None,
     ) -> Tuple[int, int, List[str]]:
-        exporter = UploadSignal(opt_output, opt_comp, opt_cred, cb, cb_return)
+        exporter = UploadSignal(
+            opt_output, opt_comp, opt_cred, cb, cb_return, stickers_queue
+        )
         return exporter.upload_stickers_signal()
@@ -4,13 +4,14 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union, cast
 
 import anyio
+import anyio.to_thread
 from telegram import Sticker
 
 from sticker_convert.converter import StickerConvert
 from sticker_convert.job_option import CompOption, CredOption, OutputOption
 from sticker_convert.uploaders.upload_base import UploadBase
 from sticker_convert.utils.auth.telegram_api import BotAPI, TelegramAPI, TelegramSticker, TelethonAPI
-from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn, StickersQueueType
 from sticker_convert.utils.emoji import extract_emojis
 from sticker_convert.utils.files.metadata_handler import MetadataHandler
 from sticker_convert.utils.media.codec_info import CodecInfo
@@ -18,6 +19,8 @@ from sticker_convert.utils.media.format_verify import FormatVerify
 
 
 class UploadTelegram(UploadBase):
+    streaming = True
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
@@ -67,6 +70,98 @@ class UploadTelegram(UploadBase):
         self.opt_comp_cover_merged = copy.deepcopy(self.opt_comp)
         self.opt_comp_cover_merged.merge(self.base_spec)
 
+    def create_sticker(self, src: Path, emoji_dict: Dict[str, str]) -> TelegramSticker:
+        self.cb.put(f"Verifying {src} for uploading to telegram")
+
+        emoji = extract_emojis(emoji_dict.get(Path(src).stem, ""))
+        if emoji == "":
+            self.cb.put(
+                f"Warning: Cannot find emoji for file {Path(src).name}, using default emoji..."
+            )
+            emoji_list = [self.opt_comp.default_emoji]
+
+        if len(emoji) > 20:
+            self.cb.put(
+                f"Warning: {len(emoji)} emoji for file {Path(src).name}, exceeding limit of 20, keep first 20 only..."
+            )
+        emoji_list = [*emoji][:20]
+
+        ext = Path(src).suffix
+        if ext == ".tgs":
+            spec_choice = self.tgs_spec
+            sticker_format = "animated"
+        elif ext == ".webm":
+            spec_choice = self.webm_spec
+            sticker_format = "video"
+        else:
+            ext = ".png"
+            spec_choice = self.png_spec
+            sticker_format = "static"
+
+        if self.opt_output.option == "telegram_emoji":
+            spec_choice.set_res(100)
+
+        file_info = CodecInfo(src)
+        check_file_result = (
+            FormatVerify.check_file_fps(
+                src, fps=spec_choice.get_fps(), file_info=file_info
+            )
+            and FormatVerify.check_file_duration(
+                src, duration=spec_choice.get_duration(), file_info=file_info
+            )
+            and FormatVerify.check_file_size(
+                src, size=spec_choice.get_size_max(), file_info=file_info
+            )
+            and FormatVerify.check_format(
+                src, fmt=spec_choice.get_format(), file_info=file_info
+            )
+        )
+        if self.opt_output.option == "telegram":
+            if sticker_format == "animated":
+                check_file_result = (
+                    check_file_result
+                    and file_info.res[0] == 512
+                    and file_info.res[1] == 512
+                )
+            else:
+                # For video and static stickers (Not animated)
+                # Allow file with one of the dimension = 512 but another <512
+                # https://core.telegram.org/stickers#video-requirements
+                check_file_result = check_file_result and (
+                    file_info.res[0] == 512 or file_info.res[1] == 512
+                )
+                check_file_result = check_file_result and (
+                    file_info.res[0] <= 512 and file_info.res[1] <= 512
+                )
+        else:
+            # telegram_emoji
+            check_file_result = (
+                check_file_result
+                and file_info.res[0] == 100
+                and file_info.res[1] == 100
+            )
+
+        if sticker_format == "static":
+            # It is important to check if webp and png are static only
+            check_file_result = check_file_result and FormatVerify.check_animated(
+                src, animated=spec_choice.animated, file_info=file_info
+            )
+
+        if check_file_result:
+            with open(src, "rb") as f:
+                sticker_bytes = f.read()
+        else:
+            _, _, convert_result, _ = StickerConvert.convert(
+                Path(src),
+                Path(f"bytes{ext}"),
+                self.opt_comp_merged,
+                self.cb,
+                self.cb_return,
+            )
+            sticker_bytes = cast(bytes, convert_result)
+
+        return (src, sticker_bytes, emoji_list, sticker_format)
+
     async def upload_pack(
         self, pack_title: str, stickers: List[Path], emoji_dict: Dict[str, str]
     ) -> Tuple[Optional[str], int, int]:
@@ -118,110 +213,40 @@ class UploadTelegram(UploadBase):
             sticker_type = Sticker.REGULAR
 
         stickers_list: List[TelegramSticker] = []
-        sticker_format = None
-        for src in stickers:
-            self.cb.put(f"Verifying {src} for uploading to telegram")
-
-            emoji = extract_emojis(emoji_dict.get(Path(src).stem, ""))
-            if emoji == "":
-                self.cb.put(
-                    f"Warning: Cannot find emoji for file {Path(src).name}, using default emoji..."
-                )
-                emoji_list = [self.opt_comp.default_emoji]
-
-            if len(emoji) > 20:
+        stickers_total = 0
+        stickers_ok = 0
+        for num, src in enumerate(stickers):
+            src_ready = await anyio.to_thread.run_sync(self.wait_sticker, src)
+            if src_ready is None:
                 self.cb.put(
-                    f"Warning: {len(emoji)} emoji for file {Path(src).name}, exceeding limit of 20, keep first 20 only..."
+                    f"Warning: Cannot find compressed {src.stem}, skip uploading this file..."
                 )
-            emoji_list = [*emoji][:20]
-
-            ext = Path(src).suffix
-            if ext == ".tgs":
-                spec_choice = self.tgs_spec
-                sticker_format = "animated"
-            elif ext == ".webm":
-                spec_choice = self.webm_spec
-                sticker_format = "video"
+                stickers_total += 1
             else:
-                ext = ".png"
-                spec_choice = self.png_spec
-                sticker_format = "static"
-
-            if self.opt_output.option == "telegram_emoji":
-                spec_choice.set_res(100)
-
-            file_info = CodecInfo(src)
-            check_file_result = (
-                FormatVerify.check_file_fps(
-                    src, fps=spec_choice.get_fps(), file_info=file_info
-                )
-                and FormatVerify.check_file_duration(
-                    src, duration=spec_choice.get_duration(), file_info=file_info
+                stickers_list.append(self.create_sticker(src_ready, emoji_dict))
+
+            # Upload what is ready now if next sticker is still being compressed
+            # Pack is created with the first batch, and later batches are added
+            if num + 1 < len(stickers) and self.is_sticker_ready(stickers[num + 1]):
+                continue
+            if len(stickers_list) == 0:
+                continue
+
+            if pack_exist is False:
+                batch_total, batch_ok = await tg_api.pack_new(
+                    stickers_list, sticker_type
                 )
-                and FormatVerify.check_file_size(
-                    src, size=spec_choice.get_size_max(), file_info=file_info
-                )
-                and FormatVerify.check_format(
-                    src, fmt=spec_choice.get_format(), file_info=file_info
-                )
-            )
-            if self.opt_output.option == "telegram":
-                if sticker_format == "animated":
-                    check_file_result = (
-                        check_file_result
-                        and file_info.res[0] == 512
-                        and file_info.res[1] == 512
-                    )
-                else:
-                    # For video and static stickers (Not animated)
-                    # Allow file with one of the dimension = 512 but another <512
-                    # https://core.telegram.org/stickers#video-requirements
-                    check_file_result = check_file_result and (
-                        file_info.res[0] == 512 or file_info.res[1] == 512
-                    )
-                    check_file_result = check_file_result and (
-                        file_info.res[0] <= 512 and file_info.res[1] <= 512
-                    )
+                # Pack is not created if no sticker of batch is uploaded
+                pack_exist = batch_ok > 0
             else:
-                # telegram_emoji
-                check_file_result = (
-                    check_file_result
-                    and file_info.res[0] == 100
-                    and file_info.res[1] == 100
-                )
-
-            if sticker_format == "static":
-                # It is important to check if webp and png are static only
-                check_file_result = check_file_result and FormatVerify.check_animated(
-                    src, animated=spec_choice.animated, file_info=file_info
-                )
-
-            if check_file_result:
-                with open(src, "rb") as f:
-                    sticker_bytes = f.read()
-            else:
-                _, _, convert_result, _ = StickerConvert.convert(
-                    Path(src),
-                    Path(f"bytes{ext}"),
-                    self.opt_comp_merged,
-                    self.cb,
-                    self.cb_return,
+                batch_total, batch_ok = await tg_api.pack_add(
+                    stickers_list, sticker_type
                 )
-                sticker_bytes = cast(bytes, convert_result)
+            stickers_total += batch_total
+            stickers_ok += batch_ok
+            stickers_list = []
 
-            stickers_list.append((src, sticker_bytes, emoji_list, sticker_format))
-
-        if pack_exist is False:
-            stickers_total, stickers_ok = await tg_api.pack_new(
-                stickers_list, sticker_type
-            )
-            pack_exist = True
-        else:
-            stickers_total, stickers_ok = await tg_api.pack_add(
-                stickers_list, sticker_type
-            )
-
-        cover_path = MetadataHandler.get_cover(self.opt_output.dir)
+        cover_path = self.get_cover()
         if cover_path:
             thumbnail_bytes: Union[None, bytes, Path] = None
             cover_ext = Path(cover_path).suffix
@@ -263,6 +288,9 @@ class UploadTelegram(UploadBase):
     def upload_stickers_telegram(self) -> Tuple[int, int, List[str]]:
         urls: List[str] = []
 
+        if not self.wait_stickers_plan():
+            return 0, 0, urls
+
         title, _, emoji_dict = MetadataHandler.get_metadata(
             self.opt_output.dir,
             title=self.opt_output.title,
@@ -297,8 +325,7 @@ class UploadTelegram(UploadBase):
         else:
             file_per_pack = 120
 
-        packs = MetadataHandler.split_sticker_packs(
-            self.opt_output.dir,
+        packs = self.split_sticker_packs(
             title=title,
             file_per_anim_pack=file_per_pack,
             file_per_image_pack=file_per_pack,
@@ -327,6 +354,7 @@ class UploadTelegram(UploadBase):
         opt_cred: CredOption,
         cb: CallbackProtocol,
         cb_return: CallbackReturn,
+        stickers_queue: Optional[StickersQueueType] = None,
     ) -> Tuple[int, int, List[str]]:
         exporter = UploadTelegram(
             opt_output,
@@ -334,5 +362,6 @@ class UploadTelegram(UploadBase):
             opt_cred,
             cb,
             cb_return,
+            stickers_queue,
         )
         return exporter.upload_stickers_telegram()
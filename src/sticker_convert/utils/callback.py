@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
-from multiprocessing import Event, Manager
+import time
+from multiprocessing import Manager
+from multiprocessing.connection import Connection
 from multiprocessing.managers import ListProxy, SyncManager
 from queue import Queue
+from threading import Lock, Thread
 from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Protocol, Tuple, Union
 
 from tqdm import tqdm
@@ -10,27 +13,41 @@ CbQueueTupleType = Tuple[
     Optional[str], Optional[Tuple[Any, ...]], Optional[Dict[str, Any]]
 ]
 CbQueueItemType = Union[CbQueueTupleType, str, None]
-WorkQueueItemType = Optional[Tuple[Callable[..., Any], Tuple[Any, ...]]]
+# (work_id, executor_id, [(work_func, work_args), ...], cb_return, is_cancel_job)
+WorkQueueItemType = Optional[Tuple[Any, ...]]
+# ("plan", [(sticker_path, is_anim), ...]) or ("ready", stem, compressed_path)
+StickersQueueItemType = Tuple[Any, ...]
 ResponseItemType = Union[bool, str, None]
 
+# Worker send buffered callback items after this number of items,
+# or this number of seconds after the first item is buffered
+CB_BATCH_SIZE = 64
+CB_FLUSH_INTERVAL = 0.1
+# Sent immediately as worker waits for response after sending them
+CB_ACTIONS_UNBUFFERED = ("msg_block", "ask_bool", "ask_str")
+
 if TYPE_CHECKING:
     # mypy complains about this
     ResultsListType = ListProxy[Any]  # type: ignore
     ResponseListType = ListProxy[ResponseItemType]  # type: ignore
     CbQueueType = Queue[CbQueueItemType]  # type: ignore
     WorkQueueType = Queue[WorkQueueItemType]  # type: ignore
+    StickersQueueType = Queue[StickersQueueItemType]  # type: ignore
 else:
     ResultsListType = List[Any]
     ResponseListType = List[ResponseItemType]
     CbQueueType = Queue
     WorkQueueType = Queue
+    StickersQueueType = Queue
 
 
 class CallbackReturn:
     def __init__(self, manager: Optional[SyncManager] = None) -> None:
-        self.response_event = Event()
         if manager is None:
             manager = Manager()
+        # Proxy instead of multiprocessing.Event, as it is sent through
+        # work queue to workers that are already running
+        self.response_event = manager.Event()
         self.response_queue: ResponseListType = manager.list()
 
     def set_response(self, response: ResponseItemType) -> None:
@@ -199,13 +216,77 @@ class Callback(CallbackProtocol):
         elif action == "bar":
             self.bar(**kwargs)
         elif action == "update_bar":
-            self.bar(update_bar=1)
+            self.bar(update_bar=kwargs.get("update_bar", 1))
         elif action == "msg_block":
             return self.msg_block(*args, **kwargs)
         elif action == "ask_bool":
             return self.ask_bool(*args, **kwargs)
         elif action == "ask_str":
             return self.ask_str(**kwargs)
+        elif action == "file_ready":
+            # Only used by Job for compressing while downloading
+            pass
         else:
             self.msg(action)
         return None
+
+
+class CallbackBuffer(CallbackProtocol):
+    # Used by workers instead of Manager queue, which cost a round trip to
+    # manager process for every item. Items are sent through pipe in batches
+    # of (executor_id, [item, ...]), and consecutive update_bar are merged
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+        self.executor_id: Optional[int] = None
+        self.buffer: List[CbQueueItemType] = []
+        self.time_first = 0.0
+        self.lock = Lock()
+
+        # Send items buffered by worker that is busy and not putting more
+        Thread(target=self.flush_thread, daemon=True).start()
+
+    def put(self, i: Union[CbQueueItemType, str]) -> None:
+        action = i[0] if isinstance(i, tuple) else i
+        with self.lock:
+            if not self.buffer:
+                self.time_first = time.monotonic()
+
+            if action == "update_bar":
+                count = 1
+                if isinstance(i, tuple) and len(i) >= 3 and i[2]:
+                    count = i[2].get("update_bar", 1)
+                last = self.buffer[-1] if self.buffer else None
+                if isinstance(last, tuple) and last[0] == "update_bar":
+                    assert last[2] is not None
+                    count += last[2]["update_bar"]
+                    self.buffer.pop()
+                self.buffer.append(("update_bar", None, {"update_bar": count}))
+            else:
+                self.buffer.append(i)
+
+            if (
+                action in CB_ACTIONS_UNBUFFERED
+                or len(self.buffer) >= CB_BATCH_SIZE
+                or time.monotonic() - self.time_first >= CB_FLUSH_INTERVAL
+            ):
+                self._flush()
+
+    def set_executor(self, executor_id: Optional[int]) -> None:
+        # Items buffered before belong to previous Executor
+        with self.lock:
+            self._flush()
+            self.executor_id = executor_id
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.buffer:
+            self.conn.send((self.executor_id, self.buffer))
+            self.buffer = []
+
+    def flush_thread(self) -> None:
+        while True:
+            time.sleep(CB_FLUSH_INTERVAL)
+            self.flush()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import time
+from typing import Any, Optional
+
+# Cancel flag of Executor is a Manager proxy and each read is a round trip to
+# manager process, so it is read at most once per this number of seconds
+CANCEL_CHECK_INTERVAL = 0.1
+
+
+class Cancelled(Exception):
+    def __init__(self, timed_out: bool) -> None:
+        super().__init__("Time limit reached" if timed_out else "Cancelled")
+        self.timed_out = timed_out
+
+
+class CancelToken:
+    # Checked by long running work between small units of work, e.g. by
+    # StickerConvert between frames and between compression steps, so that
+    # work can stop early without its worker process being killed
+    def __init__(
+        self,
+        is_cancel: Optional[Any] = None,
+        deadline: Optional[float] = None,
+        parent: Optional["CancelToken"] = None,
+    ) -> None:
+        # is_cancel: Object with value set to 1 when cancelled,
+        # e.g. Executor.is_cancel_job
+        # deadline: time.monotonic() after which the token is timed out
+        self.is_cancel = is_cancel
+        self.deadline = deadline
+        self.parent = parent
+        self.cancelled = False
+        self.time_checked = 0.0
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def with_timeout(self, timeout: Optional[float]) -> "CancelToken":
+        # Token cancelled with this one, and also timed out after timeout seconds
+        deadline = None if not timeout else time.monotonic() + timeout
+        return CancelToken(deadline=deadline, parent=self)
+
+    def is_cancelled(self) -> bool:
+        if not self.cancelled and self.is_cancel is not None:
+            time_now = time.monotonic()
+            if time_now - self.time_checked >= CANCEL_CHECK_INTERVAL:
+                self.time_checked = time_now
+                self.cancelled = self.is_cancel.value == 1
+        if self.cancelled:
+            return True
+        return self.parent is not None and self.parent.is_cancelled()
+
+    def is_timed_out(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.parent is not None and self.parent.is_timed_out()
+
+    def get_time_left(self) -> Optional[float]:
+        # Seconds until earliest deadline of this token and its parents
+        time_left = None
+        if self.deadline is not None:
+            time_left = self.deadline - time.monotonic()
+        if self.parent is not None:
+            parent_time_left = self.parent.get_time_left()
+            if time_left is None or (
+                parent_time_left is not None and parent_time_left < time_left
+            ):
+                time_left = parent_time_left
+        return time_left
+
+    def check(self) -> None:
+        if self.is_cancelled():
+            raise Cancelled(timed_out=False)
+        if self.is_timed_out():
+            raise Cancelled(timed_out=True)
+
+
+# Token of work running in this process, replaced by worker of Executor for
+# each work. Never cancelled if work is not run by Executor
+cancel_token = CancelToken()
+
+
+def get_cancel_token() -> CancelToken:
+    return cancel_token
+
+
+def set_cancel_token(token: CancelToken) -> None:
+    global cancel_token
+    cancel_token = token
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator, Union
+
+
+@contextmanager
+def open_buffer(file: Union[Path, bytes]) -> Generator[memoryview, None, None]:
+    # Read-only memoryview of file without copying, mmap'd if file is a Path
+    # Slices of the memoryview must not outlive the context
+    if not isinstance(file, Path):
+        with memoryview(file) as data:
+            yield data
+        return
+
+    with open(file, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Cannot mmap empty file
+            yield memoryview(b"")
+            return
+        with mm:
+            with memoryview(mm) as data:
+                yield data
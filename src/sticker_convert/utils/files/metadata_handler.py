@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from sticker_convert.utils.files.json_resources_loader import INPUT_JSON, OUTPUT_JSON
 from sticker_convert.utils.media.codec_info import CodecInfo
@@ -221,8 +221,11 @@ class MetadataHandler:
         file_per_anim_pack: Optional[int] = None,
         file_per_image_pack: Optional[int] = None,
         separate_image_anim: bool = True,
+        stickers_present: Optional[List[Path]] = None,
+        is_anim: Callable[[Path], bool] = CodecInfo.is_anim,
     ) -> Dict[str, List[Path]]:
         # {pack_1: [sticker1_path, sticker2_path]}
+        # stickers_present and is_anim can be given if stickers are not compressed yet
         packs: Dict[str, List[Path]] = {}
 
         if file_per_pack is None:
@@ -235,7 +238,8 @@ class MetadataHandler:
             file_per_anim_pack = file_per_pack
             file_per_image_pack = file_per_pack
 
-        stickers_present = MetadataHandler.get_stickers_present(directory)
+        if stickers_present is None:
+            stickers_present = MetadataHandler.get_stickers_present(directory)
 
         processed = 0
 
@@ -252,7 +256,7 @@ class MetadataHandler:
             for processed, file in enumerate(stickers_present):
                 file_path = directory / file
 
-                if CodecInfo.is_anim(file_path):
+                if is_anim(file_path):
                     anim_stickers.append(file_path)
                 else:
                     image_stickers.append(file_path)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sticker_convert.version import __version__
+
+# Default maximum total size of result cache in MiB
+RESULT_CACHE_SIZE_MAX = 512
+
+
+class ResultCache:
+    # On-disk cache of conversion results, keyed by hash of input and options
+    # Least recently used results are removed once total size exceed size_max
+    # Safe to be shared by multiple processes, as files are replaced atomically
+    def __init__(self, path: Path, size_max: int = RESULT_CACHE_SIZE_MAX) -> None:
+        self.path = path
+        self.size_max = size_max * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        # Running total of cache size, only rescanned when over size_max
+        # Files put by other processes are counted on next rescan
+        self.size_total = 0
+        self.evict()
+
+    @staticmethod
+    def get_key(data: bytes, opt: Dict[str, Any], out_suffix: str) -> str:
+        h = hashlib.sha256(data)
+        h.update(json.dumps(opt, sort_keys=True, default=str).encode())
+        h.update(out_suffix.encode())
+        # Output of different version may differ
+        h.update(__version__.encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        f = self.path / key
+        try:
+            data = f.read_bytes()
+            # Mark as recently used
+            os.utime(f)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.size_max:
+            return
+
+        tmp_f = self.path / f"{key}.{uuid4().hex}.tmp"
+        try:
+            tmp_f.write_bytes(data)
+            os.replace(tmp_f, self.path / key)
+        except OSError:
+            tmp_f.unlink(missing_ok=True)
+            return
+
+        self.size_total += len(data)
+        if self.size_total > self.size_max:
+            self.evict()
+
+    def evict(self) -> None:
+        entries: List[Tuple[float, int, str]] = []
+        size_total = 0
+        for entry in os.scandir(self.path):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            size_total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if size_total <= self.size_max:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size_total -= size
+        self.size_total = size_total
+
+
+# One ResultCache for each location in each process, so hits and misses add up
+result_caches: Dict[Tuple[Path, int], ResultCache] = {}
+
+
+def get_result_cache(path: Path, size_max: Optional[int] = None) -> ResultCache:
+    if size_max is None:
+        size_max = RESULT_CACHE_SIZE_MAX
+    result_cache = result_caches.get((path, size_max))
+    if result_cache is None:
+        result_cache = ResultCache(path, size_max)
+        result_caches[(path, size_max)] = result_cache
+    return result_cache
@@ -6,20 +6,34 @@ Reference: https://stackoverflow.com/a/53622211
 
 import struct
 import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
 
 
 class ApplePngNormalize:
     @staticmethod
-    def normalize(old_png: bytes) -> bytes:
-        png_header = b"\x89PNG\r\n\x1a\n"
+    def swap_red_blue(data: bytearray, width: int, height: int) -> None:
+        # Scanlines of CgBI image are 1 filter byte followed by BGRA pixels
+        # Filters work on each byte with same channel of previous pixel,
+        # so channels can be swapped without unfiltering
+        rows = np.frombuffer(data, dtype=np.uint8, count=height * (1 + 4 * width))
+        pixels = rows.reshape(height, 1 + 4 * width)[:, 1:].reshape(height, width, 4)
+        pixels[:, :, [0, 2]] = pixels[:, :, [2, 0]]
 
-        if old_png[:8] != png_header:
+    @staticmethod
+    def normalize(old_png: bytes) -> bytes:
+        if old_png[:8] != PNG_HEADER:
             return old_png
 
-        new_png = old_png[:8]
+        old_png_view = memoryview(old_png)
+        # (length, type, data, crc) of each chunk in new png
+        chunks: List[Tuple[int, bytes, memoryview, int]] = []
 
-        chunk_pos = len(new_png)
-        chunk_d = bytearray()
+        chunk_pos = len(PNG_HEADER)
+        chunks_idat: List[memoryview] = []
 
         found_cgbi = False
 
@@ -28,25 +42,19 @@ class ApplePngNormalize:
         height = None
         while chunk_pos < len(old_png):
             # Reading chunk
-            chunk_length_bytes = old_png[chunk_pos : chunk_pos + 4]
-            chunk_length = int(struct.unpack(">L", chunk_length_bytes)[0])
-            chunk_type = old_png[chunk_pos + 4 : chunk_pos + 8]
-            chunk_data = old_png[chunk_pos + 8 : chunk_pos + 8 + chunk_length]
-            chunk_crc = old_png[
-                chunk_pos + chunk_length + 8 : chunk_pos + chunk_length + 12
-            ]
-            chunk_crc = struct.unpack(">L", chunk_crc)[0]
+            chunk_length, chunk_type = struct.unpack_from(">L4s", old_png, chunk_pos)
+            chunk_data = old_png_view[chunk_pos + 8 : chunk_pos + 8 + chunk_length]
+            (chunk_crc,) = struct.unpack_from(">L", old_png, chunk_pos + chunk_length + 8)
             chunk_pos += chunk_length + 12
 
             # Parsing the header chunk
             if chunk_type == b"IHDR":
-                width = struct.unpack(">L", chunk_data[0:4])[0]
-                height = struct.unpack(">L", chunk_data[4:8])[0]
+                width, height = struct.unpack_from(">LL", chunk_data)
 
             # Parsing the image chunk
             if chunk_type == b"IDAT":
                 # Concatename all image data chunks
-                chunk_d += chunk_data
+                chunks_idat.append(chunk_data)
                 continue
 
             # Stopping the PNG file parsing
@@ -57,46 +65,43 @@ class ApplePngNormalize:
                 assert width
                 assert height
                 buf_size = width * height * 4 + height
-                chunk_data = zlib.decompress(chunk_d, -8, buf_size)
+                idat = bytearray(
+                    zlib.decompress(b"".join(chunks_idat), -8, buf_size)
+                )
 
                 # Swapping red & blue bytes for each pixel
-                chunk_data = bytearray(chunk_data)
-                offset = 1
-                for _ in range(height):
-                    for x in range(width):
-                        chunk_data[offset + 4 * x], chunk_data[offset + 4 * x + 2] = (
-                            chunk_data[offset + 4 * x + 2],
-                            chunk_data[offset + 4 * x],
-                        )
-                    offset += 1 + 4 * width
+                ApplePngNormalize.swap_red_blue(idat, width, height)
 
                 # Compressing the image chunk
-                # chunk_data = newdata
-                chunk_data = zlib.compress(chunk_data)
-                chunk_length = len(chunk_data)
+                idat_compressed = zlib.compress(idat)
                 chunk_crc_idat = zlib.crc32(b"IDAT")
-                chunk_crc_data = zlib.crc32(chunk_data, chunk_crc_idat)
-                chunk_crc_mod = (chunk_crc_data + 0x100000000) % 0x100000000
-
-                new_png += struct.pack(">L", chunk_length)
-                new_png += b"IDAT"
-                new_png += chunk_data
-                new_png += struct.pack(">L", chunk_crc_mod)
-
-                chunk_crc_type = zlib.crc32(chunk_type)
-                new_png += struct.pack(">L", 0)
-                new_png += b"IEND"
-                new_png += struct.pack(">L", chunk_crc_type)
+                chunk_crc_data = zlib.crc32(idat_compressed, chunk_crc_idat)
+                chunks.append(
+                    (
+                        len(idat_compressed),
+                        b"IDAT",
+                        memoryview(idat_compressed),
+                        chunk_crc_data,
+                    )
+                )
+                chunks.append((0, b"IEND", memoryview(b""), zlib.crc32(b"IEND")))
                 break
 
             # Removing CgBI chunk
             if chunk_type == b"CgBI":
                 found_cgbi = True
             else:
-                new_png += struct.pack(">L", chunk_length)
-                new_png += chunk_type
-                if chunk_length > 0:
-                    new_png += chunk_data
-                new_png += struct.pack(">L", chunk_crc)
-
-        return new_png
+                chunks.append((chunk_length, chunk_type, chunk_data, chunk_crc))
+
+        # Assemble new png into one preallocated buffer
+        new_png = bytearray(len(PNG_HEADER) + sum(12 + len(i[2]) for i in chunks))
+        new_png[: len(PNG_HEADER)] = PNG_HEADER
+        pos = len(PNG_HEADER)
+        for chunk_length, chunk_type, chunk_data, chunk_crc in chunks:
+            struct.pack_into(">L4s", new_png, pos, chunk_length, chunk_type)
+            new_png[pos + 8 : pos + 8 + len(chunk_data)] = chunk_data
+            pos += 8 + len(chunk_data)
+            struct.pack_into(">L", new_png, pos, chunk_crc)
+            pos += 4
+
+        return bytes(new_png)
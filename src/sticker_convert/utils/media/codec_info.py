@@ -1,21 +1,29 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import hashlib
 import json
-import mmap
 import warnings
+from collections import OrderedDict
 from decimal import ROUND_HALF_UP, Decimal
 from fractions import Fraction
 from io import BytesIO
 from math import ceil, gcd
 from pathlib import Path
-from typing import BinaryIO, List, Optional, Tuple, Union, cast
+from typing import TYPE_CHECKING, BinaryIO, Hashable, List, NamedTuple, Optional, Sequence, Tuple, Union, cast
 
 from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
 from PIL import Image, UnidentifiedImageError
 from rlottie_python.rlottie_wrapper import LottieAnimation
 
 from sticker_convert.definitions import SVG_DEFAULT_HEIGHT, SVG_DEFAULT_WIDTH, SVG_SAMPLE_FPS
+from sticker_convert.utils.files.file_buffer import open_buffer
+from sticker_convert.utils.media.gif_info import get_gif_info_from_buffer
+from sticker_convert.utils.media.png_info import get_png_info_from_buffer
+from sticker_convert.utils.media.webp_info import WebpInfo, get_webp_info
+
+if TYPE_CHECKING:
+    from av.container.input import InputContainer
 
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
@@ -87,7 +95,26 @@ def open_lottie(file: Union[Path, bytes]) -> LottieAnimation:
         return LottieAnimation.from_data(data)
 
 
+class ProbeResult(NamedTuple):
+    codec: str
+    res: Tuple[int, int]
+    fps: float
+    frames: int
+    # Milliseconds, may be fractional for APNG
+    duration: float
+    # Duration of each frame, empty if unknown
+    durations: Tuple[float, ...]
+    has_alpha: bool
+
+
+# Maximum number of files with probe result memoized in each process
+PROBE_CACHE_SIZE = 1024
+
+
 class CodecInfo:
+    # Probe results memoized by (path, size, mtime) or digest of bytes
+    probe_cache: "OrderedDict[Hashable, ProbeResult]" = OrderedDict()
+
     def __init__(
         self, file: Union[Path, bytes], file_ext: Optional[str] = None
     ) -> None:
@@ -96,347 +123,395 @@ class CodecInfo:
             self.file_ext = CodecInfo.get_file_ext(file)
         else:
             self.file_ext = file_ext
-        if self.file_ext == ".svg":
-            self.fps, self.frames, self.duration, self.res = CodecInfo.get_svg_info(
-                file
-            )
-            self.codec = "svg"
-        else:
-            self.fps, self.frames, self.duration = (
-                CodecInfo.get_file_fps_frames_duration(file)
-            )
-            self.codec = CodecInfo.get_file_codec(file)
-            self.res = CodecInfo.get_file_res(file)
+        probe = CodecInfo.probe(file, self.file_ext)
+        self.codec = probe.codec
+        self.res = probe.res
+        self.fps = probe.fps
+        self.frames = probe.frames
+        self.duration = probe.duration
+        self.durations = probe.durations
+        self.has_alpha = probe.has_alpha
         self.is_animated = self.fps > 1
 
     @staticmethod
-    def get_file_fps_frames_duration(
+    def get_probe_key(
         file: Union[Path, bytes], file_ext: Optional[str] = None
-    ) -> Tuple[float, int, int]:
-        fps: float
-        duration: int
+    ) -> Hashable:
+        if isinstance(file, Path):
+            stat = file.stat()
+            return (file.resolve().as_posix(), stat.st_size, stat.st_mtime_ns, file_ext)
+        return (hashlib.blake2b(file, digest_size=16).digest(), file_ext)
 
+    @staticmethod
+    def probe(
+        file: Union[Path, bytes], file_ext: Optional[str] = None
+    ) -> ProbeResult:
+        # Get codec, resolution, frames and durations with one open per backend
         if not file_ext and isinstance(file, Path):
             file_ext = CodecInfo.get_file_ext(file)
 
-        if file_ext in (".tgs", ".json", ".lottie"):
-            fps, frames = CodecInfo._get_file_fps_frames_lottie(file)
-            if fps > 0:
-                duration = int(frames / fps * 1000)
-            else:
-                duration = 0
+        key = CodecInfo.get_probe_key(file, file_ext)
+        result = CodecInfo.probe_cache.get(key)
+        if result is not None:
+            CodecInfo.probe_cache.move_to_end(key)
+            return result
+
+        if file_ext == ".svg":
+            fps, frames, duration, res = CodecInfo.get_svg_info(file)
+            result = ProbeResult("svg", res, fps, frames, duration, tuple(), True)
+        elif file_ext in (".tgs", ".json", ".lottie"):
+            result = CodecInfo._probe_lottie(file, file_ext)
         elif file_ext == ".webp":
-            fps, frames, duration, _ = CodecInfo._get_file_fps_frames_duration_webp(
-                file
-            )
+            result = CodecInfo._probe_webp(file)
         elif file_ext in (".gif", ".apng", ".png"):
-            fps, frames, duration = CodecInfo._get_file_fps_frames_duration_pillow(file)
+            result = CodecInfo._probe_pillow(file)
         else:
-            frames, duration = CodecInfo._get_file_frames_duration_av(file)
+            result = CodecInfo._probe_other(file)
 
-            if duration > 0:
-                fps = frames / duration * 1000
-            else:
-                fps = 0
+        CodecInfo.probe_cache[key] = result
+        while len(CodecInfo.probe_cache) > PROBE_CACHE_SIZE:
+            CodecInfo.probe_cache.popitem(last=False)
 
-        return fps, frames, duration
+        return result
 
     @staticmethod
-    def get_file_fps(file: Union[Path, bytes], file_ext: Optional[str] = None) -> float:
-        if not file_ext and isinstance(file, Path):
-            file_ext = CodecInfo.get_file_ext(file)
-
-        if file_ext in (".tgs", ".json", ".lottie"):
-            return CodecInfo._get_file_fps_lottie(file)
-        elif file_ext == ".webp":
-            fps, _, _, _ = CodecInfo._get_file_fps_frames_duration_webp(file)
-            return fps
-        elif file_ext in (".gif", ".apng", ".png"):
-            fps, _, _ = CodecInfo._get_file_fps_frames_duration_pillow(file)
-            return fps
+    def _probe_lottie(file: Union[Path, bytes], file_ext: str) -> ProbeResult:
+        anim = open_lottie(file)
+        fps = anim.lottie_animation_get_framerate()
+        frames = anim.lottie_animation_get_totalframe()
+        width, height = anim.lottie_animation_get_size()
+        anim.lottie_animation_destroy()
 
-        frames, duration = CodecInfo._get_file_frames_duration_av(
-            file, frames_to_iterate=10
+        if fps > 0:
+            duration = int(frames / fps * 1000)
+        else:
+            duration = 0
+
+        return ProbeResult(
+            file_ext.replace(".", ""),
+            (width, height),
+            fps,
+            frames,
+            duration,
+            tuple(),
+            True,
         )
 
-        if duration > 0:
-            return frames / duration * 1000
-        return 0
+    @staticmethod
+    def _probe_webp(file: Union[Path, bytes]) -> ProbeResult:
+        try:
+            webp_info = get_webp_info(file)
+        except ValueError:
+            # File extension may be wrong
+            return CodecInfo._probe_other(file)
+
+        fps, frames, duration, durations = CodecInfo._get_webp_fps_frames_duration(
+            webp_info
+        )
+        return ProbeResult(
+            "webp",
+            (webp_info.width, webp_info.height),
+            fps,
+            frames,
+            duration,
+            tuple(durations),
+            webp_info.has_alpha,
+        )
 
     @staticmethod
-    def get_file_frames(
-        file: Union[Path, bytes],
-        file_ext: Optional[str] = None,
-        check_anim: bool = False,
-    ) -> int:
-        # If check_anim is True, return value > 1 means the file is animated
-        if not file_ext and isinstance(file, Path):
-            file_ext = CodecInfo.get_file_ext(file)
+    def _probe_pillow(file: Union[Path, bytes]) -> ProbeResult:
+        try:
+            return CodecInfo._probe_gif_png_header(file)
+        except ValueError:
+            pass
 
-        if file_ext in (".tgs", ".json", ".lottie"):
-            return CodecInfo._get_file_frames_lottie(file)
-        if file_ext in (".gif", ".webp", ".png", ".apng"):
-            _, frames, _ = CodecInfo._get_file_fps_frames_duration_pillow(
-                file, frames_only=True
-            )
-        else:
-            if check_anim is True:
-                frames_to_iterate = 2
-            else:
-                frames_to_iterate = None
-            frames, _ = CodecInfo._get_file_frames_duration_av(
-                file, frames_only=True, frames_to_iterate=frames_to_iterate
+        with Image.open(CodecInfo._get_image_ref(file)) as im:
+            codec = CodecInfo._get_pillow_codec(im)
+            res = (im.width, im.height)
+            has_alpha = CodecInfo._pillow_has_alpha(im)
+            fps, frames, duration, durations = (
+                CodecInfo._get_image_fps_frames_duration_pillow(im)
             )
 
-        return frames
+        return ProbeResult(
+            codec, res, fps, frames, duration, tuple(durations), has_alpha
+        )
 
     @staticmethod
-    def get_file_duration(
-        file: Union[Path, bytes], file_ext: Optional[str] = None
-    ) -> int:
-        duration: int
+    def _probe_gif_png_header(file: Union[Path, bytes]) -> ProbeResult:
+        # Get timing from GIF / APNG block headers without decoding frames
+        # Raise ValueError if Pillow is needed
+        with open_buffer(file) as data:
+            if bytes(data[0:3]) == b"GIF":
+                gif_info = get_gif_info_from_buffer(data)
+                codec = "gif"
+                res = (gif_info.width, gif_info.height)
+                has_alpha = gif_info.has_alpha
+                durations: Sequence[float] = gif_info.durations
+            else:
+                png_info = get_png_info_from_buffer(data)
+                codec = "apng" if len(png_info.durations) > 1 else "png"
+                res = (png_info.width, png_info.height)
+                has_alpha = png_info.has_alpha
+                durations = png_info.durations
+
+        return ProbeResult(
+            codec,
+            res,
+            CodecInfo._get_fps_from_durations(durations),
+            len(durations),
+            sum(durations),
+            tuple(durations),
+            has_alpha,
+        )
 
-        # Return duration in miliseconds
-        if not file_ext and isinstance(file, Path):
-            file_ext = CodecInfo.get_file_ext(file)
+    @staticmethod
+    def _probe_other(file: Union[Path, bytes]) -> ProbeResult:
+        import av
 
-        if file_ext in (".tgs", ".json", ".lottie"):
-            fps, frames = CodecInfo._get_file_fps_frames_lottie(file)
-            if fps > 0:
-                duration = int(frames / fps * 1000)
-            else:
-                duration = 0
-        elif file_ext == ".webp":
-            _, _, duration, _ = CodecInfo._get_file_fps_frames_duration_webp(file)
-        elif file_ext in (".gif", ".png", ".apng"):
-            _, _, duration = CodecInfo._get_file_fps_frames_duration_pillow(file)
+        codec = None
+        try:
+            with Image.open(CodecInfo._get_image_ref(file)) as im:
+                codec = im.format
+        except UnidentifiedImageError:
+            pass
+
+        # File extension may be missing or wrong
+        if codec == "WEBP":
+            return CodecInfo._probe_webp(file)
+        if codec in ("GIF", "PNG"):
+            return CodecInfo._probe_pillow(file)
+
+        file_ref: Union[str, BinaryIO]
+        if isinstance(file, Path):
+            file_ref = file.as_posix()
         else:
-            _, duration = CodecInfo._get_file_frames_duration_av(file)
+            file_ref = BytesIO(file)
 
-        return duration
+        with av.open(file_ref) as container:
+            container = cast("InputContainer", container)
+            stream = container.streams.video[0]
+            if codec is None:
+                codec = stream.codec_context.name
+            res = (stream.width, stream.height)
+            pix_fmt = stream.codec_context.pix_fmt or ""
+            has_alpha = (
+                "a" in pix_fmt.replace("gray", "")
+                or stream.metadata.get("alpha_mode") == "1"
+            )
+            frames, duration = CodecInfo._get_container_frames_duration_av(
+                container, file_ref
+            )
+
+        if duration > 0:
+            fps = frames / duration * 1000
+        else:
+            fps = 0
+
+        return ProbeResult(
+            codec.lower(), res, fps, frames, duration, tuple(), has_alpha
+        )
 
     @staticmethod
-    def _get_file_fps_lottie(file: Union[Path, bytes]) -> int:
-        anim = open_lottie(file)
-        fps = anim.lottie_animation_get_framerate()
+    def _get_image_ref(file: Union[Path, bytes]) -> Union[Path, BinaryIO]:
+        if isinstance(file, Path):
+            return file
+        return BytesIO(file)
+
+    @staticmethod
+    def _get_pillow_codec(im: Image.Image) -> str:
+        if im.format == "PNG":
+            # Unable to distinguish apng and png
+            if getattr(im, "is_animated", False):
+                return "apng"
+            return "png"
+        return (im.format or "").lower()
 
-        return fps
+    @staticmethod
+    def _pillow_has_alpha(im: Image.Image) -> bool:
+        return im.mode in ("RGBA", "LA", "PA", "RGBa", "La") or (
+            "transparency" in im.info
+        )
 
     @staticmethod
-    def _get_file_frames_lottie(file: Union[Path, bytes]) -> int:
-        anim = open_lottie(file)
-        frames = anim.lottie_animation_get_totalframe()
+    def get_file_fps_frames_duration(
+        file: Union[Path, bytes], file_ext: Optional[str] = None
+    ) -> Tuple[float, int, float]:
+        probe = CodecInfo.probe(file, file_ext)
+        return probe.fps, probe.frames, probe.duration
 
-        return frames
+    @staticmethod
+    def get_file_fps(file: Union[Path, bytes], file_ext: Optional[str] = None) -> float:
+        return CodecInfo.probe(file, file_ext).fps
 
     @staticmethod
-    def _get_file_fps_frames_lottie(file: Union[Path, bytes]) -> Tuple[int, int]:
-        anim = open_lottie(file)
-        fps = anim.lottie_animation_get_framerate()
-        frames = anim.lottie_animation_get_totalframe()
-        anim.lottie_animation_destroy()
+    def get_file_frames(
+        file: Union[Path, bytes],
+        file_ext: Optional[str] = None,
+        check_anim: bool = False,
+    ) -> int:
+        # check_anim is kept for compatibility. All frames are counted, as
+        # probe result is memoized and shared with other getters, so return
+        # value > 1 still means the file is animated
+        return CodecInfo.probe(file, file_ext).frames
+
+    @staticmethod
+    def get_file_duration(
+        file: Union[Path, bytes], file_ext: Optional[str] = None
+    ) -> float:
+        # Return duration in miliseconds
+        return CodecInfo.probe(file, file_ext).duration
 
-        return fps, frames
+    @staticmethod
+    def _get_fps_from_durations(durations: Sequence[float]) -> float:
+        # Frame rate that can represent every frame duration
+        total_duration = sum(durations)
+        durations_unique = list(dict.fromkeys(i for i in durations if i != 0))
+        if len(durations) == 0 or total_duration == 0:
+            return 0.0
+        if len(durations_unique) == 1:
+            return len(durations) / total_duration * 1000
+        duration_gcd = durations_gcd(*durations_unique)
+        frames_apparent = total_duration / duration_gcd
+        return float(frames_apparent / total_duration * 1000)
 
     @staticmethod
-    def _get_file_fps_frames_duration_pillow(
-        file: Union[Path, bytes], frames_only: bool = False
-    ) -> Tuple[float, int, int]:
-        total_duration = 0
-        durations: List[int] = []
-
-        with Image.open(file) as im:
-            if "n_frames" in dir(im):
-                frames = im.n_frames
-                if frames_only is True:
-                    return 0.0, frames, 1
-                for i in range(im.n_frames):
-                    im.seek(i)
-                    frame_duration = cast(int, im.info.get("duration", 1000))
-                    if frame_duration not in durations and frame_duration != 0:
-                        durations.append(frame_duration)
-                    total_duration += frame_duration
-                if im.n_frames == 0 or total_duration == 0:
-                    fps = 0.0
-                elif len(durations) == 1:
-                    fps = frames / total_duration * 1000
-                else:
-                    duration_gcd = durations_gcd(*durations)
-                    frames_apparent = total_duration / duration_gcd
-                    fps = float(frames_apparent / total_duration * 1000)
-                return fps, frames, total_duration
-
-        return 0.0, 1, 0
+    def _get_image_fps_frames_duration_pillow(
+        im: Image.Image,
+    ) -> Tuple[float, int, float, List[float]]:
+        durations: List[float] = []
+
+        frames = cast(Optional[int], getattr(im, "n_frames", None))
+        if frames is not None:
+            for i in range(frames):
+                im.seek(i)
+                durations.append(cast(float, im.info.get("duration", 1000)))
+            im.seek(0)
+            fps = CodecInfo._get_fps_from_durations(durations)
+            return fps, frames, sum(durations), durations
+
+        return 0.0, 1, 0, durations
 
     @staticmethod
     def _get_file_fps_frames_duration_webp(
         file: Union[Path, bytes],
     ) -> Tuple[float, int, int, List[int]]:
-        total_duration = 0
-        frames = 0
-        durations: List[int] = []
-        durations_unique: List[int] = []
-
-        def _open_f(file: Union[Path, bytes]) -> BinaryIO:
-            if isinstance(file, Path):
-                return open(file, "r+b")
-            return BytesIO(file)
-
-        with _open_f(file) as f:
-            with mmap.mmap(f.fileno(), 0) as mm:
-                while True:
-                    anmf_pos = mm.find(b"ANMF")
-                    if anmf_pos == -1:
-                        break
-                    mm.seek(anmf_pos + 20)
-                    frame_duration_32 = mm.read(4)
-                    frame_duration_bytes = frame_duration_32[:-1] + bytes(
-                        int(frame_duration_32[-1]) & 0b11111100
-                    )
-                    frame_duration = int.from_bytes(frame_duration_bytes, "little")
-                    if frame_duration not in durations_unique and frame_duration != 0:
-                        durations_unique.append(frame_duration)
-                    durations.append(frame_duration)
-                    total_duration += frame_duration
-                    frames += 1
-
-        if frames <= 1:
-            return 0.0, 1, 0, durations
+        return CodecInfo._get_webp_fps_frames_duration(get_webp_info(file))
 
-        if len(durations_unique) == 1:
-            fps = frames / total_duration * 1000
-        else:
-            duration_gcd = durations_gcd(*durations_unique)
-            frames_apparent = total_duration / duration_gcd
-            fps = float(frames_apparent / total_duration * 1000)
+    @staticmethod
+    def _get_webp_fps_frames_duration(
+        webp_info: WebpInfo,
+    ) -> Tuple[float, int, int, List[int]]:
+        durations = webp_info.durations
+        if len(durations) <= 1:
+            return 0.0, 1, 0, durations
 
-        return fps, frames, total_duration, durations
+        fps = CodecInfo._get_fps_from_durations(durations)
+        return fps, len(durations), sum(durations), durations
 
     @staticmethod
-    def _get_file_frames_duration_av(
-        file: Union[Path, bytes],
-        frames_to_iterate: Optional[int] = None,
-        frames_only: bool = False,
+    def _get_container_frames_duration_av(
+        container: "InputContainer",
+        file_ref: Union[str, BinaryIO],
     ) -> Tuple[int, int]:
-        import av
-        from av.container.input import InputContainer
-
         # Getting fps and frame count from metadata is not reliable
         # Example: https://github.com/laggykiller/sticker-convert/issues/114
 
-        file_ref: Union[str, BinaryIO]
-        if isinstance(file, Path):
-            file_ref = file.as_posix()
+        stream = container.streams.video[0]
+        if container.duration:
+            duration_metadata = int(rounding(container.duration / 1000))
         else:
-            file_ref = BytesIO(file)
-
-        with av.open(file_ref) as container:
-            container = cast(InputContainer, container)
-            stream = container.streams.video[0]
-            if container.duration:
-                duration_metadata = int(rounding(container.duration / 1000))
-            else:
-                duration_metadata = 0
+            duration_metadata = 0
 
-            if frames_only is True and stream.frames > 1:
-                return stream.frames, duration_metadata
+        frames_pts = CodecInfo._get_container_pts_demux_av(container)
+        if frames_pts is None:
+            # Timestamps missing or inconsistent, decode to get them
+            # Reopen instead of seeking, as raw streams are not seekable
+            import av
 
-            frame_count = 0
-            last_frame = None
-            for frame_count, frame in enumerate(container.decode(stream)):
-                if frames_to_iterate is not None and frame_count == frames_to_iterate:
-                    break
-                last_frame = frame
+            if isinstance(file_ref, BytesIO):
+                file_ref.seek(0)
+            with av.open(file_ref) as container_decode:
+                container_decode = cast("InputContainer", container_decode)
+                return CodecInfo._get_container_frames_duration_decode_av(
+                    container_decode, duration_metadata
+                )
+
+        if len(frames_pts) == 0:
+            return 0, 0
+
+        # Same result as decoding, where frame_count is index of last frame
+        frames_pts.sort()
+        return CodecInfo._get_frames_duration_av(
+            len(frames_pts) - 1, frames_pts[-1], stream.time_base, duration_metadata
+        )
 
-            if last_frame is None:
-                return 0, 0
+    @staticmethod
+    def _get_container_frames_duration_decode_av(
+        container: "InputContainer",
+        duration_metadata: int,
+    ) -> Tuple[int, int]:
+        frame_count = 0
+        last_frame = None
+        for frame_count, frame in enumerate(container.decode(container.streams.video[0])):
+            last_frame = frame
 
-            time_base_ms = (
-                last_frame.time_base.numerator / last_frame.time_base.denominator * 1000
-            )
-            if frame_count <= 1 or duration_metadata != 0:
-                return frame_count, duration_metadata
-            duration_n_minus_one = last_frame.pts * time_base_ms
-            ms_per_frame = duration_n_minus_one / (frame_count - 1)
-            duration = frame_count * ms_per_frame
-            return frame_count, int(rounding(duration))
+        if last_frame is None:
+            return 0, 0
 
-        return 0, 0
+        return CodecInfo._get_frames_duration_av(
+            frame_count, last_frame.pts, last_frame.time_base, duration_metadata
+        )
 
     @staticmethod
-    def get_file_codec(file: Union[Path, bytes], file_ext: Optional[str] = None) -> str:
-        if not file_ext and isinstance(file, Path):
-            file_ext = CodecInfo.get_file_ext(file)
-
-        file_ref: Union[str, BinaryIO]
-        if isinstance(file, Path):
-            file_ref = file.as_posix()
-        else:
-            file_ref = BytesIO(file)
-
-        codec = None
-        animated = False
-        if file_ext in (".tgs", ".lottie", ".json"):
-            return file_ext.replace(".", "")
-        try:
-            with Image.open(file) as im:
-                codec = im.format
-                if "is_animated" in dir(im):
-                    animated = im.is_animated
-                else:
-                    animated = False
-        except UnidentifiedImageError:
-            pass
+    def _get_frames_duration_av(
+        frame_count: int,
+        last_pts: Optional[int],
+        time_base: Optional[Fraction],
+        duration_metadata: int,
+    ) -> Tuple[int, int]:
+        if frame_count <= 1 or duration_metadata != 0:
+            return frame_count, duration_metadata
+        if last_pts is None or time_base is None:
+            return frame_count, 0
+        time_base_ms = time_base.numerator / time_base.denominator * 1000
+        duration_n_minus_one = last_pts * time_base_ms
+        ms_per_frame = duration_n_minus_one / (frame_count - 1)
+        duration = frame_count * ms_per_frame
+        return frame_count, int(rounding(duration))
 
-        if codec == "PNG":
-            # Unable to distinguish apng and png
-            if animated:
-                return "apng"
-            return "png"
-        if codec is not None:
-            return codec.lower()
+    @staticmethod
+    def _get_container_pts_demux_av(container: "InputContainer") -> Optional[List[int]]:
+        # Read pts of each frame from packets without decoding
+        # Return None if timestamps are missing or inconsistent
+        stream = container.streams.video[0]
+        frames_pts: List[int] = []
+        for packet in container.demux(stream):
+            # Empty packet is sent at end of stream to flush decoder
+            if packet.size == 0:
+                continue
+            if packet.pts is None:
+                return None
+            frames_pts.append(packet.pts)
+
+        if len(set(frames_pts)) != len(frames_pts):
+            return None
+        return frames_pts
 
-        import av
-        from av.error import InvalidDataError
+    @staticmethod
+    def get_file_codec(file: Union[Path, bytes], file_ext: Optional[str] = None) -> str:
+        from av.error import FFmpegError
 
         try:
-            with av.open(file_ref) as container:
-                return container.streams.video[0].codec_context.name.lower()
-        except InvalidDataError:
-            pass
-
-        return ""
+            return CodecInfo.probe(file, file_ext).codec
+        except (FFmpegError, IndexError):
+            return ""
 
     @staticmethod
     def get_file_res(
         file: Union[Path, bytes], file_ext: Optional[str] = None
     ) -> Tuple[int, int]:
-        if not file_ext and isinstance(file, Path):
-            file_ext = CodecInfo.get_file_ext(file)
-
-        if file_ext in (".tgs", ".json", ".lottie"):
-            anim = open_lottie(file)
-            width, height = anim.lottie_animation_get_size()
-            anim.lottie_animation_destroy()
-        elif file_ext in (".webp", ".png", ".apng"):
-            with Image.open(file) as im:
-                width = im.width
-                height = im.height
-        else:
-            import av
-
-            file_ref: Union[str, BinaryIO]
-            if isinstance(file, Path):
-                file_ref = file.as_posix()
-            else:
-                file_ref = BytesIO(file)
-
-            with av.open(file_ref) as container:
-                stream = container.streams.video[0]
-                width = stream.width
-                height = stream.height
-
-        return width, height
+        return CodecInfo.probe(file, file_ext).res
 
     @staticmethod
     def get_file_ext(file: Path) -> str:
@@ -444,7 +519,7 @@ class CodecInfo:
 
     @staticmethod
     def is_anim(file: Union[Path, bytes]) -> bool:
-        if CodecInfo.get_file_frames(file, check_anim=True) > 1:
+        if CodecInfo.probe(file).frames > 1:
             return True
         return False
 
@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-from typing import List
+from typing import List, Union
+
+import numpy as np
 
 # References:
 # https://github.com/blluv/KakaoTalkEmoticonDownloader
 # https://github.com/star-39/moe-sticker-bot
 
+KAKAO_KEY = "a271730728cbe141e47fd9d677e9006d"
+# Only the first 128 bytes of animated stickers are encrypted
+KAKAO_ENCRYPTED_LEN = 128
+
 
 class DecryptKakao:
     @staticmethod
@@ -61,9 +67,20 @@ class DecryptKakao:
         return result ^ b
 
     @staticmethod
-    def xor_data(data: bytes) -> bytes:
-        dat = list(data)
-        s = DecryptKakao.generate_lfsr("a271730728cbe141e47fd9d677e9006d")
-        for i in range(0, 128):
-            dat[i] = DecryptKakao.xor_byte(dat[i], s)
-        return bytes(dat)
+    def generate_keystream(key: str, length: int) -> bytes:
+        # xor_byte(b, seq) is b XOR a value that only depends on seq
+        seq = DecryptKakao.generate_lfsr(key)
+        return bytes(DecryptKakao.xor_byte(0, seq) for _ in range(length))
+
+    @staticmethod
+    def xor_data(data: Union[bytes, bytearray, memoryview]) -> bytes:
+        out = bytearray(data)
+        length = min(len(out), KAKAO_ENCRYPTED_LEN)
+        view = np.frombuffer(out, dtype=np.uint8, count=length)
+        view ^= KAKAO_KEYSTREAM[:length]
+        return bytes(out)
+
+
+KAKAO_KEYSTREAM = np.frombuffer(
+    DecryptKakao.generate_keystream(KAKAO_KEY, KAKAO_ENCRYPTED_LEN), dtype=np.uint8
+)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+# Default memory budget for intermediate frames kept between compression steps
+FRAME_CACHE_SIZE_MAX = 512 * 1024 * 1024
+
+
+def get_nbytes(obj: Any) -> int:
+    if isinstance(obj, Image.Image):
+        return obj.width * obj.height * len(obj.getbands())
+    if isinstance(obj, (list, tuple)):
+        return sum(get_nbytes(i) for i in obj)  # type: ignore
+    return int(getattr(obj, "nbytes", 0))
+
+
+class FrameCache:
+    # LRU cache for frames produced by each stage of StickerConvert._convert
+    # Entries are evicted (least recently used first) once total size exceed size_max
+    def __init__(self, size_max: int = FRAME_CACHE_SIZE_MAX) -> None:
+        self.size_max = size_max
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None) -> List[Any]:
+        # Return values that were evicted (or not stored), so caller may reuse them
+        if nbytes is None:
+            nbytes = get_nbytes(value)
+
+        self.pop(key)
+        if nbytes > self.size_max:
+            return [value]
+
+        evicted: List[Any] = []
+        while self.entries and self.size + nbytes > self.size_max:
+            _, (evicted_value, evicted_nbytes) = self.entries.popitem(last=False)
+            self.size -= evicted_nbytes
+            evicted.append(evicted_value)
+
+        self.entries[key] = (value, nbytes)
+        self.size += nbytes
+        return evicted
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.size -= entry[1]
+        return entry[0]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
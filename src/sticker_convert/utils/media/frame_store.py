@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+from math import prod
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+class FrameStore:
+    # Store frames of same shape in one contiguous (N, H, W, C) uint8 buffer
+    # Indexing and iterating return views of the buffer without copying
+    # The buffer is kept after clear() so the store can be reused
+    def __init__(self, capacity: int = 1) -> None:
+        self.buffer: "np.ndarray[Any, Any]" = np.empty(0, dtype=np.uint8)
+        self.array: "np.ndarray[Any, Any]" = self.buffer.reshape(0, 0, 0, 4)
+        self.capacity = capacity
+        self.count = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.array.shape[1:]
+
+    def clear(self, capacity: Optional[int] = None) -> None:
+        if capacity is not None:
+            self.capacity = capacity
+        self.count = 0
+
+    def _allocate(self, shape: Tuple[int, ...], capacity: int) -> None:
+        frame_size = prod(shape)
+        if self.buffer.size < capacity * frame_size:
+            self.buffer = np.empty(capacity * frame_size, dtype=np.uint8)
+        capacity = self.buffer.size // frame_size
+        self.array = self.buffer[: capacity * frame_size].reshape(capacity, *shape)
+
+    def append(self, frame: "np.ndarray[Any, Any]") -> None:
+        if self.count == 0 and (
+            frame.shape != self.shape or len(self.array) < self.capacity
+        ):
+            self._allocate(frame.shape, max(self.capacity, 1))
+        elif frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match {self.shape}")
+
+        if self.count == len(self.array):
+            # Double the capacity, amortized O(1) per frame
+            array_old = self.array
+            self.buffer = np.empty(self.count * 2 * prod(self.shape), dtype=np.uint8)
+            self.array = self.buffer.reshape(self.count * 2, *self.shape)
+            self.array[: self.count] = array_old
+
+        self.array[self.count] = frame
+        self.count += 1
+
+    def extend(self, frames: "Iterable[np.ndarray[Any, Any]]") -> None:
+        for frame in frames:
+            self.append(frame)
+
+    def frames(self) -> "np.ndarray[Any, Any]":
+        # View of all stored frames as one (N, H, W, C) array
+        return self.array[: self.count]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> "np.ndarray[Any, Any]":
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("FrameStore index out of range")
+        return self.array[i]
+
+    def __iter__(self) -> "Iterator[np.ndarray[Any, Any]]":
+        return iter(self.array[: self.count])
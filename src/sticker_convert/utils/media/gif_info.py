@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from sticker_convert.utils.files.file_buffer import open_buffer
+
+# References:
+# https://www.w3.org/Graphics/GIF/spec-gif89a.txt
+
+# Duration reported for frame without Graphic Control Extension,
+# same as default used by CodecInfo when Pillow report no duration
+GIF_DURATION_DEFAULT = 1000
+
+
+class GifInfo(NamedTuple):
+    width: int
+    height: int
+    has_alpha: bool
+    # None means no NETSCAPE2.0 extension (play once), 0 means infinite loop
+    loop: Optional[int]
+    durations: Tuple[int, ...]
+
+
+def _skip_sub_blocks(data: memoryview, pos: int) -> int:
+    # Return position after block terminator, only reading size byte of each sub-block
+    end = len(data)
+    while pos < end:
+        size = data[pos]
+        pos += 1 + size
+        if size == 0:
+            return pos
+    raise ValueError("Truncated GIF")
+
+
+def get_gif_info_from_buffer(data: memoryview) -> GifInfo:
+    # Read timing of each frame by scanning block headers, without decoding any frame
+    if len(data) < 13 or bytes(data[0:6]) not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("Not a GIF file")
+
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    pos = 13
+    if flags & 0x80:
+        pos += 3 << ((flags & 7) + 1)
+
+    has_alpha = False
+    loop: Optional[int] = None
+    durations: List[int] = []
+    duration: Optional[int] = None
+    end = len(data)
+
+    while pos < end:
+        introducer = data[pos]
+        if introducer == 0x3B:
+            break
+        if introducer == 0x21:
+            if pos + 2 > end:
+                raise ValueError("Truncated GIF")
+            label = data[pos + 1]
+            pos += 2
+            if label == 0xF9 and pos + 5 <= end and data[pos] >= 4:
+                # Graphic Control Extension
+                gce_flags, delay = struct.unpack_from("<BH", data, pos + 1)
+                duration = delay * 10
+                if gce_flags & 1:
+                    has_alpha = True
+            elif (
+                label == 0xFF
+                and not durations
+                and bytes(data[pos : pos + 12]) == b"\x0bNETSCAPE2.0"
+                and pos + 17 <= end
+                and data[pos + 12] >= 3
+                and data[pos + 13] == 1
+            ):
+                (loop,) = struct.unpack_from("<H", data, pos + 14)
+            pos = _skip_sub_blocks(data, pos)
+        elif introducer == 0x2C:
+            if pos + 10 > end:
+                raise ValueError("Truncated GIF")
+            if not durations:
+                # Pillow enlarge canvas to fit the first frame
+                x, y, w, h, image_flags = struct.unpack_from("<HHHHB", data, pos + 1)
+                width = max(width, x + w)
+                height = max(height, y + h)
+            else:
+                image_flags = data[pos + 9]
+            pos += 10
+            if image_flags & 0x80:
+                pos += 3 << ((image_flags & 7) + 1)
+            # Skip LZW minimum code size, then image data
+            pos = _skip_sub_blocks(data, pos + 1)
+            durations.append(GIF_DURATION_DEFAULT if duration is None else duration)
+            duration = None
+        else:
+            raise ValueError("Invalid block in GIF")
+
+    if not durations:
+        raise ValueError("No frame in GIF")
+
+    return GifInfo(width, height, has_alpha, loop, tuple(durations))
+
+
+def get_gif_info(file: Union[Path, bytes]) -> GifInfo:
+    with open_buffer(file) as data:
+        return get_gif_info_from_buffer(data)
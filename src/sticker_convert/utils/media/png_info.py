@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple, Union
+
+from sticker_convert.utils.files.file_buffer import open_buffer
+
+# References:
+# https://wiki.mozilla.org/APNG_Specification
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Duration reported for frame without fcTL chunk,
+# same as default used by CodecInfo when Pillow report no duration
+PNG_DURATION_DEFAULT = 1000
+
+# Color types with alpha channel (grayscale + alpha, RGBA)
+PNG_COLOR_TYPES_ALPHA = (4, 6)
+
+
+class PngInfo(NamedTuple):
+    width: int
+    height: int
+    has_alpha: bool
+    # 0 means infinite loop
+    loop: int
+    # Duration of each frame as reported by Pillow (delay_num / delay_den seconds)
+    durations: Tuple[float, ...]
+
+
+def iter_png_chunks(data: memoryview) -> Iterator[Tuple[bytes, int, int]]:
+    # Yield (chunk type, payload offset, payload size), skipping payload and CRC
+    pos = len(PNG_SIGNATURE)
+    end = len(data)
+    while pos + 8 <= end:
+        size, chunk_type = struct.unpack_from(">I4s", data, pos)
+        if pos + 12 + size > end:
+            raise ValueError("Truncated PNG")
+        yield chunk_type, pos + 8, size
+        if chunk_type == b"IEND":
+            break
+        pos += 12 + size
+
+
+def get_png_info_from_buffer(data: memoryview) -> PngInfo:
+    # Read timing of each frame from acTL and fcTL chunks, without decoding any frame
+    if len(data) < 8 or bytes(data[0:8]) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+
+    width = 0
+    height = 0
+    has_alpha = False
+    frames_declared = 0
+    loop = 0
+    durations: List[float] = []
+    idat_seen = False
+
+    for chunk_type, pos, size in iter_png_chunks(data):
+        if chunk_type == b"IHDR" and size >= 13:
+            width, height = struct.unpack_from(">II", data, pos)
+            has_alpha = data[pos + 9] in PNG_COLOR_TYPES_ALPHA
+        elif chunk_type == b"tRNS":
+            has_alpha = True
+        elif chunk_type == b"acTL" and size >= 8:
+            frames_declared, loop = struct.unpack_from(">II", data, pos)
+        elif chunk_type == b"fcTL" and size >= 26:
+            if idat_seen and not durations:
+                # IDAT before first fcTL is a default image outside of animation,
+                # which Pillow treats as an extra frame without duration
+                raise ValueError("PNG with default image")
+            delay_num, delay_den = struct.unpack_from(">HH", data, pos + 20)
+            if delay_den == 0:
+                delay_den = 100
+            durations.append(float(delay_num) / float(delay_den) * 1000)
+        elif chunk_type == b"IDAT":
+            idat_seen = True
+
+    if frames_declared == 0:
+        # Not animated
+        return PngInfo(width, height, has_alpha, loop, (PNG_DURATION_DEFAULT,))
+
+    if len(durations) != frames_declared:
+        raise ValueError("Number of fcTL does not match acTL")
+
+    return PngInfo(width, height, has_alpha, loop, tuple(durations))
+
+
+def get_png_info(file: Union[Path, bytes]) -> PngInfo:
+    with open_buffer(file) as data:
+        return get_png_info_from_buffer(data)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+from math import exp, log, log2
+from typing import Dict, List, Optional, Tuple
+
+# How output size scale with (pixels, frames, quality) for each output format
+# size ~ pixels^a * frames^b * exp(c * quality / 100)
+# Quality option of libvpx-vp9 in pyav has little effect, hence c = 0
+CODEC_SCALING: Dict[str, Tuple[float, float, float]] = {
+    ".webm": (0.7, 0.8, 0.0),
+    ".mkv": (0.7, 0.8, 0.0),
+    ".mp4": (0.7, 0.8, 0.0),
+    ".webp": (0.85, 1.0, 2.0),
+    ".gif": (1.0, 1.0, 0.0),
+    ".png": (1.0, 0.9, 0.0),
+    ".apng": (1.0, 0.9, 0.0),
+}
+CODEC_SCALING_DEFAULT = (0.9, 1.0, 2.0)
+
+# Formats that are quantized, where number of colors affect size
+CODEC_QUANTIZED = (".gif", ".png", ".apng")
+
+# Bits per pixel assumed for unquantized image (color > 256)
+COLOR_BITS_UNQUANTIZED = 10.0
+
+
+class SizePredictor:
+    # Predict output size of each step in StickerConvert steps_list
+    # Predictions are anchored on the nearest step that was actually encoded
+    def __init__(
+        self,
+        out_ext: str,
+        steps_features: List[Tuple[int, int, Optional[int], Optional[int]]],
+    ) -> None:
+        # steps_features: [(pixels, frames, quality, color), ...] for each step
+        self.scaling = CODEC_SCALING.get(out_ext, CODEC_SCALING_DEFAULT)
+        self.quantized = out_ext in CODEC_QUANTIZED
+        self.weights = [self._get_weight(*i) for i in steps_features]
+        self.sizes: Dict[int, int] = {}
+
+    def _get_weight(
+        self,
+        pixels: int,
+        frames: int,
+        quality: Optional[int],
+        color: Optional[int],
+    ) -> float:
+        a, b, c = self.scaling
+        weight = pow(max(pixels, 1), a) * pow(max(frames, 1), b)
+        if quality is not None:
+            weight *= exp(c * quality / 100)
+        if self.quantized:
+            if color is not None and color <= 256:
+                weight *= max(log2(max(color, 2)), 1.0)
+            else:
+                weight *= COLOR_BITS_UNQUANTIZED
+        return weight
+
+    def add(self, step: int, size: int) -> None:
+        if size > 0:
+            self.sizes[step] = size
+
+    def predict(self, step: int) -> Optional[float]:
+        if step in self.sizes:
+            return float(self.sizes[step])
+        if len(self.sizes) == 0:
+            return None
+
+        lower = [i for i in self.sizes if i < step]
+        upper = [i for i in self.sizes if i > step]
+        if lower and upper:
+            # Interpolate model error between encoded steps on both sides
+            step_lo = max(lower)
+            step_hi = min(upper)
+            err_lo = log(self.sizes[step_lo] / self.weights[step_lo])
+            err_hi = log(self.sizes[step_hi] / self.weights[step_hi])
+            t = (step - step_lo) / (step_hi - step_lo)
+            return self.weights[step] * exp(err_lo + (err_hi - err_lo) * t)
+
+        anchor = min(self.sizes, key=lambda i: (abs(i - step), i))
+        return self.sizes[anchor] * self.weights[step] / self.weights[anchor]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple, Union
+
+from sticker_convert.utils.files.file_buffer import open_buffer
+
+# References:
+# https://developers.google.com/speed/webp/docs/riff_container
+
+VP8X_FLAG_ALPHA = 0x10
+VP8X_FLAG_ANIMATION = 0x02
+
+
+class WebpFrame(NamedTuple):
+    # Byte offset of ANMF chunk payload in file
+    offset: int
+    x: int
+    y: int
+    width: int
+    height: int
+    duration: int
+
+
+class WebpInfo(NamedTuple):
+    width: int
+    height: int
+    has_alpha: bool
+    animated: bool
+    # 0 means infinite loop
+    loop: int
+    frames: Tuple[WebpFrame, ...]
+
+    @property
+    def durations(self) -> List[int]:
+        return [frame.duration for frame in self.frames]
+
+
+def _uint24(data: memoryview, pos: int) -> int:
+    b = data[pos : pos + 3]
+    return b[0] | b[1] << 8 | b[2] << 16
+
+
+def iter_riff_chunks(
+    data: memoryview, start: int = 12, end: int = -1
+) -> Iterator[Tuple[bytes, int, int]]:
+    # Yield (fourcc, payload offset, payload size), jumping by declared chunk size
+    # Stops at truncated chunk instead of raising, as Pillow would still decode it
+    if end < 0:
+        end = len(data)
+    pos = start
+    while pos + 8 <= end:
+        fourcc, size = struct.unpack_from("<4sI", data, pos)
+        if pos + 8 + size > end:
+            break
+        yield fourcc, pos + 8, size
+        # Chunk payload is padded to even size
+        pos += 8 + size + (size & 1)
+
+
+def _get_bitstream_info(
+    data: memoryview, fourcc: bytes, pos: int, size: int
+) -> Tuple[int, int, bool]:
+    # Return width, height and alpha of VP8 / VP8L bitstream
+    if (
+        fourcc == b"VP8 "
+        and size >= 10
+        and bytes(data[pos + 3 : pos + 6]) == b"\x9d\x01\x2a"
+    ):
+        width, height = struct.unpack_from("<HH", data, pos + 6)
+        return width & 0x3FFF, height & 0x3FFF, False
+    if fourcc == b"VP8L" and size >= 5 and data[pos] == 0x2F:
+        (bits,) = struct.unpack_from("<I", data, pos + 1)
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        has_alpha = bool((bits >> 28) & 1)
+        return width, height, has_alpha
+    raise ValueError(f"Invalid {fourcc!r} chunk in WebP")
+
+
+def get_webp_info_from_buffer(data: memoryview) -> WebpInfo:
+    if len(data) < 12 or bytes(data[0:4]) != b"RIFF" or bytes(data[8:12]) != b"WEBP":
+        raise ValueError("Not a WebP file")
+
+    (riff_size,) = struct.unpack_from("<I", data, 4)
+    end = min(len(data), 8 + riff_size)
+
+    width = 0
+    height = 0
+    has_alpha = False
+    animated = False
+    loop = 0
+    frames: List[WebpFrame] = []
+    extended = False
+
+    for fourcc, pos, size in iter_riff_chunks(data, 12, end):
+        if fourcc == b"VP8X" and size >= 10:
+            extended = True
+            flags = data[pos]
+            has_alpha = bool(flags & VP8X_FLAG_ALPHA)
+            animated = bool(flags & VP8X_FLAG_ANIMATION)
+            width = _uint24(data, pos + 4) + 1
+            height = _uint24(data, pos + 7) + 1
+        elif fourcc == b"ANIM" and size >= 6:
+            (loop,) = struct.unpack_from("<H", data, pos + 4)
+        elif fourcc == b"ANMF" and size >= 16:
+            frames.append(
+                WebpFrame(
+                    offset=pos,
+                    x=_uint24(data, pos) * 2,
+                    y=_uint24(data, pos + 3) * 2,
+                    width=_uint24(data, pos + 6) + 1,
+                    height=_uint24(data, pos + 9) + 1,
+                    duration=_uint24(data, pos + 12),
+                )
+            )
+        elif fourcc == b"ALPH":
+            has_alpha = True
+        elif fourcc in (b"VP8 ", b"VP8L") and not extended:
+            width, height, bitstream_alpha = _get_bitstream_info(
+                data, fourcc, pos, size
+            )
+            has_alpha = has_alpha or bitstream_alpha
+
+    return WebpInfo(width, height, has_alpha, animated, loop, tuple(frames))
+
+
+def get_webp_info(file: Union[Path, bytes]) -> WebpInfo:
+    with open_buffer(file) as data:
+        return get_webp_info_from_buffer(data)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import importlib
+
+# Imported by each worker before it accepts work, instead of by the first file
+# it converts. With forkserver start method, this module is imported by the
+# server instead, so workers forked from it start with all of these loaded
+PRELOAD_MODULES = (
+    "numpy",
+    "PIL.Image",
+    "av",
+    "rlottie_python",
+    "imagequant",
+    "oxipng",
+    "apngasm_python._apngasm_python",
+    "sticker_convert.converter",
+)
+
+
+def preload() -> None:
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    from PIL import Image
+
+    # Pillow only import plugins of less common formats on first use
+    Image.init()
+
+    from sticker_convert.converter import get_apngasm
+
+    try:
+        get_apngasm()
+    except ImportError:
+        pass
+
+
+preload()
@@ -0,0 +1,95 @@
+import struct
+import sys
+import zlib
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from tests.common import SAMPLE_DIR
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.utils.media.apple_png_normalize import ApplePngNormalize  # type: ignore # noqa: E402
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">L", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">L", zlib.crc32(chunk_type + data))
+    )
+
+
+def _make_cgbi(rgba: "np.ndarray") -> bytes:
+    height, width = rgba.shape[:2]
+    scanlines = np.zeros((height, 1 + 4 * width), dtype=np.uint8)
+    scanlines[:, 1:] = rgba[:, :, [2, 1, 0, 3]].reshape(height, -1)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    idat = compressor.compress(scanlines.tobytes()) + compressor.flush()
+    idat_split = max(1, len(idat) // 2)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"CgBI", b"\x50\x00\x20\x06")
+        + _png_chunk(b"IHDR", struct.pack(">LLBBBBB", width, height, 8, 6, 0, 0, 0))
+        + _png_chunk(b"tEXt", b"Comment\x00test")
+        + b"".join(
+            _png_chunk(b"IDAT", idat[i : i + idat_split])
+            for i in range(0, len(idat), idat_split)
+        )
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _normalize_reference(old_png: bytes) -> bytes:
+    # Expected output, built the same way as the per-pixel implementation did
+    new_png = old_png[:8]
+    chunk_pos = 8
+    idat = b""
+    width = height = 0
+    while chunk_pos < len(old_png):
+        length, chunk_type = struct.unpack(">L4s", old_png[chunk_pos : chunk_pos + 8])
+        data = old_png[chunk_pos + 8 : chunk_pos + 8 + length]
+        crc = old_png[chunk_pos + 8 + length : chunk_pos + 12 + length]
+        chunk_pos += length + 12
+        if chunk_type == b"IHDR":
+            width, height = struct.unpack(">LL", data[:8])
+        if chunk_type == b"IDAT":
+            idat += data
+        elif chunk_type == b"IEND":
+            raw = bytearray(zlib.decompress(idat, -8, width * height * 4 + height))
+            offset = 1
+            for _ in range(height):
+                for x in range(width):
+                    i = offset + 4 * x
+                    raw[i], raw[i + 2] = raw[i + 2], raw[i]
+                offset += 1 + 4 * width
+            compressed = zlib.compress(raw)
+            new_png += _png_chunk(b"IDAT", compressed) + _png_chunk(b"IEND", b"")
+            break
+        elif chunk_type != b"CgBI":
+            new_png += struct.pack(">L", length) + chunk_type + data + crc
+    return new_png
+
+
+def test_normalize_cgbi() -> None:
+    rng = np.random.default_rng(0)
+    for width, height in ((1, 1), (5, 3), (64, 48)):
+        rgba = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+        rgba[:, :, 3] = 255
+        cgbi = _make_cgbi(rgba)
+
+        normalized = ApplePngNormalize.normalize(cgbi)
+
+        assert normalized == _normalize_reference(cgbi)
+        with Image.open(BytesIO(normalized)) as im:
+            assert (np.asarray(im.convert("RGBA")) == rgba).all()
+
+
+def test_normalize_non_cgbi() -> None:
+    png = (SAMPLE_DIR / "static_png_RGBA_80x60.png").read_bytes()
+    assert ApplePngNormalize.normalize(png) == png
+    assert ApplePngNormalize.normalize(b"GIF89a") == b"GIF89a"
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+from typing import Tuple
+
+import pytest
+from PIL import Image
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.converter import StickerConvert  # type: ignore # noqa: E402
+from sticker_convert.job_option import CompOption  # type: ignore # noqa: E402
+from sticker_convert.utils.callback import Callback  # type: ignore # noqa: E402
+
+WHITE_BG = (255, 255, 255, 0)
+BLACK_BG = (0, 0, 0, 0)
+
+
+def _get_bg_color(in_f: Path, fps: int, streaming: bool) -> Tuple[int, int, int, int]:
+    opt_comp = CompOption(
+        format_img=(".png",),
+        format_vid=(".apng",),
+        fps_min=fps,
+        fps_max=fps,
+        res_w_min=64,
+        res_w_max=64,
+        res_h_min=64,
+        res_h_max=64,
+        quality_min=50,
+        quality_max=90,
+        color_min=256,
+        color_max=256,
+        steps=1,
+        streaming=streaming,
+    )
+    sticker = StickerConvert(in_f, Path("bytes.apng"), opt_comp, Callback(silent=True))
+    sticker.steps_list = sticker.generate_steps_list()
+    sticker.frames_import()
+    if sticker.bg_color is None:
+        sticker.bg_color = sticker.determine_bg_color()
+    return sticker.bg_color
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_bg_color_from_kept_frames(tmp_path: Path, streaming: bool) -> None:
+    # 50 fps, white on even frames and black on odd frames
+    in_f = tmp_path / "alternate.webp"
+    frames = [
+        Image.new(
+            "RGBA", (64, 64), (255, 255, 255, 255) if i % 2 == 0 else (0, 0, 0, 255)
+        )
+        for i in range(20)
+    ]
+    frames[0].save(
+        in_f, save_all=True, append_images=frames[1:], duration=20, lossless=True
+    )
+
+    # Average of all frames is darker than half
+    assert _get_bg_color(in_f, 50, streaming) == WHITE_BG
+    # Only white frames are kept at 25 fps, odd frames are not counted
+    assert _get_bg_color(in_f, 25, streaming) == BLACK_BG
@@ -0,0 +1,54 @@
+import sys
+from multiprocessing import Manager
+from pathlib import Path
+from queue import Queue
+from typing import Any
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.job import Executor  # type: ignore # noqa: E402
+
+MIB = 1024 * 1024
+
+
+class _Pool:
+    # Only what Executor uses for sending work, work is never run
+    def __init__(self) -> None:
+        self.manager = Manager()
+        self.work_queue: "Queue[Any]" = Queue()
+
+
+def _noop() -> None:
+    pass
+
+
+def _get_executor(processes: int, memory_budget: int) -> Executor:
+    pool: Any = _Pool()
+    executor = Executor(print, print, print, lambda *_: True, lambda *_: "", pool)
+    executor.processes = processes
+    executor.memory_budget = memory_budget
+    return executor
+
+
+def test_over_budget_work_sent_with_work_without_memory() -> None:
+    # e.g. downloader of pipeline running for the whole job
+    executor = _get_executor(2, 100 * MIB)
+    executor.add_work(_noop, tuple(), label="download")
+    executor.add_work(_noop, tuple(), label="big", memory=200 * MIB)
+
+    assert len(executor.work_running) == 2
+    assert executor.pool.work_queue.qsize() == 2
+
+
+def test_over_budget_work_waits_for_work_with_memory() -> None:
+    executor = _get_executor(2, 100 * MIB)
+    executor.add_work(_noop, tuple(), label="small", memory=50 * MIB)
+    executor.add_work(_noop, tuple(), label="big", memory=200 * MIB)
+
+    assert len(executor.work_running) == 1
+    assert len(executor.work_pending) == 1
+
+    (work_id,) = executor.work_running
+    executor.finish_work(work_id)
+    assert len(executor.work_running) == 1
+    assert not executor.work_pending
@@ -0,0 +1,62 @@
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import pytest
+from PIL import Image
+
+from tests.common import SAMPLE_DIR
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # noqa: E402
+from sticker_convert.utils.media.gif_info import get_gif_info  # type: ignore # noqa: E402
+
+GIF_SAMPLES = sorted(SAMPLE_DIR.glob("*.gif"))
+
+
+def _get_pillow_info(
+    file: Union[Path, bytes],
+) -> Tuple[Tuple[int, int], float, int, float, List[float]]:
+    # Result of decoding every frame with Pillow, used before header parser
+    with Image.open(file if isinstance(file, Path) else BytesIO(file)) as im:
+        fps, frames, duration, durations = (
+            CodecInfo._get_image_fps_frames_duration_pillow(im)  # pyright: ignore[reportPrivateUsage]
+        )
+        return im.size, fps, frames, duration, durations
+
+
+@pytest.mark.parametrize("sample", GIF_SAMPLES, ids=lambda i: i.name)
+def test_gif_info_same_as_pillow(sample: Path) -> None:
+    gif_info = get_gif_info(sample)
+    codec_info = CodecInfo(sample)
+    size, fps, frames, duration, durations = _get_pillow_info(sample)
+
+    assert (gif_info.width, gif_info.height) == size
+    assert list(gif_info.durations) == durations
+    assert (codec_info.fps, codec_info.frames, codec_info.duration) == (
+        fps,
+        frames,
+        duration,
+    )
+
+
+def test_gif_info_zero_delay() -> None:
+    frames = [Image.new("RGB", (16, 16), (i * 40, 0, 0)) for i in range(5)]
+    f = BytesIO()
+    frames[0].save(
+        f, "GIF", save_all=True, append_images=frames[1:], duration=0, loop=0
+    )
+    data = f.getvalue()
+    gif_info = get_gif_info(data)
+    codec_info = CodecInfo(data, ".gif")
+    _, fps, frames_pillow, duration, durations = _get_pillow_info(data)
+
+    assert 0 in gif_info.durations
+    assert list(gif_info.durations) == durations
+    assert (codec_info.fps, codec_info.frames, codec_info.duration) == (
+        fps,
+        frames_pillow,
+        duration,
+    )
@@ -0,0 +1,69 @@
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import pytest
+from PIL import Image
+
+from tests.common import SAMPLE_DIR
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # noqa: E402
+from sticker_convert.utils.media.png_info import get_png_info  # type: ignore # noqa: E402
+
+PNG_SAMPLES = sorted([*SAMPLE_DIR.glob("*.png"), *SAMPLE_DIR.glob("*.apng")])
+
+
+def _get_pillow_info(
+    file: Union[Path, bytes],
+) -> Tuple[Tuple[int, int], float, int, float, List[float]]:
+    # Result of decoding every frame with Pillow, used before header parser
+    with Image.open(file if isinstance(file, Path) else BytesIO(file)) as im:
+        fps, frames, duration, durations = (
+            CodecInfo._get_image_fps_frames_duration_pillow(im)  # pyright: ignore[reportPrivateUsage]
+        )
+        return im.size, fps, frames, duration, durations
+
+
+@pytest.mark.parametrize("sample", PNG_SAMPLES, ids=lambda i: i.name)
+def test_png_info_same_as_pillow(sample: Path) -> None:
+    png_info = get_png_info(sample)
+    codec_info = CodecInfo(sample)
+    size, fps, frames, duration, durations = _get_pillow_info(sample)
+
+    assert (png_info.width, png_info.height) == size
+    assert (codec_info.fps, codec_info.frames, codec_info.duration) == (
+        fps,
+        frames,
+        duration,
+    )
+    assert list(png_info.durations) == durations
+
+
+def test_png_info_default_image() -> None:
+    # Default image has no fcTL and is not part of animation, Pillow still
+    # count it as a frame, so header parser leave it to Pillow
+    frames = [Image.new("RGBA", (16, 16), (i * 40, 0, 0, 255)) for i in range(5)]
+    f = BytesIO()
+    frames[0].save(
+        f,
+        "PNG",
+        save_all=True,
+        append_images=frames[1:],
+        duration=[10, 20, 30, 40],
+        default_image=True,
+    )
+    data = f.getvalue()
+    codec_info = CodecInfo(data, ".png")
+    _, fps, frames_pillow, duration, durations = _get_pillow_info(data)
+
+    with pytest.raises(ValueError):
+        get_png_info(data)
+    assert (codec_info.fps, codec_info.frames, codec_info.duration) == (
+        fps,
+        frames_pillow,
+        duration,
+    )
+    assert list(codec_info.durations) == durations
@@ -0,0 +1,101 @@
+import struct
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import List
+
+import pytest
+from PIL import Image
+
+from tests.common import SAMPLE_DIR
+
+sys.path.append(str(Path(__file__).resolve().parent / "../src"))
+
+from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # noqa: E402
+from sticker_convert.utils.media.webp_info import get_webp_info  # type: ignore # noqa: E402
+
+WEBP_SAMPLES = sorted(SAMPLE_DIR.glob("*.webp"))
+
+
+def _riff_chunk(fourcc: bytes, data: bytes) -> bytes:
+    return fourcc + struct.pack("<I", len(data)) + data + b"\x00" * (len(data) & 1)
+
+
+def _make_webp(durations: List[int], icc_profile: bytes = b"") -> bytes:
+    frames = [
+        Image.new("RGBA", (16, 16), (i * 40 % 256, 0, 0, 255))
+        for i in range(len(durations))
+    ]
+    f = BytesIO()
+    frames[0].save(
+        f,
+        "WEBP",
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        icc_profile=icc_profile,
+        lossless=True,
+    )
+    return f.getvalue()
+
+
+def _get_pillow_durations(data: bytes) -> List[int]:
+    # Pillow only set duration of WebP frame after it is decoded
+    with Image.open(BytesIO(data)) as im:
+        durations: List[int] = []
+        n_frames: int = getattr(im, "n_frames", 1)
+        for i in range(n_frames):
+            im.seek(i)
+            im.tobytes()
+            durations.append(im.info["duration"])
+        return durations
+
+
+@pytest.mark.parametrize("sample", WEBP_SAMPLES, ids=lambda i: i.name)
+def test_webp_info_same_as_pillow(sample: Path) -> None:
+    webp_info = get_webp_info(sample)
+    codec_info = CodecInfo(sample)
+
+    with Image.open(sample) as im:
+        assert (webp_info.width, webp_info.height) == im.size
+        n_frames: int = getattr(im, "n_frames", 1)
+
+    if n_frames == 1:
+        assert not webp_info.animated
+        assert codec_info.frames == 1
+        return
+
+    durations = _get_pillow_durations(sample.read_bytes())
+    assert webp_info.animated
+    assert webp_info.durations == durations
+    assert codec_info.frames == len(durations)
+    assert codec_info.duration == sum(durations)
+    fps = CodecInfo._get_fps_from_durations(durations)  # pyright: ignore[reportPrivateUsage]
+    assert codec_info.fps == fps
+
+
+def test_webp_info_odd_chunk_padding() -> None:
+    # ICCP of odd size is followed by a padding byte before ANIM and ANMF
+    data = _make_webp([10, 20, 30, 40, 50], icc_profile=b"\x01" * 7)
+
+    assert get_webp_info(data).durations == _get_pillow_durations(data)
+
+
+def test_webp_info_truncated() -> None:
+    data = _make_webp([10, 20, 30, 40, 50])
+
+    # Frames with chunk cut off are dropped, without raising
+    assert get_webp_info(data[:-5]).durations == [10, 20, 30, 40]
+    assert get_webp_info(data[:40]).durations == []
+
+
+def test_webp_info_animated_without_anmf() -> None:
+    vp8x = struct.pack("<B3x", 0x02) + (15).to_bytes(3, "little") * 2
+    anim = struct.pack("<IH", 0, 0)
+    chunks = _riff_chunk(b"VP8X", vp8x) + _riff_chunk(b"ANIM", anim)
+    data = b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WEBP" + chunks
+
+    webp_info = get_webp_info(data)
+    assert webp_info.animated
+    assert (webp_info.width, webp_info.height) == (16, 16)
+    assert webp_info.frames == ()